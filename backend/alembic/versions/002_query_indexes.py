@@ -0,0 +1,51 @@
+"""Add composite and foreign key indexes for run-scoped queries
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns) - matches the query shapes in app/api/routes.py
+INDEXES = [
+    # list_runs: ORDER BY created_at DESC
+    ('ix_runs_created_at', 'runs', ['created_at']),
+    # list_tasks: WHERE run_id = ? ORDER BY created_at (also covers the FK)
+    ('ix_tasks_run_id_created_at', 'tasks', ['run_id', 'created_at']),
+    # get_run recent events: WHERE run_id = ? ORDER BY created_at DESC LIMIT 50
+    ('ix_events_run_id_created_at', 'events', ['run_id', 'created_at']),
+    # SSE resume: WHERE run_id = ? AND id > ? ORDER BY id
+    ('ix_events_run_id_id', 'events', ['run_id', 'id']),
+    # patches.run_id foreign key (cascade deletes from runs)
+    ('ix_patches_run_id', 'patches', ['run_id']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block; it
+    # builds without blocking writes, so this is safe on live tables
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True
+            )
@@ -0,0 +1,42 @@
+"""Extend created_at indexes with id for keyset pagination
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (new index, old index it replaces, table, new columns, old columns)
+# The (..., created_at, id) indexes serve both ORDER BY created_at and the
+# (created_at, id) row comparison used by cursor pagination.
+INDEXES = [
+    ('ix_runs_created_at_id', 'ix_runs_created_at', 'runs',
+     ['created_at', 'id'], ['created_at']),
+    ('ix_tasks_run_id_created_at_id', 'ix_tasks_run_id_created_at', 'tasks',
+     ['run_id', 'created_at', 'id'], ['run_id', 'created_at']),
+    ('ix_events_run_id_created_at_id', 'ix_events_run_id_created_at', 'events',
+     ['run_id', 'created_at', 'id'], ['run_id', 'created_at']),
+]
+
+
+def upgrade() -> None:
+    # Build the replacement before dropping the old index so queries are
+    # never left without one; both steps avoid blocking writes
+    with op.get_context().autocommit_block():
+        for name, old_name, table, columns, _ in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+            op.drop_index(old_name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, old_name, table, _, old_columns in reversed(INDEXES):
+            op.create_index(old_name, table, old_columns, postgresql_concurrently=True, if_not_exists=True)
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,81 @@
+"""Store events.event_metadata as JSONB with a GIN index
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = '004'
+down_revision: Union[str, None] = '003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows converted per backfill transaction
+CHUNK_SIZE = 10000
+
+
+def upgrade() -> None:
+    # Text that is not valid JSON is kept as a JSON string value
+    op.execute("""
+        CREATE OR REPLACE FUNCTION starkui_try_jsonb(value text) RETURNS jsonb AS $$
+        BEGIN
+            RETURN value::jsonb;
+        EXCEPTION WHEN others THEN
+            RETURN to_jsonb(value);
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE
+    """)
+    op.add_column('events', sa.Column('event_metadata_json', postgresql.JSONB(), nullable=True))
+
+    # Backfill in id-range chunks, each committed on its own, so no single
+    # long transaction holds row locks on the whole table
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        low, high = conn.execute(sa.text("SELECT min(id), max(id) FROM events")).one()
+        if low is not None:
+            for start in range(low, high + 1, CHUNK_SIZE):
+                conn.execute(sa.text("""
+                    UPDATE events SET event_metadata_json = starkui_try_jsonb(event_metadata)
+                    WHERE id >= :start AND id < :stop AND event_metadata IS NOT NULL
+                """), {"start": start, "stop": start + CHUNK_SIZE})
+
+    # Catch rows written during the backfill, then swap the columns
+    op.execute("""
+        UPDATE events SET event_metadata_json = starkui_try_jsonb(event_metadata)
+        WHERE event_metadata_json IS NULL AND event_metadata IS NOT NULL
+    """)
+    op.drop_column('events', 'event_metadata')
+    op.alter_column('events', 'event_metadata_json', new_column_name='event_metadata')
+    op.execute("DROP FUNCTION starkui_try_jsonb(text)")
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_events_event_metadata', 'events', ['event_metadata'],
+            postgresql_using='gin',
+            postgresql_ops={'event_metadata': 'jsonb_path_ops'},
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_events_event_metadata', table_name='events',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+    op.alter_column(
+        'events', 'event_metadata',
+        type_=sa.Text(),
+        # JSON string values go back to the raw text they were created from
+        postgresql_using=(
+            "CASE WHEN jsonb_typeof(event_metadata) = 'string' "
+            "THEN event_metadata #>> '{}' ELSE event_metadata::text END"
+        )
+    )
@@ -0,0 +1,58 @@
+"""Add run_stats counters table
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '005'
+down_revision: Union[str, None] = '004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TASK_STATUSES = ['PENDING', 'RUNNING', 'COMPLETED', 'FAILED']
+EVENT_TYPES = ['INFO', 'SUCCESS', 'WARNING', 'ERROR', 'SYSTEM']
+
+
+def upgrade() -> None:
+    op.create_table(
+        'run_stats',
+        sa.Column('run_id', sa.Integer(), nullable=False),
+        *[
+            sa.Column(f'tasks_{status.lower()}', sa.Integer(), server_default='0', nullable=False)
+            for status in TASK_STATUSES
+        ],
+        *[
+            sa.Column(f'events_{event_type.lower()}', sa.Integer(), server_default='0', nullable=False)
+            for event_type in EVENT_TYPES
+        ],
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['run_id'], ['runs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('run_id')
+    )
+
+    # Backfill existing runs. Writes made while older code is still serving
+    # are not counted; run `python -m app.db.run_stats` after the rollout.
+    task_counts = ", ".join(
+        f"count(*) FILTER (WHERE status = '{status}') AS tasks_{status.lower()}" for status in TASK_STATUSES
+    )
+    event_counts = ", ".join(
+        f"count(*) FILTER (WHERE event_type = '{event_type}') AS events_{event_type.lower()}" for event_type in EVENT_TYPES
+    )
+    columns = [f'tasks_{status.lower()}' for status in TASK_STATUSES] + \
+        [f'events_{event_type.lower()}' for event_type in EVENT_TYPES]
+    op.execute(f"""
+        INSERT INTO run_stats (run_id, {", ".join(columns)})
+        SELECT runs.id, {", ".join(f"coalesce({column}, 0)" for column in columns)}
+        FROM runs
+        LEFT JOIN (SELECT run_id, {task_counts} FROM tasks GROUP BY run_id) t ON t.run_id = runs.id
+        LEFT JOIN (SELECT run_id, {event_counts} FROM events GROUP BY run_id) e ON e.run_id = runs.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('run_stats')
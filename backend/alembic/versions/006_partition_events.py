@@ -0,0 +1,134 @@
+"""Partition events by month on created_at
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly partitions created ahead of time; the API keeps extending this
+# (EVENTS_PARTITION_PREMAKE_MONTHS)
+PREMAKE_MONTHS = 3
+
+# (name, definition) of every index on events
+INDEXES = [
+    ('ix_events_id', '(id)'),
+    ('ix_events_run_id_created_at_id', '(run_id, created_at, id)'),
+    ('ix_events_run_id_id', '(run_id, id)'),
+    ('ix_events_event_metadata', 'USING gin (event_metadata jsonb_path_ops)'),
+]
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    month = moment.month - 1 + months
+    return moment.replace(year=moment.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def create_month_partition(start: datetime) -> None:
+    end = add_months(start, 1)
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS events_y{start.year:04d}m{start.month:02d} PARTITION OF events "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    this_month = month_start(datetime.now(timezone.utc))
+    has_rows = conn.execute(sa.text("SELECT EXISTS (SELECT 1 FROM events)")).scalar()
+
+    # Existing rows are not copied: the current table becomes one partition
+    # holding everything before `bound`, and expires as a whole once all of
+    # it is past retention
+    bound = add_months(this_month, 1)
+    if has_rows:
+        newest = conn.execute(sa.text("SELECT max(created_at) FROM events")).scalar()
+        bound = max(bound, add_months(month_start(newest), 1))
+        # Prepared without blocking writes, so ATTACH needs neither an index
+        # build nor a validation scan
+        with op.get_context().autocommit_block():
+            op.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS events_legacy_id_created_at ON events (id, created_at)")
+            op.execute("ALTER TABLE events DROP CONSTRAINT IF EXISTS events_legacy_bound")
+            op.execute(f"ALTER TABLE events ADD CONSTRAINT events_legacy_bound CHECK (created_at < '{bound.isoformat()}') NOT VALID")
+            op.execute("ALTER TABLE events VALIDATE CONSTRAINT events_legacy_bound")
+
+    # The sequence outlives the table it was created with
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY NONE")
+    if has_rows:
+        op.execute("ALTER TABLE events RENAME TO events_legacy")
+        op.execute("ALTER TABLE events_legacy RENAME CONSTRAINT events_run_id_fkey TO events_legacy_run_id_fkey")
+        # A partition can only carry the parent's primary key, (id, created_at)
+        op.execute("ALTER TABLE events_legacy DROP CONSTRAINT events_pkey")
+        op.execute("ALTER TABLE events_legacy ADD CONSTRAINT events_legacy_pkey PRIMARY KEY USING INDEX events_legacy_id_created_at")
+        for name, _ in INDEXES:
+            op.execute(f"ALTER INDEX {name} RENAME TO {name.replace('ix_events_', 'events_legacy_')}")
+    else:
+        op.execute("DROP TABLE events")
+
+    # Partitioned tables need the partition key in the primary key
+    op.execute("""
+        CREATE TABLE events (
+            id integer NOT NULL DEFAULT nextval('events_id_seq'),
+            run_id integer NOT NULL,
+            event_type eventtype NOT NULL,
+            message text NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            event_metadata jsonb,
+            CONSTRAINT events_pkey PRIMARY KEY (id, created_at),
+            CONSTRAINT events_run_id_fkey FOREIGN KEY (run_id) REFERENCES runs (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY events.id")
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON events {columns}")
+
+    if has_rows:
+        # Matching indexes, primary key and foreign key on events_legacy are reused
+        op.execute(f"ALTER TABLE events ATTACH PARTITION events_legacy FOR VALUES FROM (MINVALUE) TO ('{bound.isoformat()}')")
+        start = bound
+    else:
+        start = this_month
+
+    while start < add_months(this_month, PREMAKE_MONTHS + 1):
+        create_month_partition(start)
+        start = add_months(start, 1)
+
+
+def downgrade() -> None:
+    # Copies every row back into a single table
+    op.execute("ALTER TABLE events RENAME TO events_partitioned")
+    for name, _ in INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name.replace('ix_events_', 'events_partitioned_')}")
+    op.execute("""
+        CREATE TABLE events (
+            id integer NOT NULL DEFAULT nextval('events_id_seq'),
+            run_id integer NOT NULL,
+            event_type eventtype NOT NULL,
+            message text NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            event_metadata jsonb
+        )
+    """)
+    op.execute("""
+        INSERT INTO events (id, run_id, event_type, message, created_at, event_metadata)
+        SELECT id, run_id, event_type, message, created_at, event_metadata FROM events_partitioned
+    """)
+    op.execute("ALTER SEQUENCE events_id_seq OWNED BY events.id")
+    op.execute("DROP TABLE events_partitioned")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_pkey PRIMARY KEY (id)")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_run_id_fkey FOREIGN KEY (run_id) REFERENCES runs (id) ON DELETE CASCADE")
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON events {columns}")
@@ -0,0 +1,103 @@
+"""Store patch diffs in a content-addressed blob table
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+import gzip
+import hashlib
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    op.create_table(
+        'patch_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('encoding', sa.String(length=16), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    op.add_column('patches', sa.Column('diff_sha256', sa.String(length=64), nullable=True))
+
+    # Move existing diffs into blobs (gzip; new blobs use PATCH_COMPRESSION)
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text("SELECT id, diff_content FROM patches WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+        blobs = {}
+        updates = []
+        for patch_id, diff_content in rows:
+            content = diff_content.encode()
+            sha256 = hashlib.sha256(content).hexdigest()
+            if sha256 not in blobs:
+                data = gzip.compress(content, mtime=0)
+                encoding = 'gzip'
+                if len(data) >= len(content):
+                    data, encoding = content, 'identity'
+                blobs[sha256] = {"sha256": sha256, "encoding": encoding, "size": len(content), "data": data}
+            updates.append({"id": patch_id, "sha256": sha256})
+        conn.execute(
+            sa.text(
+                "INSERT INTO patch_blobs (sha256, encoding, size, data) "
+                "VALUES (:sha256, :encoding, :size, :data) ON CONFLICT (sha256) DO NOTHING"
+            ),
+            list(blobs.values())
+        )
+        conn.execute(sa.text("UPDATE patches SET diff_sha256 = :sha256 WHERE id = :id"), updates)
+        last_id = rows[-1][0]
+
+    op.alter_column('patches', 'diff_sha256', nullable=False)
+    op.create_foreign_key('patches_diff_sha256_fkey', 'patches', 'patch_blobs', ['diff_sha256'], ['sha256'])
+    op.drop_column('patches', 'diff_content')
+
+
+def downgrade() -> None:
+    op.add_column('patches', sa.Column('diff_content', sa.Text(), nullable=True))
+
+    conn = op.get_bind()
+    encodings = set(conn.execute(sa.text("SELECT DISTINCT encoding FROM patch_blobs")).scalars())
+    decompress = {'gzip': gzip.decompress, 'identity': bytes}
+    if 'zstd' in encodings:
+        import zstandard
+        decompress['zstd'] = zstandard.ZstdDecompressor().decompress
+
+    last_sha256 = ''
+    while True:
+        rows = conn.execute(
+            sa.text(
+                "SELECT sha256, encoding, data FROM patch_blobs WHERE sha256 > :last ORDER BY sha256 LIMIT :limit"
+            ),
+            {"last": last_sha256, "limit": BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            sa.text("UPDATE patches SET diff_content = :diff_content WHERE diff_sha256 = :sha256"),
+            [
+                {"sha256": sha256, "diff_content": decompress[encoding](data).decode()}
+                for sha256, encoding, data in rows
+            ]
+        )
+        last_sha256 = rows[-1][0]
+
+    op.alter_column('patches', 'diff_content', nullable=False)
+    op.drop_constraint('patches_diff_sha256_fkey', 'patches', type_='foreignkey')
+    op.drop_column('patches', 'diff_sha256')
+    op.drop_table('patch_blobs')
@@ -0,0 +1,23 @@
+"""Record why a patch failed to apply
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('patches', sa.Column('error', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('patches', 'error')
@@ -0,0 +1,40 @@
+from typing import Optional
+from fastapi import HTTPException, WebSocketException, status
+from starlette.requests import HTTPConnection
+from app.core.config import settings
+from app.core.jwt import parse_bearer_token, verify_token_cached
+
+
+def unauthorized(connection: HTTPConnection, detail: str) -> Exception:
+    if connection.scope["type"] == "websocket":
+        return WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=detail)
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def require_auth(connection: HTTPConnection) -> Optional[dict]:
+    """
+    Router dependency enforcing ENABLE_JWT_PROTECTION, for HTTP and WebSocket routes.
+    Expects `Authorization: Bearer <token>`. EventSource and browser
+    WebSockets cannot set headers, so event streams and WebSocket handshakes
+    may pass the token as `?access_token=` instead.
+    Returns the token payload (also kept as request.state.token), or None
+    when protection is off. Async so it runs on the event loop rather than
+    in the threadpool.
+    """
+    connection.state.token = None
+    if not settings.ENABLE_JWT_PROTECTION:
+        return None
+    
+    token = parse_bearer_token(connection.headers.get("authorization"))
+    if token is None and (
+        connection.scope["type"] == "websocket" or "text/event-stream" in connection.headers.get("accept", "")
+    ):
+        token = connection.query_params.get("access_token")
+    if token is None:
+        raise unauthorized(connection, "Not authenticated")
+    
+    payload = verify_token_cached(token)
+    if payload is None:
+        raise unauthorized(connection, "Invalid or expired token")
+    connection.state.token = payload
+    return payload
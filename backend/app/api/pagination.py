@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Upper bound on page size for cursor pagination
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor for the (created_at, id) position of a row"""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    """Position encoded in a cursor; None for an empty cursor (first page)"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_query(query: Select, model, position: Optional[Tuple[datetime, int]], limit: int, descending: bool = False) -> Select:
+    """
+    Restrict `query` to `limit` rows ordered by (created_at, id) after `position`.
+
+    Seeks with a row comparison on the (created_at, id) index instead of
+    OFFSET, so every page costs the same no matter how deep it is.
+    """
+    key = tuple_(model.created_at, model.id)
+    if position is not None:
+        query = query.where(key < tuple_(*position) if descending else key > tuple_(*position))
+
+    if descending:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at, model.id)
+    return query.limit(limit)
+
+
+async def keyset_page(db: AsyncSession, query: Select, model, cursor: str, limit: int, descending: bool = False):
+    """
+    Fetch one page of `query` starting after `cursor`.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    # One extra row tells us whether there is another page
+    query = keyset_query(query, model, decode_cursor(cursor), limit + 1, descending)
+    result = await db.execute(query)
+    rows = result.scalars().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
@@ -1,86 +1,222 @@
-import asyncio
 import json
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+import math
+import time
+import zlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, WebSocket, WebSocketException
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.models.models import Run, Task, Event, Patch, RunStatus, PatchStatus
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from app.db.session import get_db, SessionLocal
+from app.db.run_stats import add_run_stats
+from app.db.event_buffer import event_buffer, BufferFull
+from app.db.blobs import store_blob, iter_decompressed, blob_hash
+from app.api.pagination import keyset_page
+from app.api.auth import require_auth
+from app.models.models import Run, RunStats, Task, Event, Patch, PatchBlob, RunStatus, TaskStatus, PatchStatus, EventType
 from app.schemas.schemas import (
-    RunCreate, RunResponse, RunDetail,
-    TaskCreate, TaskResponse,
-    EventCreate, EventResponse,
-    PatchPreviewRequest, PatchApplyRequest, PatchResponse
+    RunCreate, RunResponse, RunSummary, RunDetail, RunPage, RunSummaryPage,
+    TaskCreate, TaskResponse, TaskPage,
+    EventCreate, EventResponse, EventPage,
+    PatchPreviewRequest, PatchPreviewResponse, PatchApplyRequest, PatchResponse
 )
-from app.core.events import broadcaster
+from app.core.config import settings
+from app.core.cache import run_detail_cache, patch_preview_cache
+from app.core.diffs import DiffParseError, parse_diff, normalize
+from app.core.patch_engine import patch_engine
+from app.core.serialization import dumps, json_response
+from app.core.feed import FeedConnection, JSON_ENCODING, MSGPACK_ENCODING, msgpack
+from app.core.ratelimit import client_limiter, run_limiter, rate_limited, write_slots, WriteSlotTimeout
+from app.core.events import (
+    broadcaster, event_message, event_record, encode_frame, encode_payload, next_batch_frame,
+    CONNECTED_FRAME, MAX_BATCH_MS, RESYNC_FRAME
+)
+
+# Every API route requires a valid token when ENABLE_JWT_PROTECTION is set
+router = APIRouter(dependencies=[Depends(require_auth)])
+
+# Serializers for the read endpoints that return ORM rows (see app.core.serialization)
+RUN_LIST = TypeAdapter(List[RunResponse])
+RUN_PAGE = TypeAdapter(RunPage)
+RUN_SUMMARY_LIST = TypeAdapter(List[RunSummary])
+RUN_SUMMARY_PAGE = TypeAdapter(RunSummaryPage)
+TASK_LIST = TypeAdapter(List[TaskResponse])
+TASK_PAGE = TypeAdapter(TaskPage)
+EVENT_PAGE = TypeAdapter(EventPage)
+
+
+async def get_run_or_404(db: AsyncSession, run_id: int) -> Run:
+    """Load a run by primary key or raise 404"""
+    run = await db.get(Run, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
+
+
+def client_key(request: Request) -> str:
+    """Rate limit identity: the token subject when authenticated, else the client address"""
+    token = getattr(request.state, "token", None)
+    if token and token.get("sub") is not None:
+        return f"sub:{token['sub']}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def admit_write(request: Request, run_id: int, cost: int = 1):
+    """Charge a write of `cost` rows to its client's and run's token buckets, or raise 429"""
+    client = client_key(request)
+    for limiter, key in ((client_limiter, client), (run_limiter, run_id)):
+        wait = limiter.wait_time(key, cost)
+        if wait > 0:
+            rate_limited.inc(limiter.name)
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded for this {limiter.name}",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+    client_limiter.consume(client, cost)
+    run_limiter.consume(run_id, cost)
 
-router = APIRouter()
+
+@asynccontextmanager
+async def write_slot():
+    """
+    Hold one of DB_WRITE_CONCURRENCY write slots; enter it before the
+    session's first query so waiting requests do not hold pool connections
+    """
+    try:
+        async with write_slots.slot():
+            yield
+    except WriteSlotTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Database writes are saturated: {e}", headers={"Retry-After": "1"})
 
 
 # Runs endpoints
 @router.post("/runs", response_model=RunResponse, status_code=201)
-def create_run(run_data: RunCreate, db: Session = Depends(get_db)):
+async def create_run(run_data: RunCreate, db: AsyncSession = Depends(get_db)):
     """Create a new run"""
     run = Run(
         title=run_data.title,
         description=run_data.description,
-        status=RunStatus.PENDING
+        status=RunStatus.PENDING,
+        stats=RunStats()
     )
-    db.add(run)
-    db.commit()
-    db.refresh(run)
+    async with write_slot():
+        db.add(run)
+        await db.commit()
     return run
 
 
-@router.get("/runs", response_model=List[RunResponse])
-def list_runs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """List all runs"""
-    runs = db.query(Run).order_by(Run.created_at.desc()).offset(skip).limit(limit).all()
-    return runs
+@router.get("/runs", response_model=Union[RunSummaryPage, List[RunSummary]])
+async def list_runs(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List all runs, newest first.
+    Pass `cursor` (empty for the first page) for keyset pagination with a
+    `next_cursor` in the response; without it skip/limit paging is used.
+    `include=stats` adds task/event counters from the run_stats table
+    (the `stats` key is only present then).
+    """
+    query = select(Run)
+    list_adapter, page_adapter = RUN_LIST, RUN_PAGE
+    if include:
+        unknown = set(include.split(",")) - {"stats"}
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown include: {','.join(sorted(unknown))}")
+        query = query.options(joinedload(Run.stats))
+        list_adapter, page_adapter = RUN_SUMMARY_LIST, RUN_SUMMARY_PAGE
+    
+    if cursor is not None:
+        runs, next_cursor = await keyset_page(db, query, Run, cursor, limit, descending=True)
+        return json_response(page_adapter, {"items": runs, "next_cursor": next_cursor})
+    
+    result = await db.execute(
+        query.order_by(Run.created_at.desc()).offset(skip).limit(limit)
+    )
+    return json_response(list_adapter, result.scalars().all())
 
 
 @router.get("/runs/{run_id}", response_model=RunDetail)
-def get_run(run_id: int, db: Session = Depends(get_db)):
-    """Get run details with tasks and recent events"""
-    run = db.query(Run).filter(Run.id == run_id).first()
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
+async def get_run(run_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Get run details with its most recent tasks and events.
+    Served from the in-process RunDetail cache when possible; writes to the
+    run invalidate it. Use /runs/{id}/tasks for the full task list.
+    """
+    body = run_detail_cache.get(run_id)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    
+    token = run_detail_cache.begin(run_id)
+    run = await get_run_or_404(db, run_id)
+    
+    # Most recent tasks, bounded (the relationship itself is unordered and unbounded)
+    result = await db.execute(
+        select(Task)
+        .where(Task.run_id == run_id)
+        .order_by(Task.created_at.desc(), Task.id.desc())
+        .limit(settings.RUN_DETAIL_MAX_TASKS)
+    )
+    tasks = result.scalars().all()
     
     # Get recent events (last 50)
-    recent_events = db.query(Event).filter(Event.run_id == run_id).order_by(Event.created_at.desc()).limit(50).all()
+    result = await db.execute(
+        select(Event).where(Event.run_id == run_id).order_by(Event.created_at.desc()).limit(50)
+    )
+    recent_events = result.scalars().all()
     
-    # Prepare response
-    run_dict = {
+    # Serialize once; cache hits return these bytes as they are
+    detail = RunDetail.model_validate({
         "id": run.id,
         "title": run.title,
         "description": run.description,
         "status": run.status,
         "created_at": run.created_at,
         "updated_at": run.updated_at,
-        "tasks": run.tasks,
+        "tasks": list(reversed(tasks)),
         "recent_events": list(reversed(recent_events))  # Show oldest first
-    }
+    })
+    body = detail.model_dump_json().encode()
+    run_detail_cache.put(run_id, body, token)
     
-    return run_dict
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/cache/stats")
+def cache_stats():
+    """RunDetail and patch preview cache counters"""
+    return {"run_detail": run_detail_cache.stats(), "patch_preview": patch_preview_cache.stats()}
 
 
 # Tasks endpoints
 @router.post("/runs/{run_id}/tasks", response_model=TaskResponse, status_code=201)
-async def create_task(run_id: int, task_data: TaskCreate, db: Session = Depends(get_db)):
+async def create_task(run_id: int, task_data: TaskCreate, request: Request, db: AsyncSession = Depends(get_db)):
     """Create a new task for a run"""
-    # Verify run exists
-    run = db.query(Run).filter(Run.id == run_id).first()
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
-    
-    task = Task(
-        run_id=run_id,
-        title=task_data.title,
-        description=task_data.description
-    )
-    db.add(task)
-    db.commit()
-    db.refresh(task)
+    admit_write(request, run_id)
+    async with write_slot():
+        # Verify run exists
+        await get_run_or_404(db, run_id)
+        
+        task = Task(
+            run_id=run_id,
+            title=task_data.title,
+            description=task_data.description,
+            status=TaskStatus.PENDING
+        )
+        db.add(task)
+        await add_run_stats(db, run_id, tasks={task.status: 1})
+        await db.commit()
+    run_detail_cache.invalidate(run_id)
     
     # Broadcast event
     await broadcaster.publish(run_id, {
@@ -92,72 +228,289 @@ async def create_task(run_id: int, task_data: TaskCreate, db: Session = Depends(
     return task
 
 
-@router.get("/runs/{run_id}/tasks", response_model=List[TaskResponse])
-def list_tasks(run_id: int, db: Session = Depends(get_db)):
-    """List all tasks for a run"""
+@router.get("/runs/{run_id}/tasks", response_model=Union[TaskPage, List[TaskResponse]])
+async def list_tasks(
+    run_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List all tasks for a run.
+    Pass `cursor` (empty for the first page) to page through them instead.
+    """
     # Verify run exists
-    run = db.query(Run).filter(Run.id == run_id).first()
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
+    await get_run_or_404(db, run_id)
+    
+    if cursor is not None:
+        tasks, next_cursor = await keyset_page(db, select(Task).where(Task.run_id == run_id), Task, cursor, limit)
+        return json_response(TASK_PAGE, {"items": tasks, "next_cursor": next_cursor})
     
-    tasks = db.query(Task).filter(Task.run_id == run_id).order_by(Task.created_at).all()
-    return tasks
+    result = await db.execute(
+        select(Task).where(Task.run_id == run_id).order_by(Task.created_at)
+    )
+    return json_response(TASK_LIST, result.scalars().all())
 
 
 # Events endpoints
 @router.post("/runs/{run_id}/events", response_model=EventResponse, status_code=201)
-async def create_event(run_id: int, event_data: EventCreate, db: Session = Depends(get_db)):
-    """Append an event to a run"""
-    # Verify run exists
-    run = db.query(Run).filter(Run.id == run_id).first()
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
+async def create_event(
+    run_id: int,
+    event_data: EventCreate,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Append an event to a run.
+    With EVENTS_WRITE_BEHIND the event is queued for a group commit and the
+    response is 202 Accepted; it is streamed to subscribers right away.
+    """
+    admit_write(request, run_id)
     
-    event = Event(
-        run_id=run_id,
-        event_type=event_data.event_type,
-        message=event_data.message,
-        event_metadata=event_data.event_metadata
-    )
-    db.add(event)
-    db.commit()
-    db.refresh(event)
+    if event_buffer.running:
+        # The write-behind queue bounds its own writes
+        await get_run_or_404(db, run_id)
+        try:
+            event = await event_buffer.add(run_id, event_data.event_type, event_data.message, event_data.event_metadata)
+        except BufferFull as e:
+            raise HTTPException(status_code=503, detail=f"Event ingestion is backlogged: {e}", headers={"Retry-After": "1"})
+        await broadcaster.publish(run_id, event_message(event), event_id=event.id)
+        response.status_code = 202
+        return event
+    
+    async with write_slot():
+        # Verify run exists
+        await get_run_or_404(db, run_id)
+        
+        event = Event(
+            run_id=run_id,
+            event_type=event_data.event_type,
+            message=event_data.message,
+            event_metadata=event_data.event_metadata
+        )
+        db.add(event)
+        await add_run_stats(db, run_id, events={event.event_type: 1})
+        await db.commit()
+    run_detail_cache.invalidate(run_id)
     
     # Broadcast to SSE subscribers
-    await broadcaster.publish(run_id, {
-        "type": "event",
-        "id": event.id,
-        "event_type": event.event_type.value,
-        "message": event.message,
-        "event_metadata": event.event_metadata,
-        "created_at": event.created_at.isoformat()
-    })
+    await broadcaster.publish(run_id, event_message(event), event_id=event.id)
     
     return event
 
 
+@router.post("/runs/{run_id}/events/batch", response_model=List[EventResponse], status_code=201)
+async def create_events_batch(
+    run_id: int,
+    events_data: List[EventCreate],
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """Append many events to a run in one transaction (each event counts for rate limiting)"""
+    if not events_data:
+        raise HTTPException(status_code=422, detail="Batch must contain at least one event")
+    if len(events_data) > settings.EVENTS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.EVENTS_BATCH_MAX} events")
+    admit_write(request, run_id, cost=len(events_data))
+    
+    async with write_slot():
+        # Verify run exists (once for the whole batch)
+        await get_run_or_404(db, run_id)
+        
+        # Single multi-row INSERT ... RETURNING, rows come back in input order
+        result = await db.scalars(
+            insert(Event).returning(Event, sort_by_parameter_order=True),
+            [
+                {
+                    "run_id": run_id,
+                    "event_type": event_data.event_type,
+                    "message": event_data.message,
+                    "event_metadata": event_data.event_metadata
+                }
+                for event_data in events_data
+            ]
+        )
+        events = result.all()
+        await add_run_stats(db, run_id, events=Counter(event_data.event_type for event_data in events_data))
+        await db.commit()
+    run_detail_cache.invalidate(run_id)
+    
+    # Broadcast the whole batch as one message
+    await broadcaster.publish(
+        run_id,
+        {"type": "event_batch", "events": [event_message(event) for event in events]},
+        event_id=events[-1].id
+    )
+    
+    return events
+
+
+@router.get("/runs/{run_id}/events", response_model=EventPage)
+async def list_events(
+    run_id: int,
+    cursor: str = "",
+    limit: int = 100,
+    event_type: Optional[EventType] = None,
+    metadata: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Event history for a run, oldest first, paginated with `next_cursor`.
+    `metadata` is a JSON object the event metadata must contain, e.g.
+    {"step": "deploy"}; it is evaluated by Postgres against the GIN index.
+    """
+    # Verify run exists
+    await get_run_or_404(db, run_id)
+    
+    query = select(Event).where(Event.run_id == run_id)
+    if event_type is not None:
+        query = query.where(Event.event_type == event_type)
+    if metadata is not None:
+        try:
+            metadata_filter = json.loads(metadata)
+        except ValueError:
+            metadata_filter = None
+        if not isinstance(metadata_filter, dict):
+            raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+        query = query.where(type_coerce(Event.event_metadata, JSONB).contains(metadata_filter))
+    
+    events, next_cursor = await keyset_page(db, query, Event, cursor, limit)
+    return json_response(EVENT_PAGE, {"items": events, "next_cursor": next_cursor})
+
+
+@router.get("/runs/{run_id}/events/export")
+async def export_events(
+    run_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream a run's full event history as NDJSON, oldest first.
+    Optional `since`/`until` bound created_at (inclusive/exclusive) and
+    `gzip=true` compresses the stream.
+    """
+    # Verify run exists
+    await get_run_or_404(db, run_id)
+    
+    # Plain columns, not ORM entities: rows are written straight to the response
+    query = (
+        select(Event.id, Event.run_id, Event.event_type, Event.message, Event.event_metadata, Event.created_at)
+        .where(Event.run_id == run_id)
+        .order_by(Event.created_at, Event.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    if since is not None:
+        query = query.where(Event.created_at >= since)
+    if until is not None:
+        query = query.where(Event.created_at < until)
+    
+    async def ndjson_generator():
+        compressor = zlib.compressobj(wbits=31) if gzip else None  # wbits=31: gzip container
+        # The request session is closed once the response starts, so the
+        # server-side cursor gets a session of its own
+        async with SessionLocal() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                chunk = b"".join(dumps(event_record(row)) + b"\n" for row in rows)
+                yield compressor.compress(chunk) if compressor else chunk
+        if compressor:
+            yield compressor.flush()
+    
+    headers = {"Content-Disposition": f'attachment; filename="run-{run_id}-events.ndjson"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(ndjson_generator(), media_type="application/x-ndjson", headers=headers)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Last-Event-ID header value as an event id, ignoring anything malformed"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
 @router.get("/runs/{run_id}/stream")
-async def stream_events(run_id: int, db: Session = Depends(get_db)):
-    """SSE stream of events for a run"""
+async def stream_events(
+    run_id: int,
+    last_event_id: Optional[int] = None,
+    batch_ms: Optional[float] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    SSE stream of events for a run.
+    Resumes after the Last-Event-ID header (or ?last_event_id= for clients
+    that reconnect with a fresh EventSource), replaying what was missed.
+    With ?batch_ms= messages that arrive in bursts are coalesced into one
+    frame holding a JSON array (see next_batch_frame).
+    """
     # Verify run exists
-    run = db.query(Run).filter(Run.id == run_id).first()
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
+    await get_run_or_404(db, run_id)
+    
+    resume_from = last_event_id if last_event_id is not None else parse_last_event_id(last_event_id_header)
+    backlog = []
+    resync = False
+    if resume_from is not None and broadcaster.replay_since(run_id, resume_from) is None:
+        # Gap is older than the replay buffer: read it from the events table
+        result = await db.execute(
+            select(Event)
+            .where(Event.run_id == run_id, Event.id > resume_from)
+            .order_by(Event.id)
+            .limit(settings.SSE_REPLAY_DB_LIMIT + 1)
+        )
+        missed = result.scalars().all()
+        if len(missed) > settings.SSE_REPLAY_DB_LIMIT:
+            # Too far behind to replay; the client should reload the run
+            resync = True
+        else:
+            backlog = [
+                encode_frame(encode_payload({"timestamp": event.created_at.isoformat(), **event_message(event)}), event.id)
+                for event in missed
+            ]
+            if missed:
+                resume_from = missed[-1].id
+    
+    window = min(max(batch_ms or 0.0, 0.0), MAX_BATCH_MS) / 1000
     
     async def event_generator():
-        queue = broadcaster.subscribe(run_id)
+        queue = broadcaster.subscribe(run_id, framed=not window)
+        # Taken right after subscribing, so nothing falls between replay and live frames
+        replay = []
+        if resume_from is not None and not resync:
+            replay = broadcaster.replay_since(run_id, resume_from)
+            if replay is None:
+                replay = broadcaster.replay_newer_than(run_id, resume_from)
+        not_before = 0.0
         try:
             # Send initial connected event
-            yield f"data: {json.dumps({'type': 'connected', 'run_id': run_id})}\n\n"
+            yield CONNECTED_FRAME % run_id
+            
+            if resync:
+                yield RESYNC_FRAME % run_id
+                return
+            
+            for frame in backlog:
+                yield frame
+            for frame in replay:
+                yield frame
             
             while True:
-                # Wait for event with timeout for keep-alive
-                try:
-                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
-                    yield f"data: {json.dumps(event)}\n\n"
-                except asyncio.TimeoutError:
-                    # Send keep-alive ping
-                    yield f"data: {json.dumps({'type': 'ping'})}\n\n"
+                # Frames arrive already encoded by the broadcaster, including
+                # its keep-alive pings while the stream is idle
+                frame = await queue.get()
+                if window:
+                    # Unframed entry, coalesced with whatever queued up behind it
+                    frame = await next_batch_frame(queue, frame, not_before, settings.SSE_BATCH_MAX_MESSAGES)
+                    not_before = time.monotonic() + window
+                yield frame
+                
+                # Subscriber fell too far behind and was disconnected
+                if queue.closed and queue.empty():
+                    break
         except Exception as e:
             print(f"SSE error for run {run_id}: {e}")
         finally:
@@ -174,35 +527,86 @@ async def stream_events(run_id: int, db: Session = Depends(get_db)):
     )
 
 
+@router.websocket("/ws")
+async def feed(websocket: WebSocket, encoding: str = JSON_ENCODING, batch_ms: Optional[float] = None):
+    """
+    Live broadcasts for many runs over one WebSocket, batched per frame.
+    Subscribe with {"type": "subscribe", "run_id": N}; see app.core.feed.
+    `encoding=msgpack` sends binary MessagePack frames.
+    """
+    if encoding not in (JSON_ENCODING, MSGPACK_ENCODING):
+        raise WebSocketException(code=1003, reason=f"Unknown encoding: {encoding}")
+    if encoding == MSGPACK_ENCODING and msgpack is None:
+        raise WebSocketException(code=1003, reason="msgpack is not installed on the server")
+    await websocket.accept()
+    await FeedConnection(websocket, encoding, batch_ms).serve()
+
+
+@router.get("/stream/stats")
+def stream_stats():
+    """Broadcaster counters per run channel"""
+    return {"channels": broadcaster.channel_stats()}
+
+
 # Patches endpoints
-@router.post("/patches/preview", response_model=dict)
+@router.post("/patches/preview", response_model=PatchPreviewResponse)
 def preview_patch(patch_data: PatchPreviewRequest):
-    """Preview a patch (normalize diff)"""
-    return {
-        "file_path": patch_data.file_path,
-        "diff_content": patch_data.diff_content,
-        "preview": "Patch preview ready",
-        "status": "preview"
-    }
+    """
+    Parse a unified diff: per-file hunks, added/removed line counts and a
+    normalized form. Results are memoized by diff hash.
+    """
+    sha256 = blob_hash(patch_data.diff_content.encode())
+    key = (sha256, patch_data.file_path)
+    body = patch_preview_cache.get(key)
+    if body is None:
+        try:
+            files = parse_diff(patch_data.diff_content)
+        except DiffParseError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid diff: {e}")
+        if not files:
+            raise HTTPException(status_code=400, detail="Invalid diff: no file headers found")
+        body = encode_payload({
+            "file_path": patch_data.file_path,
+            "status": "preview",
+            "sha256": sha256,
+            "files": [diff.to_dict() for diff in files],
+            "additions": sum(diff.additions for diff in files),
+            "deletions": sum(diff.deletions for diff in files),
+            "normalized": normalize(patch_data.diff_content, files),
+        })
+        patch_preview_cache.put(key, body)
+    return Response(content=body, media_type="application/json")
 
 
 @router.post("/patches/apply", response_model=PatchResponse, status_code=201)
-async def apply_patch(patch_data: PatchApplyRequest, db: Session = Depends(get_db)):
-    """Apply a patch (placeholder - stores patch for now)"""
-    # Verify run exists
-    run = db.query(Run).filter(Run.id == patch_data.run_id).first()
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
-    
-    patch = Patch(
-        run_id=patch_data.run_id,
-        file_path=patch_data.file_path,
-        diff_content=patch_data.diff_content,
-        status=PatchStatus.PENDING
-    )
-    db.add(patch)
-    db.commit()
-    db.refresh(patch)
+async def apply_patch(
+    patch_data: PatchApplyRequest,
+    request: Request,
+    include_diff: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue a patch and return it as pending. With PATCH_WORKSPACE_DIR set it
+    is applied in the background (patch_applied / patch_failed on the run's
+    stream); otherwise it is only stored.
+    The diff is stored once per distinct content; pass include_diff=false
+    to leave it out of the response.
+    """
+    admit_write(request, patch_data.run_id)
+    async with write_slot():
+        # Verify run exists
+        await get_run_or_404(db, patch_data.run_id)
+        
+        diff_sha256, diff_size = await store_blob(db, patch_data.diff_content)
+        patch = Patch(
+            run_id=patch_data.run_id,
+            file_path=patch_data.file_path,
+            diff_sha256=diff_sha256,
+            status=PatchStatus.PENDING
+        )
+        db.add(patch)
+        await db.commit()
+    run_detail_cache.invalidate(patch_data.run_id)
     
     # Broadcast event
     await broadcaster.publish(patch_data.run_id, {
@@ -210,5 +614,126 @@ async def apply_patch(patch_data: PatchApplyRequest, db: Session = Depends(get_d
         "patch_id": patch.id,
         "file_path": patch.file_path
     })
+    patch_engine.submit(patch.id, patch.run_id, patch.file_path)
+    
+    return PatchResponse(
+        id=patch.id,
+        run_id=patch.run_id,
+        file_path=patch.file_path,
+        diff_sha256=diff_sha256,
+        diff_size=diff_size,
+        diff_content=patch_data.diff_content if include_diff else None,
+        status=patch.status,
+        created_at=patch.created_at,
+        applied_at=patch.applied_at
+    )
+
+
+@router.get("/patches/{patch_id}", response_model=PatchResponse)
+async def get_patch(patch_id: int, db: AsyncSession = Depends(get_db)):
+    """Patch status (the diff itself is at /patches/{id}/diff)"""
+    result = await db.execute(
+        select(Patch, PatchBlob.size)
+        .join(PatchBlob, Patch.diff_sha256 == PatchBlob.sha256)
+        .where(Patch.id == patch_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Patch not found")
+    patch, diff_size = row
+    return PatchResponse(
+        id=patch.id,
+        run_id=patch.run_id,
+        file_path=patch.file_path,
+        diff_sha256=patch.diff_sha256,
+        diff_size=diff_size,
+        status=patch.status,
+        created_at=patch.created_at,
+        applied_at=patch.applied_at,
+        error=patch.error
+    )
+
+
+def parse_byte_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single `bytes=` range, or None to send the
+    whole body (no header, or several ranges). Raises 416 if unsatisfiable.
+    """
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    first, _, last = value[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+@router.get("/patches/{patch_id}/diff")
+async def get_patch_diff(
+    patch_id: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Raw diff of a patch, streamed as it is decompressed.
+    Supports a single byte range and ETag revalidation; gzip-stored diffs
+    are sent as stored to clients that accept gzip.
+    """
+    result = await db.execute(
+        select(PatchBlob)
+        .join(Patch, Patch.diff_sha256 == PatchBlob.sha256)
+        .where(Patch.id == patch_id)
+    )
+    blob = result.scalar_one_or_none()
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Patch not found")
+    
+    media_type = "text/x-diff; charset=utf-8"
+    # Content-addressed, so the hash is a strong validator for the body
+    passthrough = blob.encoding == "gzip" and range_header is None and accepts_gzip(accept_encoding)
+    etag = f'"{blob.sha256}.gz"' if passthrough else f'"{blob.sha256}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Vary": "Accept-Encoding"}
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+    
+    byte_range = parse_byte_range(range_header, blob.size)
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{blob.size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            iter_decompressed(blob.encoding, blob.data, start, end + 1),
+            status_code=206,
+            media_type=media_type,
+            headers=headers
+        )
+    
+    if passthrough:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=blob.data, media_type=media_type, headers=headers)
     
-    return patch
+    headers["Content-Length"] = str(blob.size)
+    return StreamingResponse(iter_decompressed(blob.encoding, blob.data), media_type=media_type, headers=headers)
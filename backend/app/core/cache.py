@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import Gauge
+
+
+class RunDetailCache:
+    """
+    In-process TTL/LRU cache of serialized RunDetail responses, keyed by run id.
+
+    Writes to a run invalidate its entry. A cache fill started before an
+    invalidation is discarded, so a response read from the database just
+    before a concurrent write cannot be stored after that write's
+    invalidation. The TTL bounds staleness for writes made by other processes.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = settings.RUN_DETAIL_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.RUN_DETAIL_CACHE_MAX_RUNS
+        # run_id -> (expires_at, body), least recently used first
+        self.entries: "OrderedDict[int, Tuple[float, bytes]]" = OrderedDict()
+        # run_id -> token of the fill in progress
+        self._fills: "OrderedDict[int, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, run_id: int) -> Optional[bytes]:
+        """Cached body for a run, or None if absent or expired"""
+        entry = self.entries.get(run_id)
+        if entry is not None:
+            expires_at, body = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(run_id)
+                self.hits += 1
+                return body
+            del self.entries[run_id]
+        self.misses += 1
+        return None
+
+    def begin(self, run_id: int) -> object:
+        """Start a fill; call before reading the run from the database"""
+        token = object()
+        self._fills[run_id] = token
+        self._fills.move_to_end(run_id)
+        if len(self._fills) > self.max_entries:
+            self._fills.popitem(last=False)
+        return token
+
+    def put(self, run_id: int, body: bytes, token: object):
+        """Store a body unless the run was invalidated since begin()"""
+        if self._fills.get(run_id) is not token:
+            return
+        del self._fills[run_id]
+        if not self.enabled:
+            return
+        self.entries[run_id] = (time.monotonic() + self.ttl, body)
+        self.entries.move_to_end(run_id)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, run_id: int):
+        """Drop a run's entry and cancel any fill in progress"""
+        self._fills.pop(run_id, None)
+        if self.entries.pop(run_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry and cancel every fill (writes may have been missed)"""
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+        self._fills.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+class PatchPreviewCache:
+    """
+    LRU cache of serialized /patches/preview responses, bounded by total
+    body size. Content-addressed keys never go stale. Previews run in the
+    threadpool, so access is locked.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = settings.PATCH_PREVIEW_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.entries: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: Tuple, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class TokenCache:
+    """
+    LRU cache of verified JWT payloads, keyed by the SHA-256 of the token.
+    An entry expires at the token's `exp` claim, so a cached token stops
+    authenticating when verifying it again would start failing. Tokens
+    without `exp` are not cached.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = settings.JWT_CACHE_SIZE if max_entries is None else max_entries
+        # token hash -> (exp, payload), least recently used first
+        self.entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> Optional[dict]:
+        """Cached payload for a token hash, or None if absent or expired"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, payload = entry
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return payload
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: bytes, payload: dict):
+        expires_at = payload.get("exp")
+        if self.max_entries <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        self.entries[key] = (expires_at, payload)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Global cache instances
+run_detail_cache = RunDetailCache()
+patch_preview_cache = PatchPreviewCache()
+token_cache = TokenCache()
+
+Gauge("starkui_run_detail_cache", "RunDetail cache counters and size",
+      lambda: [((name,), run_detail_cache.stats()[name]) for name in ("entries", "hits", "misses", "invalidations")],
+      labelnames=("stat",))
+
+Gauge("starkui_patch_preview_cache", "Patch preview cache counters and size",
+      lambda: [((name,), patch_preview_cache.stats()[name]) for name in ("entries", "bytes", "hits", "misses")],
+      labelnames=("stat",))
+
+Gauge("starkui_jwt_cache", "Verified JWT cache counters and size",
+      lambda: [((name,), token_cache.stats()[name]) for name in ("entries", "hits", "misses")],
+      labelnames=("stat",))
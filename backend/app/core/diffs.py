@@ -0,0 +1,332 @@
+"""
+Single-pass unified diff parser.
+
+Walks the diff text once by line offsets, without splitting it into a list
+of lines. Hunks keep the offsets of their body in the source text, so
+callers can walk the lines again (normalize, apply) without copies.
+Accepts plain `diff -u` output as well as git diffs, including extended
+headers (new/deleted file, rename, binary). Text outside file sections,
+such as commit messages, is ignored.
+"""
+import io
+import re
+from typing import Iterator, List, Optional, Tuple
+
+HUNK_HEADER = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)")
+
+
+class DiffParseError(ValueError):
+    """Malformed diff; `line` is 1-based"""
+
+    def __init__(self, message: str, line: int):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+class Hunk:
+    __slots__ = (
+        "old_start", "old_lines", "new_start", "new_lines", "section",
+        "additions", "deletions", "body_start", "body_end"
+    )
+
+    def __init__(self, old_start: int, old_lines: int, new_start: int, new_lines: int, section: str):
+        self.old_start = old_start
+        self.old_lines = old_lines
+        self.new_start = new_start
+        self.new_lines = new_lines
+        self.section = section
+        self.additions = 0
+        self.deletions = 0
+        # Offsets of the hunk body (the lines after the @@ header) in the diff text
+        self.body_start = 0
+        self.body_end = 0
+
+    def header(self) -> str:
+        def span(start, lines):
+            return f"{start}" if lines == 1 else f"{start},{lines}"
+        section = f" {self.section}" if self.section else ""
+        return f"@@ -{span(self.old_start, self.old_lines)} +{span(self.new_start, self.new_lines)} @@{section}"
+
+    def to_dict(self) -> dict:
+        return {
+            "old_start": self.old_start,
+            "old_lines": self.old_lines,
+            "new_start": self.new_start,
+            "new_lines": self.new_lines,
+            "section": self.section,
+            "additions": self.additions,
+            "deletions": self.deletions,
+        }
+
+
+class FileDiff:
+    __slots__ = ("old_path", "new_path", "binary", "renamed", "hunks", "additions", "deletions", "_headers")
+
+    def __init__(self, old_path: Optional[str] = None, new_path: Optional[str] = None):
+        self.old_path = old_path  # None for an added file
+        self.new_path = new_path  # None for a deleted file
+        self.binary = False
+        self.renamed = False
+        self.hunks: List[Hunk] = []
+        self.additions = 0
+        self.deletions = 0
+        self._headers = False  # seen ---/+++ lines
+
+    @property
+    def change(self) -> str:
+        if self.old_path is None:
+            return "added"
+        if self.new_path is None:
+            return "deleted"
+        if self.renamed or self.old_path != self.new_path:
+            return "renamed"
+        return "modified"
+
+    @property
+    def path(self) -> str:
+        return self.new_path if self.new_path is not None else self.old_path
+
+    def to_dict(self) -> dict:
+        return {
+            "old_path": self.old_path,
+            "new_path": self.new_path,
+            "change": self.change,
+            "binary": self.binary,
+            "additions": self.additions,
+            "deletions": self.deletions,
+            "hunks": [hunk.to_dict() for hunk in self.hunks],
+        }
+
+
+def strip_path(value: str) -> Optional[str]:
+    """Path from a ---/+++ line: drop the timestamp, a/ b/ prefix and /dev/null"""
+    value = value.rstrip("\r").split("\t", 1)[0].strip()
+    if value.startswith('"') and value.endswith('"'):
+        value = value[1:-1]
+    if value == "/dev/null":
+        return None
+    if value[:2] in ("a/", "b/"):
+        return value[2:]
+    return value
+
+
+def git_paths(header: str) -> Tuple[Optional[str], Optional[str]]:
+    """Best-effort paths from `diff --git a/x b/y` (ambiguous if paths contain ' b/')"""
+    header = header.rstrip("\r")
+    if header.startswith("a/") and " b/" in header:
+        old, new = header[2:].split(" b/", 1)
+        return old, new
+    return None, None
+
+
+def iter_lines(text: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """(start, end) offsets of each line in text[start:stop], end excluding \\n and \\r"""
+    stop = len(text) if stop is None else stop
+    position = start
+    while position < stop:
+        newline = text.find("\n", position, stop)
+        end = stop if newline == -1 else newline
+        line_end = end - 1 if end > position and text[end - 1] == "\r" else end
+        yield position, line_end
+        position = end + 1
+
+
+def parse_diff(text: str) -> List[FileDiff]:
+    """Parse a unified diff into files and hunks; raises DiffParseError"""
+    files: List[FileDiff] = []
+    current: Optional[FileDiff] = None
+    lines = iter_lines(text)
+    number = 0
+
+    for start, end in lines:
+        number += 1
+        if text.startswith("diff --git ", start, end):
+            old, new = git_paths(text[start + len("diff --git "):end])
+            current = FileDiff(old, new)
+            files.append(current)
+
+        elif text.startswith("--- ", start, end):
+            old = strip_path(text[start + 4:end])
+            try:
+                plus_start, plus_end = next(lines)
+            except StopIteration:
+                raise DiffParseError("'---' header without '+++'", number)
+            number += 1
+            if not text.startswith("+++ ", plus_start, plus_end):
+                raise DiffParseError("'---' header without '+++'", number)
+            new = strip_path(text[plus_start + 4:plus_end])
+            # A git header opens the section; otherwise ---/+++ starts a new file
+            if current is None or current._headers or current.hunks:
+                current = FileDiff()
+                files.append(current)
+            current.old_path, current.new_path = old, new
+            current._headers = True
+
+        elif text.startswith("@@ ", start, end):
+            if current is None:
+                raise DiffParseError("hunk before any file header", number)
+            match = HUNK_HEADER.match(text, start, end)
+            if not match:
+                raise DiffParseError("malformed hunk header", number)
+            old_start, old_lines, new_start, new_lines, section = match.groups()
+            hunk = Hunk(
+                int(old_start), 1 if old_lines is None else int(old_lines),
+                int(new_start), 1 if new_lines is None else int(new_lines),
+                section.strip()
+            )
+            hunk.body_start = end + 1 if end < len(text) and text[end] == "\n" else (
+                end + 2 if text.startswith("\r\n", end) else len(text)
+            )
+            old_left, new_left = hunk.old_lines, hunk.new_lines
+            body_end = hunk.body_start
+            while old_left > 0 or new_left > 0:
+                try:
+                    line_start, line_end = next(lines)
+                except StopIteration:
+                    raise DiffParseError("diff ends inside a hunk", number)
+                number += 1
+                marker = text[line_start] if line_end > line_start else " "
+                if marker == "+":
+                    new_left -= 1
+                    hunk.additions += 1
+                elif marker == "-":
+                    old_left -= 1
+                    hunk.deletions += 1
+                elif marker == " ":
+                    old_left -= 1
+                    new_left -= 1
+                elif marker == "\\":
+                    pass  # "\ No newline at end of file"
+                else:
+                    raise DiffParseError("hunk has fewer lines than its header says", number)
+                if old_left < 0 or new_left < 0:
+                    raise DiffParseError("hunk has more lines than its header says", number)
+                body_end = text.find("\n", line_end)
+                body_end = len(text) if body_end == -1 else body_end + 1
+            # A "\ No newline at end of file" after the last line
+            if text.startswith("\\", body_end):
+                line_start, line_end = next(lines)
+                number += 1
+                body_end = text.find("\n", line_end)
+                body_end = len(text) if body_end == -1 else body_end + 1
+            hunk.body_end = body_end
+            current.hunks.append(hunk)
+            current.additions += hunk.additions
+            current.deletions += hunk.deletions
+
+        elif current is not None:
+            marker = text[start] if end > start else ""
+            # +/- lines right after a hunk mean its header undercounts
+            # ("-- " is the signature separator of git format-patch)
+            if current.hunks and marker in ("+", "-") and text[start:end] != "-- ":
+                raise DiffParseError("hunk has more lines than its header says", number)
+            if text.startswith("new file mode", start, end):
+                current.old_path = None
+            elif text.startswith("deleted file mode", start, end):
+                current.new_path = None
+            elif text.startswith("rename from ", start, end) or text.startswith("copy from ", start, end):
+                current.renamed = True
+            elif text.startswith("Binary files ", start, end) or text.startswith("GIT binary patch", start, end):
+                current.binary = True
+
+    return files
+
+
+def normalize(text: str, files: List[FileDiff]) -> str:
+    """
+    Canonical form of a parsed diff: ---/+++ headers with a/ b/ prefixes,
+    git-style hunk headers, LF line endings, nothing outside file sections.
+    """
+    out = io.StringIO()
+    for diff in files:
+        old = f"a/{diff.old_path}" if diff.old_path is not None else "/dev/null"
+        new = f"b/{diff.new_path}" if diff.new_path is not None else "/dev/null"
+        if diff.binary and not diff.hunks:
+            out.write(f"Binary files {old} and {new} differ\n")
+            continue
+        out.write(f"--- {old}\n+++ {new}\n")
+        for hunk in diff.hunks:
+            out.write(hunk.header())
+            out.write("\n")
+            for start, end in iter_lines(text, hunk.body_start, hunk.body_end):
+                # Some editors strip the space from empty context lines
+                out.write(text[start:end] if end > start else " ")
+                out.write("\n")
+    return out.getvalue()
+
+
+class PatchApplyError(ValueError):
+    """A file diff that does not match the content it is applied to"""
+
+
+def find_block(lines: List[str], block: List[str], expected: int, floor: int) -> Optional[int]:
+    """Index where `block` occurs in `lines` at or after `floor`, nearest to `expected`"""
+    last = len(lines) - len(block)
+    expected = max(expected, floor)
+    for distance in range(len(lines) + 1):
+        below, above = expected - distance, expected + distance
+        if below < floor and above > last:
+            break
+        for position in (below, above) if distance else (expected,):
+            if floor <= position <= last and all(
+                lines[position + i].rstrip("\r\n") == line for i, line in enumerate(block)
+            ):
+                return position
+    return None
+
+
+def apply_file_diff(original: Optional[str], text: str, diff: FileDiff) -> Optional[str]:
+    """
+    Apply one file's hunks to its content (None if the file does not exist).
+    Hunks may have moved, but their context must match exactly, ignoring
+    line endings; added lines use the file's line ending. Returns the new
+    content, or None when the diff deletes the file.
+    """
+    if diff.binary:
+        raise PatchApplyError("binary diffs cannot be applied")
+    if diff.old_path is None and original:
+        raise PatchApplyError("file to be created already exists")
+    if diff.old_path is not None and original is None:
+        raise PatchApplyError("file does not exist")
+
+    lines = original.splitlines(keepends=True) if original else []
+    eol = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+    out: List[str] = []
+    cursor = 0
+    offset = 0
+    strip_newline = False
+    for number, hunk in enumerate(diff.hunks, 1):
+        old: List[str] = []
+        new: List[str] = []
+        previous = None
+        new_ends_without_newline = False
+        for start, end in iter_lines(text, hunk.body_start, hunk.body_end):
+            marker = text[start] if end > start else " "
+            if marker == "\\":
+                new_ends_without_newline = previous in (" ", "+")
+                continue
+            if marker != "+":
+                old.append(text[start + 1:end])
+            if marker != "-":
+                new.append(text[start + 1:end])
+            previous = marker
+
+        # A hunk without old lines inserts after line old_start
+        anchor = hunk.old_start - 1 if hunk.old_lines else hunk.old_start
+        position = find_block(lines, old, anchor + offset, cursor)
+        if position is None:
+            raise PatchApplyError(f"hunk {number} ({hunk.header()}) does not match the file")
+        out.extend(lines[cursor:position])
+        out.extend(line + eol for line in new)
+        cursor = position + len(old)
+        offset = position - anchor
+        strip_newline = new_ends_without_newline and cursor == len(lines)
+
+    out.extend(lines[cursor:])
+    if strip_newline and out:
+        out[-1] = out[-1].rstrip("\r\n")
+    if diff.new_path is None:
+        if out:
+            raise PatchApplyError("file to be deleted has content the diff does not remove")
+        return None
+    return "".join(out)
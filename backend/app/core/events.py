@@ -1,60 +1,457 @@
 import asyncio
-import json
-from typing import Dict, Set
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
 from datetime import datetime
+from app.core.config import settings
+from app.core.metrics import Gauge, broadcast_dropped, broadcast_fanout_duration, broadcast_heartbeats
+from app.core.serialization import dumps
 
+logger = logging.getLogger(__name__)
 
-class EventBroadcaster:
+# Broadcaster backends
+MEMORY_BACKEND = "memory"
+POSTGRES_BACKEND = "postgres"
+
+
+# Overflow policies for a full subscriber queue
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+# Pre-encoded SSE frames for messages that never change
+PING_PAYLOAD = b'{"type":"ping"}'
+PING_FRAME = b"data: " + PING_PAYLOAD + b"\n\n"
+CONNECTED_FRAME = b'data: {"type":"connected","run_id":%d}\n\n'
+RESYNC_PAYLOAD = b'{"type":"resync","run_id":%d}'
+RESYNC_FRAME = b"data: " + RESYNC_PAYLOAD + b"\n\n"
+# Upper bound for client-chosen batch windows (?batch_ms=)
+MAX_BATCH_MS = 1000
+
+
+def encode_payload(message: dict) -> bytes:
+    """Serialize a message to compact JSON"""
+    return dumps(message)
+
+
+def encode_frame(payload: bytes, event_id: Optional[int] = None) -> bytes:
+    """
+    Wrap an encoded JSON payload into a complete SSE data frame.
+    Persisted events carry an id: line so clients can resume with Last-Event-ID.
+    """
+    if event_id is None:
+        return b"data: " + payload + b"\n\n"
+    return b"id: %d\ndata: %s\n\n" % (event_id, payload)
+
+
+def frame_payload(frame: bytes) -> bytes:
+    """The JSON payload of a frame built by encode_frame"""
+    return frame[frame.index(b"data: ") + 6:-2]
+
+
+async def next_batch_frame(queue: "SubscriberQueue", first: tuple, not_before: float, max_messages: int) -> bytes:
+    """
+    SSE frame for the next entries of an unframed queue, starting with first.
+    not_before is the previous frame's send time (time.monotonic) plus the
+    batch window. An entry arriving earlier means the run is busy: wait until
+    then and send everything queued by that point as one frame holding a
+    JSON array, with the id of the last persisted event in it. On a quiet
+    run a lone entry goes out at once as a normal frame, so latency is
+    unchanged there.
+    """
+    entries = [first]
+    delay = not_before - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    while len(entries) < max_messages and not queue.empty():
+        entries.append(queue.get_nowait())
+    if len(entries) == 1:
+        _, event_id, payload = first
+        return encode_frame(payload, event_id)
+    event_id = next((event_id for _, event_id, _ in reversed(entries) if event_id is not None), None)
+    return encode_frame(b"[" + b",".join(payload for _, _, payload in entries) + b"]", event_id)
+
+
+def event_message(event) -> dict:
+    """Broadcast body for a persisted Event row"""
+    return {
+        "type": "event",
+        "id": event.id,
+        "event_type": event.event_type.value,
+        "message": event.message,
+        "event_metadata": event.event_metadata,
+        "created_at": event.created_at.isoformat()
+    }
+
+
+def event_record(row) -> dict:
+    """NDJSON export/archive record for an events row"""
+    return {
+        "id": row.id,
+        "run_id": row.run_id,
+        "event_type": row.event_type.value,
+        "message": row.message,
+        "event_metadata": row.event_metadata,
+        "created_at": row.created_at.isoformat()
+    }
+
+
+class MemoryBackend:
+    """Delivers publishes to subscribers of this process only (default)"""
+
+    remote = False
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def send(self, run_id: int, payload: bytes, message: dict, event_id: Optional[int]):
+        self.broadcaster.deliver(run_id, payload, event_id)
+
+
+def create_backend(name: str):
+    """Build the broadcaster backend selected by BROADCASTER_BACKEND"""
+    if name == MEMORY_BACKEND:
+        return MemoryBackend()
+    if name == POSTGRES_BACKEND:
+        from app.core.pg_notify import PostgresNotifyBackend
+        return PostgresNotifyBackend()
+    raise ValueError(f"Unknown broadcaster backend: {name}")
+
+
+class SubscriberQueue(asyncio.Queue):
     """
-    Simple in-memory pub/sub for SSE events.
-    Each run_id has its own set of connected clients.
+    Bounded queue of encoded SSE frames for one subscriber.
+    Carries the overflow policy applied when the consumer falls behind.
+
+    An unframed queue (batched SSE, WebSocket feeds) receives
+    (run_id, event_id, payload) tuples instead, and may be attached to
+    several runs. Queues with heartbeat set get the broadcaster's ping when
+    idle for a whole heartbeat interval.
     """
-    
+
+    def __init__(self, maxsize: int, policy: str, framed: bool = True, heartbeat: bool = True):
+        super().__init__(maxsize=maxsize)
+        self.policy = policy
+        self.framed = framed
+        self.heartbeat = heartbeat
+        # Nothing offered since the last heartbeat
+        self.idle = False
+        self.dropped = 0
+        self.closed = False
+
+
+class ChannelStats:
+    """Counters for a single run channel"""
+
+    __slots__ = ("published", "dropped", "disconnected")
+
     def __init__(self):
-        self.channels: Dict[int, Set[asyncio.Queue]] = {}
-    
-    def subscribe(self, run_id: int) -> asyncio.Queue:
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+
+class EventBroadcaster:
+    """
+    Pub/sub for SSE events.
+    Each run_id has its own set of connected clients in this process.
+
+    Publishes go through a backend: the in-memory backend delivers straight
+    to local subscribers, while the Postgres backend relays them over
+    LISTEN/NOTIFY so every worker process fans out to its own clients.
+
+    Each published message is encoded to an SSE frame once and the same
+    immutable bytes object is handed to every subscriber queue.
+
+    The most recent frames of each run are kept in a bounded replay buffer so
+    a reconnecting client can resume from its Last-Event-ID without a query.
+    The buffers are capped by frame count and by bytes, per run and in total,
+    dropping the oldest frames first. A frame bigger than a run's byte budget
+    is not kept; the run's buffer is dropped instead, so resumes across it
+    read from the database.
+
+    One heartbeat task per process pings subscribers that got nothing for
+    a whole SSE_HEARTBEAT_SECONDS interval, instead of a keep-alive timer
+    per connection.
+
+    Subscriber queues are bounded; publish never waits on a slow consumer.
+    When a queue is full the subscriber's overflow policy decides whether the
+    oldest or the newest message is dropped, or whether the subscriber is
+    disconnected with a "resync" marker so the client reloads state.
+    """
+
+    def __init__(self, queue_maxsize: Optional[int] = None, overflow_policy: Optional[str] = None, backend=None):
+        self.backend = backend or create_backend(settings.BROADCASTER_BACKEND)
+        self.backend.broadcaster = self
+        self.channels: Dict[int, Set[SubscriberQueue]] = {}
+        self.stats: Dict[int, ChannelStats] = {}
+        # run_id -> recent (event_id, frame) pairs, least recently published run first
+        self.history: "OrderedDict[int, Deque[Tuple[Optional[int], bytes]]]" = OrderedDict()
+        # run_id -> bytes of the frames in its history, and their total
+        self.history_bytes: Dict[int, int] = {}
+        self.replay_bytes = 0
+        self.replay_buffer_size = settings.SSE_REPLAY_BUFFER_SIZE
+        self.replay_max_runs = settings.SSE_REPLAY_MAX_RUNS
+        self.replay_max_bytes_per_run = settings.SSE_REPLAY_MAX_BYTES_PER_RUN
+        self.replay_max_bytes = settings.SSE_REPLAY_MAX_BYTES
+        self.queue_maxsize = queue_maxsize or settings.SSE_QUEUE_MAXSIZE
+        self.overflow_policy = overflow_policy or settings.SSE_OVERFLOW_POLICY
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {self.overflow_policy}")
+        self.heartbeat_interval = settings.SSE_HEARTBEAT_SECONDS
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._started = False
+
+    async def start(self):
+        """Start the backend (e.g. open the LISTEN connection) and the heartbeat"""
+        if not self._started:
+            await self.backend.start()
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+            self._started = True
+
+    async def stop(self):
+        """Stop the heartbeat and the backend"""
+        if self._started:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+            await self.backend.stop()
+            self._started = False
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.ping_idle()
+
+    def ping_idle(self):
+        """
+        Queue the shared ping for subscribers offered nothing since the last
+        call, and mark every subscriber idle again. A quiet stream is pinged
+        between one and two intervals after its last message.
+        """
+        pinged = 0
+        for run_id, queues in self.channels.items():
+            for queue in queues:
+                if not queue.heartbeat:
+                    continue
+                if queue.idle and not queue.full():
+                    queue.put_nowait(PING_FRAME if queue.framed else (run_id, None, PING_PAYLOAD))
+                    pinged += 1
+                queue.idle = True
+        if pinged:
+            broadcast_heartbeats.inc(amount=pinged)
+
+    def subscribe(
+        self, run_id: int, maxsize: Optional[int] = None, policy: Optional[str] = None, framed: bool = True
+    ) -> SubscriberQueue:
         """Subscribe to events for a specific run"""
-        queue = asyncio.Queue()
-        
+        policy = policy or self.overflow_policy
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        queue = SubscriberQueue(maxsize or self.queue_maxsize, policy, framed)
+        self.attach(run_id, queue)
+        return queue
+
+    def attach(self, run_id: int, queue: SubscriberQueue):
+        """Add an existing (unframed) queue to another run's subscribers"""
         if run_id not in self.channels:
             self.channels[run_id] = set()
-        
+            self.stats[run_id] = ChannelStats()
+
         self.channels[run_id].add(queue)
-        return queue
-    
+
     def unsubscribe(self, run_id: int, queue: asyncio.Queue):
         """Unsubscribe from events for a specific run"""
         if run_id in self.channels:
             self.channels[run_id].discard(queue)
-            
+
             # Clean up empty channel
             if not self.channels[run_id]:
                 del self.channels[run_id]
-    
-    async def publish(self, run_id: int, event_data: dict):
-        """Publish an event to all subscribers of a run"""
-        if run_id not in self.channels:
-            return
-        
-        # Create SSE formatted message
+                del self.stats[run_id]
+
+    async def publish(self, run_id: int, event_data: dict, event_id: Optional[int] = None):
+        """
+        Publish an event to all subscribers of a run.
+        event_id is the persisted Event id, used as the SSE id for resuming.
+        Never raises: callers publish after committing, and a failed
+        broadcast must not turn a successful write into an error.
+        """
+        # Create message, serialized once for all subscribers
         message = {
             "timestamp": datetime.utcnow().isoformat(),
             **event_data
         }
-        
-        # Send to all subscribers
-        dead_queues = set()
+        try:
+            await self.backend.send(run_id, encode_payload(message), message, event_id)
+        except Exception as e:
+            logger.error(f"Broadcast of {event_data.get('type')} for run {run_id} failed: {e}")
+            # Subscribers missed it; resumes must go to the database
+            self.forget(run_id)
+
+    def deliver(self, run_id: int, payload: bytes, event_id: Optional[int] = None):
+        """Fan an encoded payload out to this process's subscribers of a run"""
+        frame = encode_frame(payload, event_id)
+
+        # Record for replay even when nobody is connected right now
+        self._remember(run_id, event_id, frame)
+
+        if run_id not in self.channels:
+            return
+
+        stats = self.stats[run_id]
+        stats.published += 1
+        start = time.perf_counter()
+
+        # Send to all subscribers without waiting on any of them
+        entry = (run_id, event_id, payload)
+        disconnected = []
         for queue in self.channels[run_id]:
-            try:
-                await queue.put(message)
-            except Exception:
-                dead_queues.add(queue)
-        
-        # Clean up dead queues
-        for queue in dead_queues:
+            if not self._offer(run_id, queue, frame if queue.framed else entry, stats):
+                disconnected.append(queue)
+
+        # Drop subscribers that were disconnected for falling behind
+        for queue in disconnected:
             self.channels[run_id].discard(queue)
+        broadcast_fanout_duration.observe(time.perf_counter() - start)
+
+    def _offer(self, run_id: int, queue: SubscriberQueue, frame, stats: ChannelStats) -> bool:
+        """
+        Put a frame (or unframed entry) on a subscriber queue, applying its
+        overflow policy. Returns False if the subscriber has been disconnected.
+        """
+        queue.idle = False
+        try:
+            queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        queue.dropped += 1
+        stats.dropped += 1
+        broadcast_dropped.inc(queue.policy)
+
+        if queue.policy == DROP_OLDEST:
+            queue.get_nowait()
+            queue.put_nowait(frame)
+            return True
+
+        if queue.policy == DROP_NEWEST:
+            return True
+
+        # DISCONNECT: replace the backlog with a resync marker
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC_FRAME % run_id if queue.framed else (run_id, None, RESYNC_PAYLOAD % run_id))
+        queue.closed = True
+        stats.disconnected += 1
+        return False
+
+    def _remember(self, run_id: int, event_id: Optional[int], frame: bytes):
+        """Append a frame to the run's replay buffer, evicting the oldest frames"""
+        size = len(frame)
+        if size > self.replay_max_bytes_per_run or size > self.replay_max_bytes:
+            # Too big to keep; without it the buffer would replay with a gap
+            self.forget(run_id)
+            return
+
+        history = self.history.get(run_id)
+        if history is None:
+            history = self.history[run_id] = deque()
+            self.history_bytes[run_id] = 0
+            if len(self.history) > self.replay_max_runs:
+                self.forget(next(iter(self.history)))
+        else:
+            self.history.move_to_end(run_id)
+        history.append((event_id, frame))
+        self.history_bytes[run_id] += size
+        self.replay_bytes += size
+
+        while len(history) > self.replay_buffer_size or self.history_bytes[run_id] > self.replay_max_bytes_per_run:
+            self._evict_oldest(run_id)
+        # Over the total budget: oldest frames of the least recently published runs go first
+        while self.replay_bytes > self.replay_max_bytes:
+            self._evict_oldest(next(iter(self.history)))
+
+    def _evict_oldest(self, run_id: int):
+        history = self.history[run_id]
+        _, frame = history.popleft()
+        self.history_bytes[run_id] -= len(frame)
+        self.replay_bytes -= len(frame)
+        if not history:
+            del self.history[run_id]
+            del self.history_bytes[run_id]
+
+    def forget(self, run_id: int):
+        """Drop a run's replay buffer (e.g. when a broadcast could not be recorded)"""
+        if self.history.pop(run_id, None) is not None:
+            self.replay_bytes -= self.history_bytes.pop(run_id)
+
+    def forget_all(self):
+        """Drop every replay buffer (e.g. after broadcasts from other processes were missed)"""
+        self.history.clear()
+        self.history_bytes.clear()
+        self.replay_bytes = 0
+
+    def replay_since(self, run_id: int, last_event_id: int) -> Optional[List[bytes]]:
+        """
+        Frames published after the one with last_event_id, in publish order.
+        Returns None if that event is no longer (or not yet) in the buffer.
+        """
+        history = self.history.get(run_id)
+        if not history:
+            return None
+
+        frames = []
+        for event_id, frame in reversed(history):
+            if event_id == last_event_id:
+                frames.reverse()
+                return frames
+            frames.append(frame)
+        return None
+
+    def replay_newer_than(self, run_id: int, last_event_id: int) -> List[bytes]:
+        """Buffered frames for events with an id greater than last_event_id"""
+        history = self.history.get(run_id, ())
+        return [frame for event_id, frame in history if event_id is not None and event_id > last_event_id]
+
+    def channel_stats(self) -> Dict[int, dict]:
+        """Per-channel subscriber counts, drop counters and queue depths"""
+        result = {}
+        for run_id, queues in self.channels.items():
+            stats = self.stats[run_id]
+            depths = [queue.qsize() for queue in queues]
+            result[run_id] = {
+                "subscribers": len(queues),
+                "published": stats.published,
+                "dropped": stats.dropped,
+                "disconnected": stats.disconnected,
+                "queue_depth_total": sum(depths),
+                "queue_depth_max": max(depths, default=0),
+            }
+        return result
 
 
 # Global broadcaster instance
 broadcaster = EventBroadcaster()
+
+Gauge("starkui_sse_channels", "Runs with at least one SSE subscriber in this process",
+      lambda: [((), len(broadcaster.channels))])
+Gauge("starkui_sse_subscribers", "Connected SSE subscribers in this process",
+      lambda: [((), sum(len(queues) for queues in broadcaster.channels.values()))])
+Gauge("starkui_sse_replay_bytes", "Bytes of frames held in replay buffers in this process",
+      lambda: [((), broadcaster.replay_bytes)])
+Gauge("starkui_sse_queue_depth", "Frames waiting in subscriber queues (total and deepest queue)",
+      lambda: [
+          (("total",), sum(queue.qsize() for queues in broadcaster.channels.values() for queue in queues)),
+          (("max",), max((queue.qsize() for queues in broadcaster.channels.values() for queue in queues), default=0)),
+      ],
+      labelnames=("stat",))
@@ -0,0 +1,184 @@
+"""
+Multiplexed WebSocket feed of run broadcasts.
+
+One connection subscribes to any number of runs (up to WS_MAX_SUBSCRIPTIONS)
+through a single broadcaster queue. The writer sends what has queued up
+within the batch window as one frame, grouped by run, instead of one frame
+per message:
+
+    {"type": "events", "runs": {"12": [<message>, ...], "14": [...]}}
+
+Messages are the same JSON objects the SSE stream sends, spliced into the
+frame as the broadcaster's pre-encoded bytes. With `encoding=msgpack` (needs
+the msgpack package) frames are binary MessagePack with integer run ids.
+Compression is the WebSocket permessage-deflate extension, negotiated by
+uvicorn's websockets implementation (`--ws-per-message-deflate`, on by
+default) when the client offers it.
+
+Client messages (JSON text):
+    {"type": "subscribe", "run_id": 12, "last_event_id": 340}
+    {"type": "unsubscribe", "run_id": 12}
+The server answers with "subscribed" / "unsubscribed" / "error" messages.
+A subscribe with last_event_id replays what the run's replay buffer still
+holds after that event; if the event is no longer buffered the run gets a
+"resync" message and the client should reload it over HTTP. If the
+connection falls behind under the disconnect overflow policy it receives
+"resync" and is closed with code 1013 (try again later).
+"""
+import asyncio
+import json
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import WebSocket, WebSocketDisconnect
+from app.core.config import settings
+from app.core.events import MAX_BATCH_MS, RESYNC_PAYLOAD, SubscriberQueue, broadcaster, frame_payload
+from app.core.serialization import dumps, orjson
+from app.db.session import SessionLocal
+from app.models.models import Run
+
+try:
+    import msgpack
+except ImportError:  # optional; only JSON frames are offered
+    msgpack = None
+
+JSON_ENCODING = "json"
+MSGPACK_ENCODING = "msgpack"
+
+# Queue entries are (run_id, event_id, payload); control replies use run_id None
+Entry = Tuple[Optional[int], Optional[int], bytes]
+
+
+def loads(payload: bytes):
+    return orjson.loads(payload) if orjson is not None else json.loads(payload)
+
+
+class FeedConnection:
+    """One WebSocket client and its run subscriptions"""
+
+    def __init__(self, websocket: WebSocket, encoding: str = JSON_ENCODING, batch_ms: Optional[float] = None):
+        self.websocket = websocket
+        self.encoding = encoding
+        batch_ms = settings.WS_BATCH_WINDOW_MS if batch_ms is None else batch_ms
+        self.window = min(max(batch_ms, 0.0), MAX_BATCH_MS) / 1000
+        self.max_batch = settings.WS_BATCH_MAX_MESSAGES
+        # Keep-alive is left to WebSocket protocol pings
+        self.queue = SubscriberQueue(
+            broadcaster.queue_maxsize, broadcaster.overflow_policy, framed=False, heartbeat=False
+        )
+        self.runs: Set[int] = set()
+
+    async def serve(self):
+        """Run until the client disconnects; always unsubscribes"""
+        writer = asyncio.create_task(self._write())
+        try:
+            reader = asyncio.create_task(self._read())
+            done, _ = await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+            for task in (reader, writer):
+                if task not in done:
+                    task.cancel()
+            await asyncio.gather(reader, writer, return_exceptions=True)
+        finally:
+            for run_id in self.runs:
+                broadcaster.unsubscribe(run_id, self.queue)
+            self.runs.clear()
+
+    def _reply(self, message: dict):
+        """Queue a control message behind whatever is already queued"""
+        try:
+            self.queue.put_nowait((None, None, dumps(message)))
+        except asyncio.QueueFull:
+            pass
+
+    async def _read(self):
+        try:
+            while True:
+                try:
+                    request = json.loads(await self.websocket.receive_text())
+                    kind = request["type"]
+                    run_id = int(request["run_id"])
+                    last_event_id = request.get("last_event_id")
+                    last_event_id = None if last_event_id is None else int(last_event_id)
+                except (ValueError, KeyError, TypeError):
+                    self._reply({"type": "error", "detail": "expected {\"type\": \"subscribe\" | \"unsubscribe\", \"run_id\": <int>}"})
+                    continue
+                if kind == "subscribe":
+                    await self._subscribe(run_id, last_event_id)
+                elif kind == "unsubscribe":
+                    if run_id in self.runs:
+                        self.runs.discard(run_id)
+                        broadcaster.unsubscribe(run_id, self.queue)
+                    self._reply({"type": "unsubscribed", "run_id": run_id})
+                else:
+                    self._reply({"type": "error", "run_id": run_id, "detail": f"unknown message type {kind!r}"})
+        except WebSocketDisconnect:
+            pass
+
+    async def _subscribe(self, run_id: int, last_event_id: Optional[int]):
+        if run_id in self.runs:
+            self._reply({"type": "subscribed", "run_id": run_id})
+            return
+        if len(self.runs) >= settings.WS_MAX_SUBSCRIPTIONS:
+            self._reply({"type": "error", "run_id": run_id, "detail": f"at most {settings.WS_MAX_SUBSCRIPTIONS} subscriptions"})
+            return
+        async with SessionLocal() as db:
+            if await db.get(Run, run_id) is None:
+                self._reply({"type": "error", "run_id": run_id, "detail": "Run not found"})
+                return
+
+        # No await from here on: nothing published in between can be missed
+        # or delivered ahead of the replay
+        broadcaster.attach(run_id, self.queue)
+        self.runs.add(run_id)
+        self._reply({"type": "subscribed", "run_id": run_id})
+        if last_event_id is None:
+            return
+        replay = broadcaster.replay_since(run_id, last_event_id)
+        if replay is not None and len(replay) < self.queue.maxsize - self.queue.qsize():
+            for frame in replay:
+                self.queue.put_nowait((run_id, None, frame_payload(frame)))
+        elif not self.queue.full():
+            self.queue.put_nowait((run_id, None, RESYNC_PAYLOAD % run_id))
+
+    async def _write(self):
+        while True:
+            batch: List[Entry] = [await self.queue.get()]
+            if self.window:
+                # Let the batch fill up for one window
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self._send(batch)
+            if self.queue.closed and self.queue.empty():
+                await self.websocket.close(code=1013)
+                return
+
+    async def _send(self, batch: List[Entry]):
+        """Send a batch as event frames, with control replies in between in order"""
+        runs: Dict[int, List[bytes]] = {}
+        for run_id, _, payload in batch:
+            if run_id is not None:
+                runs.setdefault(run_id, []).append(payload)
+                continue
+            if runs:
+                await self._send_events(runs)
+                runs = {}
+            await self._send_frame(payload, None)
+        if runs:
+            await self._send_events(runs)
+
+    async def _send_events(self, runs: Dict[int, List[bytes]]):
+        if self.encoding == MSGPACK_ENCODING:
+            await self._send_frame(None, {
+                "type": "events",
+                "runs": {run_id: [loads(payload) for payload in payloads] for run_id, payloads in runs.items()},
+            })
+            return
+        # Splice the pre-encoded payloads into the frame without decoding them
+        body = b",".join(b'"%d":[%s]' % (run_id, b",".join(payloads)) for run_id, payloads in runs.items())
+        await self._send_frame(b'{"type":"events","runs":{' + body + b"}}", None)
+
+    async def _send_frame(self, payload: Optional[bytes], message: Optional[dict]):
+        """Send JSON bytes (or a message to encode) in the connection's encoding"""
+        if self.encoding == MSGPACK_ENCODING:
+            await self.websocket.send_bytes(msgpack.packb(message if message is not None else loads(payload)))
+        else:
+            await self.websocket.send_text((payload if payload is not None else dumps(message)).decode())
@@ -1,7 +1,9 @@
+import hashlib
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from app.core.config import settings
+from app.core.cache import token_cache
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -34,6 +36,20 @@ def verify_token(token: str) -> Optional[dict]:
         return None
 
 
+def verify_token_cached(token: str) -> Optional[dict]:
+    """
+    verify_token, remembering valid payloads until their `exp`.
+    A repeated token costs a SHA-256 and a dict lookup instead of a decode.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = verify_token(token)
+        if payload is not None:
+            token_cache.put(key, payload)
+    return payload
+
+
 def parse_bearer_token(authorization: Optional[str]) -> Optional[str]:
     """
     Extract token from Authorization: Bearer <token> header.
@@ -0,0 +1,214 @@
+"""
+Prometheus metrics, rendered by GET /metrics in the text exposition format.
+
+Everything is updated from the event loop thread, so metrics are plain
+counters without locks. Per-request cost is a couple of dict lookups and
+a few small objects; label sets are created once and reused.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Fan-out and pool wait are usually far below a millisecond
+FAST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class HistogramChild:
+    """One label set of a histogram"""
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot: above the largest bucket
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.children: Dict[Tuple, HistogramChild] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values) -> HistogramChild:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for values, child in self.children.items():
+            base = format_labels(self.labelnames, values)
+            prefix = base[:-1] + "," if base else "{"
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                yield f'{self.name}_bucket{prefix}le="{bound}"}} {cumulative}'
+            cumulative += child.counts[-1]
+            yield f'{self.name}_bucket{prefix}le="+Inf"}} {cumulative}'
+            yield f"{self.name}_sum{base} {child.sum}"
+            yield f"{self.name}_count{base} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: Dict[Tuple, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, *values, amount: float = 1):
+        self.values[values] = self.values.get(values, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for values, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labelnames, values)} {value}"
+
+
+class Gauge:
+    """Gauge computed at scrape time; callback returns [(label values, value)]"""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], List[Tuple[Tuple, float]]], labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+        REGISTRY.append(self)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for values, value in self.callback():
+            yield f"{self.name}{format_labels(self.labelnames, values)} {value}"
+
+
+REGISTRY: List = []
+
+
+def render_metrics() -> bytes:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.append("")
+    return "\n".join(lines).encode()
+
+
+# HTTP
+http_request_duration = Histogram(
+    "starkui_http_request_duration_seconds", "Request latency by route (until the response body is sent)",
+    ("method", "route")
+)
+http_requests = Counter("starkui_http_requests_total", "Requests by route and status", ("method", "route", "status"))
+http_request_db_time = Histogram(
+    "starkui_http_request_db_seconds", "Database time spent per request by route", ("method", "route")
+)
+
+# Database
+db_queries = Counter("starkui_db_queries_total", "SQL statements executed")
+db_query_duration = Histogram("starkui_db_query_duration_seconds", "SQL statement execution time")
+db_pool_wait = Histogram(
+    "starkui_db_pool_wait_seconds", "Time to obtain a pooled connection, including opening a new one", buckets=FAST_BUCKETS
+)
+
+# Broadcaster
+broadcast_fanout_duration = Histogram(
+    "starkui_broadcast_fanout_seconds", "Time to hand one published frame to every local subscriber",
+    buckets=FAST_BUCKETS
+)
+broadcast_dropped = Counter("starkui_broadcast_dropped_total", "Frames dropped for slow subscribers", ("policy",))
+broadcast_heartbeats = Counter("starkui_broadcast_heartbeats_total", "Keep-alive pings queued for idle subscribers")
+
+
+class RequestTiming:
+    """Per-request accumulator for database time"""
+
+    __slots__ = ("db_time",)
+
+    def __init__(self):
+        self.db_time = 0.0
+
+
+current_request: ContextVar[Optional[RequestTiming]] = ContextVar("current_request", default=None)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request under its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timing = RequestTiming()
+        token = current_request.set(timing)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            # Set by the router once the request matched a route
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_request_duration.labels(method, path).observe(time.perf_counter() - start)
+            http_request_db_time.labels(method, path).observe(timing.db_time)
+            http_requests.inc(method, path, status)
+
+
+def instrument_engine(sync_engine):
+    """Time every statement and attribute it to the current request"""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_start
+        db_queries.inc()
+        db_query_duration.observe(elapsed)
+        timing = current_request.get()
+        if timing is not None:
+            timing.db_time += elapsed
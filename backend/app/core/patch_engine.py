@@ -0,0 +1,242 @@
+"""
+Applies stored patches to files under PATCH_WORKSPACE_DIR.
+
+POST /patches/apply stores the patch as pending and hands it to this
+engine, which applies it off the request path in a thread pool of
+PATCH_APPLY_WORKERS. Patches to different files are applied in parallel;
+patches to the same file are applied one after another in submission order.
+Each patch ends up APPLIED or FAILED (with `error` set), and progress is
+broadcast on the run's channel as patch_applying, patch_applied and
+patch_failed messages.
+
+A patch targets its `file_path`, relative to the workspace, and its diff
+must describe exactly one file. Patches still pending at startup (the
+process stopped before applying them) are queued again, oldest first.
+
+Every worker process re-queues the same pending patches, so a patch is
+claimed before it is applied. On Postgres the claim is an advisory lock on
+the patch id, held while its status is re-checked, the file is written and
+the outcome is recorded (only over a status that is still pending), all on
+one connection. At most PATCH_APPLY_WORKERS patches are claimed at a time,
+so a burst of patches cannot exhaust the connection pool. Whoever
+gets the lock second finds the patch already done and skips it. Per-file
+ordering is kept in memory, so it only holds within one process; send a
+workspace's patches to a single process when their order matters.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+from sqlalchemy import select, text, update
+from app.core.config import settings
+from app.core.diffs import DiffParseError, PatchApplyError, apply_file_diff, parse_diff
+from app.core.events import broadcaster
+from app.core.metrics import Gauge
+from app.db.blobs import decompress
+from app.db.session import SessionLocal, engine
+from app.models.models import Patch, PatchBlob, PatchStatus
+
+logger = logging.getLogger(__name__)
+
+# First key of the pg_advisory_lock(key, patch_id) pair claiming a patch
+PATCH_LOCK_KEY = 0x50544348
+
+
+def workspace_path(workspace: str, file_path: str) -> str:
+    """Absolute path of a patch target, refusing paths outside the workspace"""
+    root = os.path.realpath(workspace)
+    path = os.path.realpath(os.path.join(root, file_path))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise PatchApplyError(f"{file_path} is outside the workspace")
+    return path
+
+
+def apply_to_workspace(workspace: str, file_path: str, encoding: str, data: bytes):
+    """Apply a stored diff to one workspace file (runs in a worker thread)"""
+    text = decompress(encoding, data).decode()
+    try:
+        files = parse_diff(text)
+    except DiffParseError as e:
+        raise PatchApplyError(f"invalid diff: {e}")
+    if len(files) != 1:
+        raise PatchApplyError(f"diff touches {len(files)} files; submit one patch per file")
+
+    path = workspace_path(workspace, file_path)
+    original = None
+    if os.path.exists(path):
+        # newline="" keeps the file's own line endings
+        with open(path, encoding="utf-8", newline="") as f:
+            original = f.read()
+
+    content = apply_file_diff(original, text, files[0])
+    if content is None:
+        os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name so readers never see a half-applied file
+    with open(path + ".patch-tmp", "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+    os.replace(path + ".patch-tmp", path)
+
+
+class PatchApplyEngine:
+    """Thread pool plus a per-file chain of apply tasks"""
+
+    def __init__(self, workspace: Optional[str] = None, workers: Optional[int] = None):
+        self.workspace = settings.PATCH_WORKSPACE_DIR if workspace is None else workspace
+        self.workers = workers or settings.PATCH_APPLY_WORKERS
+        self.running = False
+        self.applied = 0
+        self.failed = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # normalized file path -> last apply task queued for it
+        self._tails: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(self.workers)
+
+    @property
+    def queued(self) -> int:
+        return len(self._tasks)
+
+    async def start(self):
+        if self.running or not self.workspace:
+            return
+        os.makedirs(self.workspace, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="patch-apply")
+        self.running = True
+
+        # Patches accepted before the last shutdown that were never applied
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(Patch.id, Patch.run_id, Patch.file_path)
+                .where(Patch.status == PatchStatus.PENDING)
+                .order_by(Patch.id)
+            )
+            pending = result.all()
+        for patch_id, run_id, file_path in pending:
+            self.submit(patch_id, run_id, file_path)
+        if pending:
+            logger.info(f"Re-queued {len(pending)} pending patches")
+
+    async def stop(self):
+        """Stop accepting patches and wait for queued ones to finish"""
+        if not self.running:
+            return
+        self.running = False
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown()
+        self._executor = None
+
+    def submit(self, patch_id: int, run_id: int, file_path: str):
+        """Queue a stored patch behind earlier patches to the same file"""
+        if not self.running:
+            return
+        key = os.path.normpath(file_path)
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._apply(patch_id, run_id, file_path, previous))
+        self._tails[key] = task
+        self._tasks.add(task)
+
+        def done(task: asyncio.Task):
+            self._tasks.discard(task)
+            if self._tails.get(key) is task:
+                del self._tails[key]
+
+        task.add_done_callback(done)
+
+    async def _apply(self, patch_id: int, run_id: int, file_path: str, previous: Optional[asyncio.Task]):
+        if previous is not None:
+            # Its outcome does not matter, only that it is finished
+            await asyncio.wait([previous])
+
+        try:
+            # At most PATCH_APPLY_WORKERS patches hold a connection at a time
+            async with self._slots:
+                await self._claim_and_apply(patch_id, run_id, file_path)
+        except Exception as e:
+            # Stays pending and is retried at the next startup
+            logger.error(f"Could not apply patch {patch_id}: {e}")
+
+    async def _claim_and_apply(self, patch_id: int, run_id: int, file_path: str):
+        """Apply a patch under its advisory lock (Postgres), all on one connection"""
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            locking = conn.dialect.name == "postgresql"
+            if locking and not await conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key, :id)"), {"key": PATCH_LOCK_KEY, "id": patch_id}
+            ):
+                return
+            try:
+                await self._apply_claimed(conn, patch_id, run_id, file_path)
+            finally:
+                if locking:
+                    await conn.execute(
+                        text("SELECT pg_advisory_unlock(:key, :id)"), {"key": PATCH_LOCK_KEY, "id": patch_id}
+                    )
+
+    async def _apply_claimed(self, conn, patch_id: int, run_id: int, file_path: str):
+        result = await conn.execute(
+            select(Patch.status, PatchBlob.encoding, PatchBlob.data)
+            .join(PatchBlob, Patch.diff_sha256 == PatchBlob.sha256)
+            .where(Patch.id == patch_id)
+        )
+        row = result.one_or_none()
+        if row is None or row.status != PatchStatus.PENDING:
+            # Applied by another process in the meantime
+            return
+
+        await broadcaster.publish(run_id, {"type": "patch_applying", "patch_id": patch_id, "file_path": file_path})
+        error = None
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, apply_to_workspace, self.workspace, file_path, row.encoding, row.data
+            )
+        except (PatchApplyError, OSError, UnicodeDecodeError) as e:
+            error = str(e)
+        except Exception as e:
+            logger.exception(f"Applying patch {patch_id} failed")
+            error = f"internal error: {e}"
+
+        status = PatchStatus.FAILED if error else PatchStatus.APPLIED
+        result = await conn.execute(
+            update(Patch)
+            .where(Patch.id == patch_id, Patch.status == PatchStatus.PENDING)
+            .values(
+                status=status,
+                error=error,
+                applied_at=None if error else datetime.now(timezone.utc)
+            )
+        )
+        if result.rowcount == 0:
+            # Recorded elsewhere in the meantime (e.g. by a process without the lock on SQLite)
+            return
+
+        if error:
+            self.failed += 1
+            await broadcaster.publish(run_id, {
+                "type": "patch_failed", "patch_id": patch_id, "file_path": file_path, "error": error
+            })
+        else:
+            self.applied += 1
+            await broadcaster.publish(run_id, {"type": "patch_applied", "patch_id": patch_id, "file_path": file_path})
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workspace": self.workspace,
+            "workers": self.workers,
+            "queued": self.queued,
+            "applied": self.applied,
+            "failed": self.failed,
+        }
+
+
+# Global engine instance (started only when PATCH_WORKSPACE_DIR is set)
+patch_engine = PatchApplyEngine()
+
+Gauge("starkui_patch_engine", "Patch apply engine queue depth and outcomes",
+      lambda: [((name,), patch_engine.stats()[name]) for name in ("queued", "applied", "failed")],
+      labelnames=("stat",))
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from typing import List, Optional
+import psycopg
+from psycopg import sql
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.cache import run_detail_cache
+from app.core.events import encode_payload, event_message
+from app.db.event_buffer import event_buffer
+from app.db.session import engine, SessionLocal
+from app.models.models import Event
+
+logger = logging.getLogger(__name__)
+
+# Notification kinds: "<run_id>:i:<event_id>:<json>" or "<run_id>:r:<event_id>:<timestamp>"
+# (event_id is empty for broadcasts that are not persisted events)
+INLINE = "i"
+REFERENCE = "r"
+
+
+class PostgresNotifyBackend:
+    """
+    Relays broadcaster publishes through Postgres LISTEN/NOTIFY.
+
+    Each process holds a single listener connection no matter how many SSE
+    clients it serves. Every notification, including this process's own, is
+    handed to the local broadcaster for fan-out. Postgres caps NOTIFY payloads
+    at 8000 bytes, so event messages above BROADCASTER_PG_MAX_INLINE_BYTES are
+    sent by reference (the event id) and re-read by receiving processes.
+    Larger event batches are split into inline-sized event_batch messages,
+    each carrying the id of its last event. A reference to a write-behind
+    event is only sent once its row has been inserted.
+
+    A notification that cannot be handled is logged and skipped. Anything
+    sent while the listener was reconnecting is lost, so after a reconnect
+    the replay buffers and the RunDetail cache of this process are dropped.
+    """
+
+    remote = True
+
+    def __init__(self, dsn: Optional[str] = None, channel: Optional[str] = None, max_inline_bytes: Optional[int] = None):
+        # psycopg wants a libpq URI, not a SQLAlchemy driver URL
+        self.dsn = (dsn or settings.DATABASE_URL).replace("postgresql+psycopg://", "postgresql://")
+        self.channel = channel or settings.BROADCASTER_PG_CHANNEL
+        self.max_inline_bytes = max_inline_bytes or settings.BROADCASTER_PG_MAX_INLINE_BYTES
+        self._listener: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    async def start(self):
+        """Open the listener connection and wait until LISTEN is active"""
+        self._listener = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            logger.warning("Broadcaster LISTEN connection not ready yet; retrying in background")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def send(self, run_id: int, payload: bytes, message: dict, event_id: Optional[int]):
+        """NOTIFY all processes, inline or by reference depending on size"""
+        if len(payload) <= self.max_inline_bytes:
+            notifications = [self._inline(run_id, event_id, payload)]
+        elif message.get("type") == "event":
+            notifications = [self._reference(run_id, event_id, message["timestamp"])]
+            # Receivers re-read the row, so it has to be written first
+            if event_buffer.after_write(event_id, lambda: self._notify(notifications)):
+                return
+        elif message.get("type") == "event_batch":
+            notifications = self._split_batch(run_id, message)
+        else:
+            logger.warning(f"Dropping oversized {message.get('type')} broadcast for run {run_id}")
+            return
+        await self._notify(notifications)
+
+    async def _notify(self, notifications: List[str]):
+        # One transaction, so the notifications arrive together and in order
+        async with engine.connect() as conn:
+            for notification in notifications:
+                await conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.channel, "payload": notification}
+                )
+            await conn.commit()
+
+    @staticmethod
+    def _inline(run_id: int, event_id: Optional[int], payload: bytes) -> str:
+        return f"{run_id}:{INLINE}:{'' if event_id is None else event_id}:{payload.decode()}"
+
+    @staticmethod
+    def _reference(run_id: int, event_id: int, timestamp: str) -> str:
+        return f"{run_id}:{REFERENCE}:{event_id}:{timestamp}"
+
+    def _split_batch(self, run_id: int, message: dict) -> List[str]:
+        """
+        Notifications for an oversized event_batch: consecutive events packed
+        into event_batch messages up to the inline limit. An event too large
+        on its own is sent by reference, as a single event message.
+        """
+        timestamp = message["timestamp"]
+        overhead = len(encode_payload({**message, "events": []}))
+        notifications = []
+        chunk: List[dict] = []
+        size = overhead
+
+        def flush():
+            if chunk:
+                payload = encode_payload({**message, "events": chunk})
+                notifications.append(self._inline(run_id, chunk[-1]["id"], payload))
+
+        for event in message["events"]:
+            length = len(encode_payload(event))
+            if overhead + length > self.max_inline_bytes:
+                flush()
+                chunk, size = [], overhead
+                notifications.append(self._reference(run_id, event["id"], timestamp))
+                continue
+            # Every event after the first in a chunk also takes a comma
+            if chunk and size + 1 + length > self.max_inline_bytes:
+                flush()
+                chunk, size = [], overhead
+            size += length + (1 if chunk else 0)
+            chunk.append(event)
+        flush()
+        return notifications
+
+    async def _listen(self):
+        """Listener loop; reconnects if the connection drops"""
+        reconnecting = False
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+                async with conn:
+                    await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                    if reconnecting:
+                        # Whatever was broadcast in between never reached this process
+                        self.broadcaster.forget_all()
+                        run_detail_cache.clear()
+                        logger.info("Broadcaster LISTEN connection restored")
+                    reconnecting = True
+                    self._ready.set()
+                    async for notify in conn.notifies():
+                        try:
+                            await self._dispatch(notify.payload)
+                        except Exception as e:
+                            # Malformed or foreign NOTIFY on the channel, or a failed re-read
+                            logger.error(f"Skipping broadcast notification {notify.payload[:80]!r}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._ready.clear()
+                logger.error(f"Broadcaster LISTEN connection failed: {e}; reconnecting")
+                await asyncio.sleep(1.0)
+
+    async def _dispatch(self, notification: str):
+        """Deliver one notification to local subscribers"""
+        run_id, kind, event_id, body = notification.split(":", 3)
+        run_id = int(run_id)
+        event_id = int(event_id) if event_id else None
+        # Every write to a run is broadcast, so this also keeps the RunDetail
+        # cache of this process in step with writes made by other processes
+        run_detail_cache.invalidate(run_id)
+
+        if kind == INLINE:
+            self.broadcaster.deliver(run_id, body.encode(), event_id)
+            return
+
+        # Only fetch referenced events when someone here is listening; the
+        # replay buffer now has a gap, so resumes must go to the database
+        if run_id not in self.broadcaster.channels:
+            self.broadcaster.forget(run_id)
+            return
+
+        try:
+            async with SessionLocal() as db:
+                event = await db.get(Event, event_id)
+        except Exception:
+            self.broadcaster.forget(run_id)
+            raise
+        if event is None:
+            self.broadcaster.forget(run_id)
+            return
+        message = {"timestamp": body, **event_message(event)}
+        self.broadcaster.deliver(run_id, encode_payload(message), event_id)
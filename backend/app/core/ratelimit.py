@@ -0,0 +1,121 @@
+"""
+Admission control for the write endpoints.
+
+Token buckets, kept in memory per worker, limit write requests per run and
+per client, so one runaway agent cannot starve the others of database time
+and broadcaster fan-out. A bucket refills at `rate` tokens per second up to
+`burst`. A write costs one token per row it adds, so an event batch costs
+its length. A cost above `burst` is admitted once the bucket is full and
+leaves it in debt, which later writes wait out. Each limiter tracks at most
+`max_keys` buckets and evicts the least recently used one first; an evicted
+key starts again with a full bucket.
+
+WriteSlots caps how many write transactions run at once
+(DB_WRITE_CONCURRENCY). Requests over the cap queue for a free slot instead
+of all waiting on the connection pool, and give up after
+DB_WRITE_QUEUE_TIMEOUT so latency degrades gradually.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Hashable, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+
+rate_limited = Counter("starkui_rate_limited_total", "Write requests rejected with 429", ("limit",))
+
+
+class TokenBucketLimiter:
+    """Token bucket per key; a rate of 0 disables the limiter"""
+
+    def __init__(self, name: str, rate: float, burst: float, max_keys: Optional[int] = None):
+        self.name = name
+        self.rate = rate
+        # A burst of 0 means one second's worth of requests
+        self.burst = max(burst or rate, 1.0)
+        self.max_keys = max_keys or settings.RATE_LIMIT_MAX_KEYS
+        # key -> (tokens, last refill), least recently used first
+        self.buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self, key: Hashable, now: float) -> float:
+        tokens, last = self.buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - last) * self.rate)
+
+    def wait_time(self, key: Hashable, cost: float = 1.0) -> float:
+        """Seconds until a request costing `cost` tokens would be admitted (0 if now)"""
+        if not self.enabled:
+            return 0.0
+        tokens = self._refill(key, time.monotonic())
+        # More than a full bucket is admitted once the bucket is full
+        needed = min(cost, self.burst)
+        return 0.0 if tokens >= needed else (needed - tokens) / self.rate
+
+    def consume(self, key: Hashable, cost: float = 1.0):
+        """Take `cost` tokens; call after wait_time() returned 0"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        self.buckets[key] = (self._refill(key, now) - cost, now)
+        self.buckets.move_to_end(key)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+
+
+class WriteSlotTimeout(Exception):
+    """No write slot freed up within DB_WRITE_QUEUE_TIMEOUT"""
+
+
+class WriteSlots:
+    """Semaphore around database write transactions; a limit of 0 disables it"""
+
+    def __init__(self, limit: Optional[int] = None, timeout: Optional[float] = None):
+        self.limit = settings.DB_WRITE_CONCURRENCY if limit is None else limit
+        self.timeout = settings.DB_WRITE_QUEUE_TIMEOUT if timeout is None else timeout
+        self._semaphore = asyncio.Semaphore(self.limit) if self.limit > 0 else None
+        self.in_flight = 0
+        self.waiting = 0
+        self.timeouts = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a write slot for the duration of the block; raises WriteSlotTimeout"""
+        if self._semaphore is None:
+            yield
+            return
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise WriteSlotTimeout(f"no write slot within {self.timeout:g}s")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "timeouts": self.timeouts,
+        }
+
+
+# Global limiters (per worker process)
+run_limiter = TokenBucketLimiter("run", settings.RATE_LIMIT_RUN_PER_SECOND, settings.RATE_LIMIT_RUN_BURST)
+client_limiter = TokenBucketLimiter("client", settings.RATE_LIMIT_CLIENT_PER_SECOND, settings.RATE_LIMIT_CLIENT_BURST)
+write_slots = WriteSlots()
+
+Gauge("starkui_db_write_slots", "Write transactions running and queued under DB_WRITE_CONCURRENCY",
+      lambda: [((name,), write_slots.stats()[name]) for name in ("in_flight", "waiting", "timeouts")],
+      labelnames=("stat",))
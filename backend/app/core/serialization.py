@@ -0,0 +1,49 @@
+"""
+JSON encoding for API responses.
+
+FastAPI handles an endpoint that returns ORM rows with a response_model in
+three steps. It validates the rows into models, dumps the models to plain
+Python data and then runs json.dumps over that data. json_response()
+replaces all three for the hot read endpoints. pydantic-core validates the
+rows once, straight from their attributes, and writes JSON bytes in Rust.
+The route keeps its response_model, so the OpenAPI schema does not change.
+
+FastJSONResponse is the app's default response class and encodes everything
+else with orjson when that package is installed. Non-string dict keys are
+written as strings, like json.dumps does; values orjson cannot encode
+(integers wider than 64 bits) fall back to the json module.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # optional; the standard json module is used instead
+    orjson = None
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON for plain Python data"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson.JSONEncodeError, e.g. an integer wider than 64 bits
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_response(adapter: TypeAdapter, value: Any, status_code: int = 200) -> Response:
+    """Validate ORM rows (or dicts of them) once and serialize straight to JSON bytes"""
+    body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return Response(content=body, status_code=status_code, media_type="application/json")
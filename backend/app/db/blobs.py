@@ -0,0 +1,125 @@
+"""
+Content-addressed storage for patch diffs.
+
+Each distinct diff body is stored once in patch_blobs, keyed by the SHA-256
+of its UTF-8 text and compressed with zstd (if the zstandard package is
+installed) or gzip. Patches reference blobs by hash, so an agent
+re-submitting the same diff across retries and runs adds no extra storage.
+"""
+import asyncio
+import gzip
+import hashlib
+import zlib
+from typing import Iterator, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.models import PatchBlob
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is used instead
+    zstandard = None
+
+ZSTD_LEVEL = 9
+GZIP_LEVEL = 6
+# Bodies larger than this are compressed off the event loop
+THREAD_THRESHOLD = 256 * 1024
+# Chunk size when streaming a blob out
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def blob_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def compression() -> str:
+    """Encoding for new blobs from PATCH_COMPRESSION (auto prefers zstd)"""
+    if settings.PATCH_COMPRESSION == "auto":
+        return "zstd" if zstandard is not None else "gzip"
+    if settings.PATCH_COMPRESSION == "zstd" and zstandard is None:
+        raise RuntimeError("PATCH_COMPRESSION=zstd needs the zstandard package")
+    return settings.PATCH_COMPRESSION
+
+
+def compress(content: bytes, encoding: Optional[str] = None) -> Tuple[str, bytes]:
+    """(encoding, data) for a blob; kept uncompressed if compression does not help"""
+    encoding = encoding or compression()
+    if encoding == "zstd":
+        data = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+    elif encoding == "gzip":
+        data = gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return "identity", content
+    if len(data) >= len(content):
+        return "identity", content
+    return encoding, data
+
+
+def iter_decompressed(encoding: str, data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Yield bytes [start, end) of a blob's uncompressed content, decompressing
+    incrementally so large diffs are never held uncompressed in full.
+    """
+    if encoding == "zstd":
+        chunks = zstandard.ZstdDecompressor().read_to_iter(data, read_size=STREAM_CHUNK_SIZE, write_size=STREAM_CHUNK_SIZE)
+    elif encoding == "gzip":
+        def gunzip():
+            decompressor = zlib.decompressobj(wbits=31)
+            for offset in range(0, len(data), STREAM_CHUNK_SIZE):
+                chunk = decompressor.decompress(data[offset:offset + STREAM_CHUNK_SIZE])
+                if chunk:
+                    yield chunk
+            tail = decompressor.flush()
+            if tail:
+                yield tail
+        chunks = gunzip()
+    else:
+        chunks = (data[offset:offset + STREAM_CHUNK_SIZE] for offset in range(0, len(data), STREAM_CHUNK_SIZE))
+
+    position = 0
+    for chunk in chunks:
+        chunk_end = position + len(chunk)
+        if chunk_end > start:
+            yield chunk[max(start - position, 0):None if end is None else end - position]
+        position = chunk_end
+        if end is not None and position >= end:
+            return
+
+
+def decompress(encoding: str, data: bytes) -> bytes:
+    return b"".join(iter_decompressed(encoding, data))
+
+
+async def store_blob(db: AsyncSession, text: str) -> Tuple[str, int]:
+    """
+    Add a diff body to patch_blobs (a no-op if it is already there) in the
+    caller's transaction. Returns (sha256, uncompressed size).
+
+    Only a new body is compressed; a known one costs a hash and a lookup.
+    The insert still ignores conflicts, for a concurrent request storing
+    the same body.
+    """
+    content = text.encode()
+    sha256 = blob_hash(content)
+    if await db.scalar(select(PatchBlob.sha256).where(PatchBlob.sha256 == sha256)) is not None:
+        return sha256, len(content)
+
+    if len(content) > THREAD_THRESHOLD:
+        encoding, data = await asyncio.to_thread(compress, content)
+    else:
+        encoding, data = compress(content)
+
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    await db.execute(
+        dialect.insert(PatchBlob)
+        .values(sha256=sha256, encoding=encoding, size=len(content), data=data)
+        .on_conflict_do_nothing(index_elements=["sha256"])
+    )
+    return sha256, len(content)
+
+
+async def load_blob(db: AsyncSession, sha256: str) -> Optional[PatchBlob]:
+    result = await db.execute(select(PatchBlob).where(PatchBlob.sha256 == sha256))
+    return result.scalar_one_or_none()
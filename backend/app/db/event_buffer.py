@@ -0,0 +1,271 @@
+"""
+Write-behind buffer for single-event ingestion (EVENTS_WRITE_BEHIND, Postgres only).
+
+POST /runs/{id}/events normally commits each event before responding. In
+write-behind mode the event gets its id and created_at up front, is queued
+here and published to SSE subscribers right away, and a background task
+inserts queued events in group commits of up to EVENTS_WRITE_BEHIND_BATCH
+rows, or whatever arrived within EVENTS_WRITE_BEHIND_WINDOW_MS.
+
+The queue holds at most EVENTS_WRITE_BEHIND_MAX_PENDING events; when it is
+full, callers wait (backpressure) and eventually get BufferFull. stop()
+refuses new events and flushes everything queued before returning.
+
+Work that needs the row to exist (the Postgres broadcaster sending a large
+event by reference) can be deferred with after_write().
+
+Ids are reserved from events_id_seq in blocks, so with several workers ids
+are unique but not strictly in commit order across processes.
+"""
+import asyncio
+import logging
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+from sqlalchemy import insert, text
+from sqlalchemy.exc import IntegrityError
+from app.core.cache import run_detail_cache
+from app.core.config import settings
+from app.core.metrics import Gauge
+from app.db.run_stats import add_run_stats
+from app.db.session import SessionLocal, engine
+from app.models.models import Event
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the queue on shutdown
+STOP = object()
+
+
+class BufferFull(Exception):
+    """The write-behind queue stayed full for longer than the put timeout"""
+
+
+class EventWriteBuffer:
+    """Bounded queue of event rows flushed to the database in group commits"""
+
+    def __init__(
+        self,
+        max_batch: Optional[int] = None,
+        window_ms: Optional[float] = None,
+        max_pending: Optional[int] = None,
+        put_timeout: float = 5.0
+    ):
+        self.max_batch = max_batch or settings.EVENTS_WRITE_BEHIND_BATCH
+        self.window = (window_ms if window_ms is not None else settings.EVENTS_WRITE_BEHIND_WINDOW_MS) / 1000
+        self.max_pending = max_pending or settings.EVENTS_WRITE_BEHIND_MAX_PENDING
+        self.put_timeout = put_timeout
+        self.running = False
+        self.flushed = 0
+        self.batches = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._ids: Deque[int] = deque()
+        self._ids_lock = asyncio.Lock()
+        # Ids queued but not written yet, and callbacks waiting on them
+        self._unwritten: Set[int] = set()
+        self._after_write: Dict[int, List[Callable[[], Awaitable]]] = {}
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        if self.running:
+            return
+        if engine.dialect.name != "postgresql":
+            logger.warning("EVENTS_WRITE_BEHIND needs PostgreSQL; events are committed per request")
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._flusher = asyncio.create_task(self._run())
+        self.running = True
+
+    async def stop(self):
+        """Stop accepting events and flush everything already queued"""
+        if not self.running:
+            return
+        self.running = False
+        await self._queue.put(STOP)
+        await self._flusher
+        self._flusher = None
+
+        # Requests that were already waiting on a full queue when we stopped;
+        # each row taken here wakes another waiter, so drain until empty
+        while not self._queue.empty():
+            leftover = []
+            while not self._queue.empty():
+                row = self._queue.get_nowait()
+                if row is not STOP:
+                    leftover.append(row)
+            if leftover:
+                await self._write(leftover, final=True)
+
+    async def _reserve_id(self) -> int:
+        """Next id from a block reserved from the events sequence"""
+        async with self._ids_lock:
+            if not self._ids:
+                async with engine.connect() as conn:
+                    result = await conn.execute(
+                        text("SELECT nextval('events_id_seq') FROM generate_series(1, :count)"),
+                        {"count": self.max_batch}
+                    )
+                    self._ids.extend(result.scalars())
+            return self._ids.popleft()
+
+    async def add(self, run_id: int, event_type, message: str, event_metadata) -> Event:
+        """
+        Queue an event and return it with its id and created_at assigned.
+        Raises BufferFull if the queue does not free up within put_timeout,
+        or once stop() has begun.
+        """
+        row = {
+            "id": await self._reserve_id(),
+            "run_id": run_id,
+            "event_type": event_type,
+            "message": message,
+            "event_metadata": event_metadata,
+            "created_at": datetime.now(timezone.utc),
+        }
+        if not self.running:
+            raise BufferFull("write-behind buffer is shutting down")
+        self._unwritten.add(row["id"])
+        try:
+            await asyncio.wait_for(self._queue.put(row), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self._unwritten.discard(row["id"])
+            raise BufferFull(f"{self.max_pending} events waiting to be written")
+        return Event(**row)
+
+    def after_write(self, event_id: int, callback: Callable[[], Awaitable]) -> bool:
+        """
+        Run callback once the queued event has been written (or dropped).
+        Returns False, without registering, if the event is not waiting to
+        be written, so the caller can act right away.
+        """
+        if event_id not in self._unwritten:
+            return False
+        self._after_write.setdefault(event_id, []).append(callback)
+        return True
+
+    async def _run(self):
+        """Collect batches by size or time window and write them"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is STOP:
+                return
+            batch = [first]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            try:
+                await self._write(batch, final=stopping)
+            except Exception as e:
+                # The flusher must outlive any one batch, or the queue fills
+                # up and every write-behind POST fails until a restart
+                self.failed += len(batch)
+                logger.exception(f"Dropping {len(batch)} buffered events: {e}")
+                await self._written(batch)
+
+    async def _write(self, batch: List[dict], final: bool = False):
+        """Insert one batch, retrying while the database is unavailable"""
+        attempt = 0
+        # Rows not written yet; shrinks as the row-by-row fallback makes progress
+        rows = list(batch)
+        row_by_row = False
+        while True:
+            try:
+                if row_by_row:
+                    await self._insert_each(rows)
+                else:
+                    await self._insert(rows)
+                break
+            except IntegrityError as e:
+                logger.error(f"Write-behind batch rejected ({e.orig}); retrying row by row")
+                row_by_row = True
+            except Exception as e:
+                attempt += 1
+                # Keep retrying while running (callers see backpressure);
+                # give up after a few attempts when draining on shutdown
+                if (final or not self.running) and attempt >= 3:
+                    self.failed += len(rows)
+                    logger.error(f"Dropping {len(rows)} buffered events after {attempt} failed writes: {e}")
+                    await self._written(batch)
+                    return
+                logger.error(f"Write-behind flush failed ({e}); retrying")
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 5.0))
+
+        self.batches += 1
+        for run_id in {row["run_id"] for row in batch}:
+            run_detail_cache.invalidate(run_id)
+        await self._written(batch)
+
+    async def _written(self, batch: List[dict]):
+        """Release the batch's ids and run the callbacks waiting on them"""
+        for row in batch:
+            self._unwritten.discard(row["id"])
+            for callback in self._after_write.pop(row["id"], ()):
+                try:
+                    await callback()
+                except Exception as e:
+                    logger.error(f"Callback after writing event {row['id']} failed: {e}")
+
+    async def _insert(self, rows: List[dict]):
+        """Insert rows and bump run counters in one transaction"""
+        async with SessionLocal() as db:
+            await db.execute(insert(Event), rows)
+            counts = defaultdict(Counter)
+            for row in rows:
+                counts[row["run_id"]][row["event_type"]] += 1
+            for run_id, events in counts.items():
+                await add_run_stats(db, run_id, events=events)
+            await db.commit()
+        self.flushed += len(rows)
+
+    async def _insert_each(self, rows: List[dict]):
+        """
+        Fallback for a rejected batch: skip only the rows that fail. Rows are
+        removed from `rows` as they are handled, so on any other error the
+        caller retries just the rest.
+        """
+        while rows:
+            row = rows[0]
+            try:
+                await self._insert([row])
+            except IntegrityError as e:
+                self.failed += 1
+                logger.error(f"Dropping buffered event {row['id']} for run {row['run_id']}: {e.orig}")
+            rows.pop(0)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+
+# Global buffer instance (started only when EVENTS_WRITE_BEHIND is enabled)
+event_buffer = EventWriteBuffer()
+
+Gauge("starkui_write_behind", "Write-behind buffer queue depth and counters",
+      lambda: [((name,), event_buffer.stats()[name]) for name in ("pending", "flushed", "batches", "failed")],
+      labelnames=("stat",))
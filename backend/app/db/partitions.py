@@ -0,0 +1,190 @@
+"""
+Monthly partition maintenance for the events table (Postgres only).
+
+Creates partitions EVENTS_PARTITION_PREMAKE_MONTHS ahead and, when
+EVENTS_RETENTION_DAYS is set, detaches and drops partitions whose whole
+range is past retention, optionally archiving them first as gzipped NDJSON
+in EVENTS_ARCHIVE_DIR. Expired events are never DELETEd row by row.
+
+There is no DEFAULT partition: Postgres refuses DETACH ... CONCURRENTLY
+while one exists. So if no pass runs before the premake horizon ends,
+inserts fail ("no partition of relation "events" found for row") until one
+does; a pass creates the missing months and writes succeed again.
+
+Runs in the API process every EVENTS_PARTITION_MAINTENANCE_INTERVAL seconds,
+or once with
+
+    python -m app.db.partitions
+"""
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import column, select, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core.config import settings
+from app.core.events import event_record
+from app.core.serialization import dumps
+from app.db.run_stats import reconcile_run_stats
+from app.db.session import SessionLocal, engine
+from app.models.models import Event
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key, so only one process maintains partitions at a time
+MAINTENANCE_LOCK_KEY = 0x5354524B
+
+UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    month = moment.month - 1 + months
+    return moment.replace(year=moment.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"events_y{start.year:04d}m{start.month:02d}"
+
+
+async def list_partitions(conn: AsyncConnection) -> List[Tuple[str, datetime, bool]]:
+    """(name, upper bound, detach pending) of every events partition"""
+    result = await conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'events'::regclass
+    """))
+    partitions = []
+    for name, bound, detach_pending in result:
+        match = UPPER_BOUND.search(bound)
+        if match:
+            partitions.append((name, datetime.fromisoformat(match.group(1)), detach_pending))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(await conn.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('events'))"
+    )))
+
+
+async def create_partitions(conn: AsyncConnection, partitions: list, now: datetime) -> List[str]:
+    """Create monthly partitions from the newest existing one up to the premake horizon"""
+    # Continue from the newest partition even if it has already ended, so
+    # the covered range never has gaps
+    start = partitions[-1][1] if partitions else month_start(now)
+    horizon = add_months(month_start(now), settings.EVENTS_PARTITION_PREMAKE_MONTHS + 1)
+
+    created = []
+    while start < horizon:
+        name = partition_name(start)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF events "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+        ))
+        created.append(name)
+        start = add_months(start, 1)
+    return created
+
+
+async def archive_partition(name: str, archive_dir: str) -> str:
+    """Write a partition's rows to <archive_dir>/<name>.ndjson.gz (export format)"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.ndjson.gz")
+    partition = table(name, *(column(c.name, c.type) for c in Event.__table__.columns))
+    query = (
+        select(partition)
+        .order_by(partition.c.created_at, partition.c.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+
+    # Written under a temporary name so a partial file is never mistaken for an archive
+    archive = await asyncio.to_thread(gzip.open, path + ".tmp", "wb")
+    try:
+        async with SessionLocal() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                chunk = b"".join(dumps(event_record(row)) + b"\n" for row in rows)
+                await asyncio.to_thread(archive.write, chunk)
+    finally:
+        await asyncio.to_thread(archive.close)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+async def drop_expired_partitions(conn: AsyncConnection, partitions: list, now: datetime) -> List[str]:
+    """Detach, archive (if configured) and drop partitions past retention"""
+    cutoff = now - timedelta(days=settings.EVENTS_RETENTION_DAYS)
+    dropped = []
+    for name, upper, detach_pending in partitions:
+        if upper > cutoff:
+            break
+        run_ids = (await conn.execute(text(f"SELECT DISTINCT run_id FROM {name}"))).scalars().all()
+        if settings.EVENTS_ARCHIVE_DIR:
+            path = await archive_partition(name, settings.EVENTS_ARCHIVE_DIR)
+            logger.info(f"Archived events partition {name} to {path}")
+
+        # CONCURRENTLY only blocks writers to this partition, not to events
+        if detach_pending:
+            await conn.execute(text(f"ALTER TABLE events DETACH PARTITION {name} FINALIZE"))
+        else:
+            await conn.execute(text(f"ALTER TABLE events DETACH PARTITION {name} CONCURRENTLY"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+        logger.info(f"Dropped events partition {name} (events before {upper.isoformat()})")
+
+        # Counters still include the dropped events
+        await reconcile_run_stats(run_ids)
+    return dropped
+
+
+async def maintain_event_partitions(now: Optional[datetime] = None) -> dict:
+    """One maintenance pass; a no-op unless events is a partitioned Postgres table"""
+    now = now or datetime.now(timezone.utc)
+    summary = {"created": [], "dropped": []}
+    async with engine.connect() as conn:
+        # DETACH ... CONCURRENTLY cannot run inside a transaction block
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not await is_partitioned(conn):
+            return summary
+        if not await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}):
+            return summary
+        try:
+            partitions = await list_partitions(conn)
+            summary["created"] = await create_partitions(conn, partitions, now)
+            if settings.EVENTS_RETENTION_DAYS > 0:
+                summary["dropped"] = await drop_expired_partitions(conn, partitions, now)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+    return summary
+
+
+async def maintain_periodically(interval: float):
+    """Background loop for EVENTS_PARTITION_MAINTENANCE_INTERVAL (first pass at startup)"""
+    while True:
+        try:
+            await maintain_event_partitions()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Events partition maintenance failed: {e}")
+        await asyncio.sleep(interval)
+
+
+async def main():
+    summary = await maintain_event_partitions()
+    print(f"Created partitions: {', '.join(summary['created']) or '-'}")
+    print(f"Dropped partitions: {', '.join(summary['dropped']) or '-'}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Incrementally maintained per-run counters (the run_stats table).
+
+Writers call add_run_stats in the same transaction as their task/event
+inserts. reconcile_run_stats recomputes the counters from the child tables
+and fixes any that drifted; run it with
+
+    python -m app.db.run_stats
+
+or periodically in the API process via RUN_STATS_RECONCILE_INTERVAL.
+"""
+import asyncio
+import logging
+from collections import Counter
+from typing import Iterable, Mapping, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import SessionLocal, engine
+from app.models.models import Run, RunStats, Task, Event, TaskStatus, EventType
+
+logger = logging.getLogger(__name__)
+
+# Runs recounted per reconciliation transaction
+RECONCILE_CHUNK_SIZE = 500
+
+COUNTER_COLUMNS = [f"tasks_{status.value}" for status in TaskStatus] + \
+    [f"events_{event_type.value}" for event_type in EventType]
+
+
+async def add_run_stats(
+    db: AsyncSession,
+    run_id: int,
+    tasks: Optional[Mapping[TaskStatus, int]] = None,
+    events: Optional[Mapping[EventType, int]] = None
+):
+    """
+    Add to a run's counters without committing.
+    A missing run_stats row is left for reconciliation to recreate.
+    """
+    table = RunStats.__table__
+    values = {}
+    for status, count in (tasks or {}).items():
+        column = table.c[f"tasks_{status.value}"]
+        values[column.name] = column + count
+    for event_type, count in (events or {}).items():
+        column = table.c[f"events_{event_type.value}"]
+        values[column.name] = column + count
+    if values:
+        await db.execute(update(table).where(table.c.run_id == run_id).values(**values, updated_at=func.now()))
+
+
+async def _reconcile_chunk(db: AsyncSession, run_ids: list) -> int:
+    """Recount one chunk of runs in the current transaction"""
+    # Lock the counter rows first: writers touching these runs wait for us,
+    # and every write already counted has committed and is visible below
+    result = await db.execute(
+        select(RunStats).where(RunStats.run_id.in_(run_ids)).with_for_update()
+    )
+    stats = {row.run_id: row for row in result.scalars()}
+    for run_id in run_ids:
+        if run_id not in stats:
+            stats[run_id] = RunStats(run_id=run_id, **{name: 0 for name in COUNTER_COLUMNS})
+            db.add(stats[run_id])
+    await db.flush()
+
+    actual = {run_id: Counter() for run_id in run_ids}
+    result = await db.execute(
+        select(Task.run_id, Task.status, func.count())
+        .where(Task.run_id.in_(run_ids))
+        .group_by(Task.run_id, Task.status)
+    )
+    for run_id, status, count in result:
+        actual[run_id][f"tasks_{status.value}"] = count
+    result = await db.execute(
+        select(Event.run_id, Event.event_type, func.count())
+        .where(Event.run_id.in_(run_ids))
+        .group_by(Event.run_id, Event.event_type)
+    )
+    for run_id, event_type, count in result:
+        actual[run_id][f"events_{event_type.value}"] = count
+
+    corrected = 0
+    for run_id, row in stats.items():
+        drift = {name: actual[run_id][name] for name in COUNTER_COLUMNS if getattr(row, name) != actual[run_id][name]}
+        if drift:
+            for name, value in drift.items():
+                setattr(row, name, value)
+            corrected += 1
+    return corrected
+
+
+async def reconcile_run_stats(run_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Rebuild counters from the tasks and events tables.
+    Returns the number of runs whose counters were corrected.
+    """
+    corrected = 0
+    async with SessionLocal() as db:
+        if run_ids is not None:
+            pending = sorted(run_ids)
+            for start in range(0, len(pending), RECONCILE_CHUNK_SIZE):
+                corrected += await _reconcile_chunk(db, pending[start:start + RECONCILE_CHUNK_SIZE])
+                await db.commit()
+            return corrected
+
+        last_id = 0
+        while True:
+            result = await db.execute(
+                select(Run.id).where(Run.id > last_id).order_by(Run.id).limit(RECONCILE_CHUNK_SIZE)
+            )
+            chunk = result.scalars().all()
+            if not chunk:
+                return corrected
+            corrected += await _reconcile_chunk(db, chunk)
+            await db.commit()
+            last_id = chunk[-1]
+
+
+async def reconcile_periodically(interval: float):
+    """Background loop for RUN_STATS_RECONCILE_INTERVAL"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            corrected = await reconcile_run_stats()
+            if corrected:
+                logger.warning(f"Run stats reconciliation corrected {corrected} runs")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Run stats reconciliation failed: {e}")
+
+
+async def main():
+    corrected = await reconcile_run_stats()
+    print(f"Corrected counters for {corrected} runs")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,25 +1,67 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import time
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
+from app.core.metrics import Gauge, db_pool_wait, instrument_engine
 
-# Create engine
-engine = create_engine(
-    settings.DATABASE_URL,
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait.observe(time.perf_counter() - start)
+
+
+# Pool sizing only applies to server databases (SQLite uses its own pool)
+pool_options = {}
+if not settings.async_database_url.startswith("sqlite"):
+    pool_options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+    }
+
+# Create async engine (psycopg 3 in async mode)
+engine = create_async_engine(
+    settings.async_database_url,
     pool_pre_ping=True,
-    echo=settings.DEBUG
+    echo=settings.DEBUG,
+    **pool_options
 )
+instrument_engine(engine.sync_engine)
+
+
+def pool_gauge(read):
+    def collect():
+        pool = engine.sync_engine.pool
+        return [((), read(pool))] if isinstance(pool, QueuePool) else []
+    return collect
+
+
+Gauge("starkui_db_pool_size", "Connections kept in the pool", pool_gauge(lambda pool: pool.size()))
+Gauge("starkui_db_pool_checked_out", "Pooled connections currently in use", pool_gauge(lambda pool: pool.checkedout()))
+Gauge("starkui_db_pool_overflow", "Connections open beyond pool_size", pool_gauge(lambda pool: max(pool.overflow(), 0)))
 
 # Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False keeps loaded attributes usable after commit without
+# an implicit (and, under asyncio, illegal) lazy reload.
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for FastAPI routes to get DB session"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency for FastAPI routes to get an async DB session"""
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,8 +1,16 @@
+import asyncio
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.routes import router
+from app.core.events import broadcaster
+from app.core.metrics import MetricsMiddleware, render_metrics, CONTENT_TYPE
+from app.db.run_stats import reconcile_periodically
+from app.db.partitions import maintain_periodically
+from app.db.event_buffer import event_buffer
+from app.core.patch_engine import patch_engine
+from app.core.serialization import FastJSONResponse
 from app.schemas.schemas import HealthResponse
 
 # Configure logging
@@ -17,7 +25,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title=settings.APP_NAME,
     debug=settings.DEBUG,
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # CORS Configuration
@@ -30,6 +39,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency and DB time per route, served by /metrics
+if settings.ENABLE_METRICS:
+    app.add_middleware(MetricsMiddleware)
+
 # Health check endpoint
 @app.get("/health", response_model=HealthResponse)
 def health_check():
@@ -40,6 +53,12 @@ def health_check():
         "version": "2.0.0"
     }
 
+# Prometheus metrics endpoint
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of request, database and broadcaster metrics"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
 # Include API routes
 app.include_router(router, prefix="/api")
 
@@ -59,6 +78,35 @@ async def startup_event():
     logger.info(f"Starting {settings.APP_NAME}")
     logger.info(f"CORS origins: {settings.cors_origins}")
     logger.info(f"JWT protection enabled: {settings.ENABLE_JWT_PROTECTION}")
+    logger.info(f"Broadcaster backend: {settings.BROADCASTER_BACKEND}")
+    await broadcaster.start()
+    if settings.EVENTS_WRITE_BEHIND:
+        await event_buffer.start()
+        logger.info(f"Write-behind event ingestion: {event_buffer.running}")
+    if settings.PATCH_WORKSPACE_DIR:
+        await patch_engine.start()
+        logger.info(f"Applying patches to {settings.PATCH_WORKSPACE_DIR} with {patch_engine.workers} workers")
+    app.state.background_tasks = []
+    if settings.RUN_STATS_RECONCILE_INTERVAL > 0:
+        app.state.background_tasks.append(asyncio.create_task(
+            reconcile_periodically(settings.RUN_STATS_RECONCILE_INTERVAL)
+        ))
+    if settings.EVENTS_PARTITION_MAINTENANCE_INTERVAL > 0:
+        app.state.background_tasks.append(asyncio.create_task(
+            maintain_periodically(settings.EVENTS_PARTITION_MAINTENANCE_INTERVAL)
+        ))
+
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+    # Flush buffered events before anything else goes away
+    await event_buffer.stop()
+    # Let queued patches finish; they publish on the broadcaster
+    await patch_engine.stop()
+    await broadcaster.stop()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON, LargeBinary, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.session import Base
@@ -36,6 +37,10 @@ class PatchStatus(str, enum.Enum):
 
 class Run(Base):
     __tablename__ = "runs"
+    __table_args__ = (
+        Index("ix_runs_created_at_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}  # fetch server defaults via RETURNING
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
@@ -48,10 +53,48 @@ class Run(Base):
     tasks = relationship("Task", back_populates="run", cascade="all, delete-orphan")
     events = relationship("Event", back_populates="run", cascade="all, delete-orphan")
     patches = relationship("Patch", back_populates="run", cascade="all, delete-orphan")
+    # Only populated when explicitly loaded (GET /runs?include=stats)
+    stats = relationship("RunStats", back_populates="run", uselist=False, lazy="noload", cascade="all, delete-orphan")
+
+
+class RunStats(Base):
+    """
+    Per-run task counts by TaskStatus and event counts by EventType.
+    Updated in the same transaction as the task/event inserts.
+    """
+    __tablename__ = "run_stats"
+    __mapper_args__ = {"eager_defaults": True}
+    
+    run_id = Column(Integer, ForeignKey("runs.id", ondelete="CASCADE"), primary_key=True)
+    tasks_pending = Column(Integer, default=0, server_default="0", nullable=False)
+    tasks_running = Column(Integer, default=0, server_default="0", nullable=False)
+    tasks_completed = Column(Integer, default=0, server_default="0", nullable=False)
+    tasks_failed = Column(Integer, default=0, server_default="0", nullable=False)
+    events_info = Column(Integer, default=0, server_default="0", nullable=False)
+    events_success = Column(Integer, default=0, server_default="0", nullable=False)
+    events_warning = Column(Integer, default=0, server_default="0", nullable=False)
+    events_error = Column(Integer, default=0, server_default="0", nullable=False)
+    events_system = Column(Integer, default=0, server_default="0", nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    # Relationships
+    run = relationship("Run", back_populates="stats")
+    
+    @property
+    def tasks(self) -> dict:
+        return {status.value: getattr(self, f"tasks_{status.value}") for status in TaskStatus}
+    
+    @property
+    def events(self) -> dict:
+        return {event_type.value: getattr(self, f"events_{event_type.value}") for event_type in EventType}
 
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_run_id_created_at_id", "run_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     run_id = Column(Integer, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
@@ -66,13 +109,27 @@ class Task(Base):
 
 
 class Event(Base):
+    # On Postgres this table is partitioned by month on created_at (migration
+    # 006, maintained by app.db.partitions) with primary key (id, created_at);
+    # ids come from one sequence, so the ORM still identifies rows by id alone
     __tablename__ = "events"
+    __table_args__ = (
+        Index("ix_events_run_id_created_at_id", "run_id", "created_at", "id"),
+        Index("ix_events_run_id_id", "run_id", "id"),
+        # Containment (@>) filters on metadata
+        Index(
+            "ix_events_event_metadata", "event_metadata",
+            postgresql_using="gin",
+            postgresql_ops={"event_metadata": "jsonb_path_ops"}
+        ),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     run_id = Column(Integer, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
     event_type = Column(SQLEnum(EventType), default=EventType.INFO, nullable=False)
     message = Column(Text, nullable=False)
-    event_metadata = Column(Text, nullable=True)  # JSON string (renamed from metadata to avoid SQLAlchemy conflict)
+    event_metadata = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)  # renamed from metadata to avoid SQLAlchemy conflict
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
@@ -81,14 +138,31 @@ class Event(Base):
 
 class Patch(Base):
     __tablename__ = "patches"
+    __table_args__ = (
+        Index("ix_patches_run_id", "run_id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     run_id = Column(Integer, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
     file_path = Column(String(512), nullable=False)
-    diff_content = Column(Text, nullable=False)
+    # Diff body lives in patch_blobs, shared by every patch with the same content
+    diff_sha256 = Column(String(64), ForeignKey("patch_blobs.sha256"), nullable=False)
     status = Column(SQLEnum(PatchStatus), default=PatchStatus.PREVIEW, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     applied_at = Column(DateTime(timezone=True), nullable=True)
+    error = Column(Text, nullable=True)  # why applying failed
     
     # Relationships
     run = relationship("Run", back_populates="patches")
+
+
+class PatchBlob(Base):
+    """Compressed diff body, keyed by the SHA-256 of the uncompressed text"""
+    __tablename__ = "patch_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    encoding = Column(String(16), nullable=False)  # zstd, gzip or identity
+    size = Column(Integer, nullable=False)  # uncompressed bytes
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
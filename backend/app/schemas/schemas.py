@@ -1,6 +1,7 @@
+import json
 from datetime import datetime
-from typing import Optional, List, TYPE_CHECKING
-from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional, List, TYPE_CHECKING
+from pydantic import BaseModel, Field, field_validator
 from app.models.models import RunStatus, TaskStatus, EventType, PatchStatus
 
 
@@ -23,11 +24,27 @@ class TaskResponse(BaseModel):
         from_attributes = True
 
 
+class TaskPage(BaseModel):
+    items: List[TaskResponse]
+    next_cursor: Optional[str] = None
+
+
 # Event schemas
 class EventCreate(BaseModel):
     event_type: EventType = EventType.INFO
     message: str = Field(..., min_length=1)
-    event_metadata: Optional[str] = None
+    event_metadata: Optional[Dict[str, Any]] = None
+    
+    @field_validator("event_metadata", mode="before")
+    @classmethod
+    def decode_metadata_string(cls, value):
+        """Older clients send metadata as a JSON-encoded string"""
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                raise ValueError("event_metadata must be a JSON object")
+        return value
 
 
 class EventResponse(BaseModel):
@@ -35,13 +52,18 @@ class EventResponse(BaseModel):
     run_id: int
     event_type: EventType
     message: str
-    event_metadata: Optional[str]
+    event_metadata: Optional[Any]
     created_at: datetime
     
     class Config:
         from_attributes = True
 
 
+class EventPage(BaseModel):
+    items: List[EventResponse]
+    next_cursor: Optional[str] = None
+
+
 # Run schemas
 class RunCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=255)
@@ -60,6 +82,30 @@ class RunResponse(BaseModel):
         from_attributes = True
 
 
+class RunStatsResponse(BaseModel):
+    tasks: Dict[str, int]  # count per TaskStatus value
+    events: Dict[str, int]  # count per EventType value
+    
+    class Config:
+        from_attributes = True
+
+
+class RunSummary(RunResponse):
+    stats: Optional[RunStatsResponse] = None  # only with ?include=stats
+    
+    class Config:
+        from_attributes = True
+
+
+class RunPage(BaseModel):
+    items: List[RunResponse]
+    next_cursor: Optional[str] = None
+
+
+class RunSummaryPage(RunPage):
+    items: List[RunSummary]  # with ?include=stats
+
+
 class RunDetail(RunResponse):
     tasks: List[TaskResponse] = []
     recent_events: List[EventResponse] = []
@@ -74,6 +120,36 @@ class PatchPreviewRequest(BaseModel):
     diff_content: str = Field(..., min_length=1)
 
 
+class DiffHunkSummary(BaseModel):
+    old_start: int
+    old_lines: int
+    new_start: int
+    new_lines: int
+    section: str
+    additions: int
+    deletions: int
+
+
+class DiffFileSummary(BaseModel):
+    old_path: Optional[str]
+    new_path: Optional[str]
+    change: str  # added, deleted, renamed or modified
+    binary: bool
+    additions: int
+    deletions: int
+    hunks: List[DiffHunkSummary]
+
+
+class PatchPreviewResponse(BaseModel):
+    file_path: str
+    status: str
+    sha256: str
+    files: List[DiffFileSummary]
+    additions: int
+    deletions: int
+    normalized: str
+
+
 class PatchApplyRequest(BaseModel):
     run_id: int
     file_path: str = Field(..., min_length=1, max_length=512)
@@ -84,10 +160,14 @@ class PatchResponse(BaseModel):
     id: int
     run_id: int
     file_path: str
-    diff_content: str
+    diff_sha256: str
+    diff_size: int
+    # Omitted with ?include_diff=false; fetch it from /patches/{id}/diff
+    diff_content: Optional[str] = None
     status: PatchStatus
     created_at: datetime
     applied_at: Optional[datetime]
+    error: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -0,0 +1,82 @@
+"""
+Overhead of JWT authentication per request, with and without the verified
+token cache.
+
+Two measurements:
+
+  verify   verify_token (HS256 decode and claim checks) versus
+           verify_token_cached on a token already in the cache
+  request  GET /api/stream/stats through the full ASGI app (no network, no
+           database) with protection off, on without the cache, and on
+           with the cache; the difference to "off" is the auth cost
+
+Usage:
+    python -m benchmarks.auth --requests 1000 --rounds 5
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.core.cache import token_cache
+from app.core.config import settings
+from app.core.jwt import create_access_token, verify_token, verify_token_cached
+from app.main import app
+
+
+def per_call(function, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+
+async def per_request(client: httpx.AsyncClient, headers: dict, requests: int) -> float:
+    response = await client.get("/api/stream/stats", headers=headers)
+    response.raise_for_status()
+    start = time.perf_counter()
+    for _ in range(requests):
+        await client.get("/api/stream/stats", headers=headers)
+    return (time.perf_counter() - start) / requests
+
+
+async def main(requests: int, rounds: int):
+    token = create_access_token({"sub": "benchmark", "scope": "runs:read runs:write"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    uncached = per_call(lambda: verify_token(token), requests * 10)
+    verify_token_cached(token)
+    cached = per_call(lambda: verify_token_cached(token), requests * 10)
+    print(f"{'verify_token':32s} {uncached * 1e6:9.1f}us")
+    print(f"{'verify_token_cached (hit)':32s} {cached * 1e6:9.1f}us  {uncached / cached:6.1f}x")
+
+    max_entries = token_cache.max_entries
+    configurations = (
+        ("protection off", False, max_entries),
+        ("protection on, no cache", True, 0),
+        ("protection on, cached", True, max_entries),
+    )
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # Interleaved rounds, best round per configuration, to even out noise
+        for _ in range(rounds):
+            for name, protected, cache_size in configurations:
+                settings.ENABLE_JWT_PROTECTION = protected
+                token_cache.max_entries = cache_size
+                token_cache.entries.clear()
+                elapsed = await per_request(client, headers, requests)
+                results[name] = min(elapsed, results.get(name, elapsed))
+    token_cache.max_entries = max_entries
+
+    baseline = results["protection off"]
+    for name, elapsed in results.items():
+        print(f"{'GET /api/stream/stats, ' + name:56s} {elapsed * 1e6:9.1f}us  auth +{(elapsed - baseline) * 1e6:7.1f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="requests timed per configuration and round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
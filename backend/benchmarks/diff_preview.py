@@ -0,0 +1,91 @@
+"""
+Patch preview cost on large multi-file diffs.
+
+Generates synthetic unified diffs of the requested sizes and reports, per
+size: parse throughput, normalize throughput, peak memory allocated while
+parsing (tracemalloc, relative to the diff size), and the time of a cold
+versus a memoized POST /patches/preview call.
+
+Usage:
+    python -m benchmarks.diff_preview --sizes 1 4 16
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from app.api.routes import preview_patch
+from app.core.cache import patch_preview_cache
+from app.core.diffs import normalize, parse_diff
+from app.schemas.schemas import PatchPreviewRequest
+
+
+def synthetic_diff(megabytes: float, seed: int = 1) -> str:
+    """Multi-file diff of roughly the given size, with hunks of mixed shape"""
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts = []
+    size = 0
+    file_number = 0
+    while size < target:
+        file_number += 1
+        path = f"src/module_{file_number}/file_{file_number}.py"
+        header = f"diff --git a/{path} b/{path}\nindex 1234567..89abcde 100644\n--- a/{path}\n+++ b/{path}\n"
+        parts.append(header)
+        size += len(header)
+        line = 1
+        for _ in range(rng.randint(1, 12)):
+            line += rng.randint(5, 200)
+            context = [f"    value_{line + i} = compute({i}, {rng.random():.6f})" for i in range(3)]
+            removed = [f"    old_{line}_{i} = legacy({i})" for i in range(rng.randint(0, 8))]
+            added = [f"    new_{line}_{i} = improved({i}, cache=True)" for i in range(rng.randint(1, 10))]
+            old_lines = len(context) * 2 + len(removed)
+            new_lines = len(context) * 2 + len(added)
+            body = (
+                "".join(f" {text}\n" for text in context)
+                + "".join(f"-{text}\n" for text in removed)
+                + "".join(f"+{text}\n" for text in added)
+                + "".join(f" {text}\n" for text in context)
+            )
+            hunk = f"@@ -{line},{old_lines} +{line},{new_lines} @@ def function_{line}():\n{body}"
+            parts.append(hunk)
+            size += len(hunk)
+    return "".join(parts)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'size':>8s} {'files':>7s} {'parse':>12s} {'normalize':>12s} {'peak mem':>10s} {'cold':>10s} {'memoized':>10s}")
+    for megabytes in sizes:
+        text = synthetic_diff(megabytes)
+        mib = len(text) / 1024 / 1024
+
+        files, parse_time = timed(parse_diff, text)
+        # Separate run: tracemalloc slows allocation down
+        tracemalloc.start()
+        parse_diff(text)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _, normalize_time = timed(normalize, text, files)
+
+        request = PatchPreviewRequest(file_path="bench.diff", diff_content=text)
+        patch_preview_cache.entries.clear()
+        _, cold = timed(preview_patch, request)
+        _, warm = timed(preview_patch, request)
+
+        print(
+            f"{mib:6.1f}MB {len(files):7d} {mib / parse_time:8.1f}MB/s {mib / normalize_time:8.1f}MB/s "
+            f"{peak / len(text):9.2f}x {cold * 1000:8.1f}ms {warm * 1000:8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="diff sizes in MB")
+    args = parser.parse_args()
+    main(args.sizes)
@@ -0,0 +1,75 @@
+"""
+Fan-out microbenchmark for the SSE broadcaster.
+
+Compares encoding every event once per subscriber (the old behaviour, where
+each SSE generator ran its own json.dumps) against the broadcaster's shared
+pre-encoded frames.
+
+Usage:
+    python -m benchmarks.fanout --subscribers 500 --events 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from app.core.events import EventBroadcaster
+
+
+def sample_event(i: int) -> dict:
+    return {
+        "type": "event",
+        "id": i,
+        "event_type": "info",
+        "message": f"Step {i} finished",
+        "event_metadata": '{"step": "deploy", "attempt": 1}',
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+async def per_subscriber_encoding(subscribers: int, events: int) -> float:
+    """Each subscriber serializes the shared dict itself"""
+    queues = [asyncio.Queue() for _ in range(subscribers)]
+    start = time.perf_counter()
+    for i in range(events):
+        message = {"timestamp": datetime.utcnow().isoformat(), **sample_event(i)}
+        for queue in queues:
+            queue.put_nowait(message)
+        for queue in queues:
+            f"data: {json.dumps(queue.get_nowait())}\n\n".encode()
+    return time.perf_counter() - start
+
+
+async def shared_frame_encoding(subscribers: int, events: int) -> float:
+    """The broadcaster encodes once and shares the frame"""
+    broadcaster = EventBroadcaster(queue_maxsize=events + 1)
+    queues = [broadcaster.subscribe(1) for _ in range(subscribers)]
+    start = time.perf_counter()
+    for i in range(events):
+        await broadcaster.publish(1, sample_event(i))
+        for queue in queues:
+            queue.get_nowait()
+    return time.perf_counter() - start
+
+
+async def main(subscribers: int, events: int):
+    deliveries = subscribers * events
+    for name, bench in (
+        ("per-subscriber json.dumps", per_subscriber_encoding),
+        ("shared pre-encoded frame", shared_frame_encoding),
+    ):
+        elapsed = await bench(subscribers, events)
+        print(
+            f"{name:28s} {elapsed * 1000:9.1f} ms total  "
+            f"{elapsed / events * 1e6:9.1f} us/event  "
+            f"{deliveries / elapsed:12.0f} deliveries/s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--events", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.subscribers, args.events))
@@ -0,0 +1,109 @@
+"""
+Cost of idle SSE subscribers: a keep-alive timer per connection versus the
+broadcaster's shared heartbeat.
+
+Subscribes --subscribers consumers to runs that publish nothing and lets
+them idle for --duration seconds, once per loop:
+
+  wait_for  the old stream_events loop, asyncio.wait_for(queue.get(),
+            timeout=interval): a timer and a wrapper task per wait, per
+            connection
+  shared    the current loop, a plain queue.get(); EventBroadcaster's
+            heartbeat task pings idle queues every interval
+
+The keep-alive interval is scaled down (--interval, 15s in production) so
+a short run sees many of them. Consumers only count what they receive; no
+sockets are involved. Reports process CPU per idle second, memory held per
+connection once all are waiting (tracemalloc, plus the RSS increase), and
+the pings delivered.
+
+Usage:
+    python -m benchmarks.heartbeat --subscribers 1000 10000 --interval 1 --duration 10
+"""
+import argparse
+import asyncio
+import gc
+import os
+import time
+import tracemalloc
+
+from app.core.events import PING_FRAME, EventBroadcaster, MemoryBackend
+from benchmarks.load import ProcessSampler
+
+# Subscribers per run, like dashboards watching a handful of runs
+SUBSCRIBERS_PER_RUN = 100
+
+
+async def wait_for_loop(queue, interval: float, counts: list):
+    """The per-connection keep-alive timer stream_events used to run"""
+    while True:
+        try:
+            frame = await asyncio.wait_for(queue.get(), timeout=interval)
+        except asyncio.TimeoutError:
+            frame = PING_FRAME
+        counts[0] += frame is PING_FRAME
+
+
+async def shared_loop(queue, interval: float, counts: list):
+    """The current stream_events loop; pings come from the broadcaster"""
+    while True:
+        frame = await queue.get()
+        counts[0] += frame is PING_FRAME
+
+
+async def measure(loop, subscribers: int, interval: float, duration: float) -> dict:
+    broadcaster = EventBroadcaster(queue_maxsize=100, backend=MemoryBackend())
+    broadcaster.heartbeat_interval = interval
+    if loop is shared_loop:
+        await broadcaster.start()
+    sampler = ProcessSampler(os.getpid())
+    counts = [0]
+
+    gc.collect()
+    rss_before = sampler.rss_bytes()
+    tracemalloc.start()
+    queues = [broadcaster.subscribe(i // SUBSCRIBERS_PER_RUN) for i in range(subscribers)]
+    tasks = [asyncio.create_task(loop(queue, interval, counts)) for queue in queues]
+    # Let every consumer reach its first wait
+    await asyncio.sleep(0.1)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = sampler.rss_bytes()
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    cpu = time.process_time() - cpu
+    elapsed = time.perf_counter() - start
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await broadcaster.stop()
+    return {
+        "cpu_ms_per_second": cpu / elapsed * 1000,
+        "bytes_per_connection": traced / subscribers,
+        "rss_mib": (rss_after - rss_before) / 1024 / 1024 if rss_before and rss_after else float("nan"),
+        "pings": counts[0],
+    }
+
+
+async def main(sizes, interval: float, duration: float):
+    print(f"keep-alive every {interval:g}s, {duration:g}s idle per case")
+    print(f"{'loop':10s} {'subscribers':>11s} {'cpu ms/s':>9s} {'bytes/conn':>11s} {'rss +MiB':>9s} {'pings':>8s}")
+    for subscribers in sizes:
+        for name, loop in (("wait_for", wait_for_loop), ("shared", shared_loop)):
+            result = await measure(loop, subscribers, interval, duration)
+            print(
+                f"{name:10s} {subscribers:11d} {result['cpu_ms_per_second']:9.1f} "
+                f"{result['bytes_per_connection']:11.0f} {result['rss_mib']:9.1f} {result['pings']:8d}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--interval", type=float, default=1.0, help="keep-alive interval in seconds")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to idle per case")
+    args = parser.parse_args()
+    asyncio.run(main(args.subscribers, args.interval, args.duration))
@@ -0,0 +1,440 @@
+"""
+End-to-end load test: event ingestion, SSE fan-out and read polling.
+
+Boots the API with uvicorn in a subprocess and drives it over HTTP:
+
+  * events are POSTed at a fixed total rate (open loop, spread over runs)
+  * every run has --subscribers open /runs/{id}/stream connections
+  * --pollers clients alternate GET /runs/{id} and GET /runs
+
+Reports request throughput and latency, publish-to-receive latency (from
+the start of the POST to the frame arriving at a subscriber), delivery
+completeness, and the server's RSS and CPU. --output writes the results as
+JSON together with the git commit, so runs can be compared across commits
+with --baseline.
+The load generator runs on the same machine and reports its own CPU use;
+compare results from the same machine only.
+
+Without --database-url a fresh SQLite file stands in for Postgres (tables
+are created directly). A Postgres database must already be migrated.
+
+Usage:
+    python -m benchmarks.load --runs 10 --subscribers 20 --rate 200 --duration 30
+    python -m benchmarks.load --database-url postgresql://localhost/starkui_bench --output load.json
+    python -m benchmarks.load --baseline load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds to wait for in-flight frames after the last POST
+DRAIN_SECONDS = 2.0
+# Interval between server resource samples
+SAMPLE_SECONDS = 0.5
+
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p90/p99/max in milliseconds"""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pct(p):
+        return round(values[min(len(values) - 1, int(len(values) * p / 100))] * 1000, 3)
+
+    return {"p50": pct(50), "p90": pct(90), "p99": pct(99), "max": round(values[-1] * 1000, 3)}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR, capture_output=True, text=True
+        ).stdout
+        return {"commit": commit, "dirty": bool(status.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+class ProcessSampler:
+    """Samples RSS and CPU time of a process from /proc (Linux only)"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.rss: List[int] = []
+        self.cpu_start: Optional[float] = None
+        self.cpu_end: Optional[float] = None
+        self.wall_start = 0.0
+        self.wall_end = 0.0
+
+    def cpu_seconds(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # Fields after the command name; utime and stime are 14th and 15th overall
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self.ticks
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def rss_bytes(self) -> Optional[int]:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def start(self):
+        self.cpu_start = self.cpu_seconds()
+        self.wall_start = time.perf_counter()
+
+    def sample(self):
+        rss = self.rss_bytes()
+        if rss is not None:
+            self.rss.append(rss)
+
+    def stop(self):
+        self.cpu_end = self.cpu_seconds()
+        self.wall_end = time.perf_counter()
+
+    def results(self) -> Dict[str, Optional[float]]:
+        cpu = None
+        if self.cpu_start is not None and self.cpu_end is not None:
+            cpu = round((self.cpu_end - self.cpu_start) / (self.wall_end - self.wall_start) * 100, 1)
+        mib = 1024 * 1024
+        return {
+            "cpu_percent": cpu,
+            "rss_mib_avg": round(sum(self.rss) / len(self.rss) / mib, 1) if self.rss else None,
+            "rss_mib_peak": round(max(self.rss) / mib, 1) if self.rss else None,
+        }
+
+
+def start_server(database_url: str, port: int, extra_env: Dict[str, str]) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": database_url, **extra_env}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        # Servers that keep open SSE streams alive through SIGTERM (e.g. older revisions)
+        server.kill()
+        server.wait()
+
+
+async def create_sqlite_schema(database_url: str):
+    """Create tables in a fresh SQLite file (Postgres uses the migrations)"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.db.session import Base
+    import app.models.models  # noqa: F401  (registers the tables)
+
+    engine = create_async_engine("sqlite+aiosqlite://" + database_url[len("sqlite://"):])
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+async def wait_until_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not become ready")
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.run_ids: List[int] = []
+        self.sent_at: Dict[str, float] = {}
+        self.post_latencies: List[float] = []
+        self.post_errors = 0
+        self.post_rejected = 0  # 429/503 from admission control
+        self.delivery_latencies: List[float] = []
+        self.poll_latencies: Dict[str, List[float]] = {"get_run": [], "list_runs": []}
+        self.poll_errors = 0
+        self.stream_errors = 0
+        self.connected = 0
+        self.stopping = False
+
+    async def subscribe(self, run_id: int, all_connected: asyncio.Event):
+        try:
+            async with self.client.stream("GET", f"/api/runs/{run_id}/stream", timeout=None) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    message = json.loads(line[len("data: "):])
+                    if message["type"] == "connected":
+                        self.connected += 1
+                        if self.connected == len(self.run_ids) * self.args.subscribers:
+                            all_connected.set()
+                    elif message["type"] == "event":
+                        sent = self.sent_at.get(message["message"])
+                        if sent is not None:
+                            self.delivery_latencies.append(time.perf_counter() - sent)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stream_errors += 1
+
+    async def post_event(self, seq: int):
+        run_id = self.run_ids[seq % len(self.run_ids)]
+        key = f"load {seq}"
+        start = self.sent_at[key] = time.perf_counter()
+        try:
+            response = await self.client.post(
+                f"/api/runs/{run_id}/events", json={"event_type": "info", "message": key}
+            )
+            if response.status_code in (429, 503):
+                self.post_rejected += 1
+                return
+            response.raise_for_status()
+            self.post_latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            self.post_errors += 1
+
+    async def publish(self) -> int:
+        """POST events at --rate per second for --duration seconds; returns the count"""
+        in_flight = set()
+        sent = 0
+        start = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.args.duration:
+                break
+            # Open loop: issue whatever is due, regardless of outstanding responses
+            due = int(elapsed * self.args.rate) - sent
+            for _ in range(due):
+                task = asyncio.create_task(self.post_event(sent))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                sent += 1
+            await asyncio.sleep(0.005)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        return sent
+
+    async def poll(self):
+        while not self.stopping:
+            if random.random() < 0.5:
+                name, url = "get_run", f"/api/runs/{random.choice(self.run_ids)}"
+            else:
+                name, url = "list_runs", "/api/runs?include=stats"
+            start = time.perf_counter()
+            try:
+                (await self.client.get(url)).raise_for_status()
+                self.poll_latencies[name].append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                self.poll_errors += 1
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def sample(self, sampler: ProcessSampler):
+        while True:
+            sampler.sample()
+            await asyncio.sleep(SAMPLE_SECONDS)
+
+    async def run(self, sampler: ProcessSampler) -> dict:
+        for i in range(self.args.runs):
+            response = await self.client.post("/api/runs", json={"title": f"load test {i}"})
+            response.raise_for_status()
+            self.run_ids.append(response.json()["id"])
+
+        all_connected = asyncio.Event()
+        subscribers = [
+            asyncio.create_task(self.subscribe(run_id, all_connected))
+            for run_id in self.run_ids for _ in range(self.args.subscribers)
+        ]
+        if subscribers:
+            await asyncio.wait_for(all_connected.wait(), timeout=30.0)
+
+        sampler.start()
+        driver_cpu = time.process_time()
+        sampling = asyncio.create_task(self.sample(sampler))
+        pollers = [asyncio.create_task(self.poll()) for _ in range(self.args.pollers)]
+        start = time.perf_counter()
+        sent = await self.publish()
+        publish_elapsed = time.perf_counter() - start
+        self.stopping = True
+        await asyncio.gather(*pollers)
+        await asyncio.sleep(DRAIN_SECONDS)
+        sampler.stop()
+        driver_cpu = time.process_time() - driver_cpu
+        sampling.cancel()
+        for task in subscribers:
+            task.cancel()
+        await asyncio.gather(*subscribers, sampling, return_exceptions=True)
+
+        accepted = len(self.post_latencies)
+        expected = accepted * self.args.subscribers
+        polls = sum(len(latencies) for latencies in self.poll_latencies.values())
+        return {
+            "events": {
+                "sent": sent,
+                "accepted": accepted,
+                "rejected": self.post_rejected,
+                "errors": self.post_errors,
+                "per_second": round(accepted / publish_elapsed, 1),
+                "latency_ms": percentiles(self.post_latencies),
+            },
+            "delivery": {
+                "expected": expected,
+                "received": len(self.delivery_latencies),
+                "per_second": round(len(self.delivery_latencies) / publish_elapsed, 1),
+                "stream_errors": self.stream_errors,
+                "latency_ms": percentiles(self.delivery_latencies),
+            },
+            "polling": {
+                "requests": polls,
+                "errors": self.poll_errors,
+                "per_second": round(polls / publish_elapsed, 1),
+                "latency_ms": {name: percentiles(values) for name, values in self.poll_latencies.items()},
+            },
+            "server": sampler.results(),
+            # The load generator shares the machine; near 100% it is the bottleneck
+            "driver": {"cpu_percent": round(driver_cpu / (sampler.wall_end - sampler.wall_start) * 100, 1)},
+        }
+
+
+def print_summary(results: dict):
+    events, delivery, polling, server = (
+        results["events"], results["delivery"], results["polling"], results["server"]
+    )
+    print(f"events       {events['per_second']:10.1f}/s  {events['accepted']} accepted, "
+          f"{events['rejected']} rejected, {events['errors']} errors  latency {events['latency_ms']}")
+    print(f"deliveries   {delivery['per_second']:10.1f}/s  {delivery['received']} of {delivery['expected']}  "
+          f"publish-to-receive {delivery['latency_ms']}")
+    print(f"polling      {polling['per_second']:10.1f}/s  {polling['errors']} errors")
+    for name, latency in polling["latency_ms"].items():
+        print(f"  {name:10s} {latency}")
+    print(f"server       cpu {server['cpu_percent']}%  rss avg {server['rss_mib_avg']} MiB, "
+          f"peak {server['rss_mib_peak']} MiB")
+    print(f"driver       cpu {results['driver']['cpu_percent']}%")
+
+
+def print_comparison(results: dict, baseline: dict):
+    """Relative change of the headline numbers against an earlier result file"""
+    rows = [
+        ("events/s", ("events", "per_second")),
+        ("event POST p99 ms", ("events", "latency_ms", "p99")),
+        ("deliveries/s", ("delivery", "per_second")),
+        ("delivery p50 ms", ("delivery", "latency_ms", "p50")),
+        ("delivery p99 ms", ("delivery", "latency_ms", "p99")),
+        ("get_run p99 ms", ("polling", "latency_ms", "get_run", "p99")),
+        ("list_runs p99 ms", ("polling", "latency_ms", "list_runs", "p99")),
+        ("server cpu %", ("server", "cpu_percent")),
+        ("server rss peak MiB", ("server", "rss_mib_peak")),
+        ("driver cpu %", ("driver", "cpu_percent")),
+    ]
+    print(f"compared with {baseline.get('git', {}).get('commit')}")
+    for label, path in rows:
+        old, new = baseline, results
+        for key in path:
+            old = old.get(key) if isinstance(old, dict) else None
+            new = new.get(key) if isinstance(new, dict) else None
+        change = f"{(new - old) / old * 100:+7.1f}%" if old and new is not None else "      -"
+        print(f"  {label:22s} {old!s:>10} -> {new!s:>10}  {change}")
+
+
+async def main(args) -> int:
+    database_url = args.database_url
+    scratch = None
+    if not database_url:
+        scratch = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+        scratch.close()
+        database_url = f"sqlite:///{scratch.name}"
+    if database_url.startswith("sqlite://"):
+        await create_sqlite_schema(database_url)
+
+    port = free_port()
+    server = start_server(database_url, port, {"EVENTS_WRITE_BEHIND": str(args.write_behind).lower()})
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30.0) as client:
+            await wait_until_ready(client, server)
+            results = await LoadTest(client, args).run(ProcessSampler(server.pid))
+    finally:
+        stop_server(server)
+        if scratch:
+            os.remove(scratch.name)
+
+    results = {
+        "benchmark": "load",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git": git_revision(),
+        "config": {
+            "database": database_url.split("://", 1)[0],
+            "runs": args.runs,
+            "subscribers_per_run": args.subscribers,
+            "rate": args.rate,
+            "duration": args.duration,
+            "pollers": args.pollers,
+            "poll_interval": args.poll_interval,
+            "write_behind": args.write_behind,
+        },
+        **results,
+    }
+    print_summary(results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(results, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+    delivery = results["delivery"]
+    return 0 if delivery["received"] == delivery["expected"] and not results["events"]["errors"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--subscribers", type=int, default=20, help="SSE subscribers per run")
+    parser.add_argument("--rate", type=float, default=200, help="event POSTs per second across all runs")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--pollers", type=int, default=4, help="concurrent get_run/list_runs pollers")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="seconds between polls per poller")
+    parser.add_argument("--write-behind", action="store_true", help="enable EVENTS_WRITE_BEHIND on the server")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,80 @@
+"""
+Page latency at depth: OFFSET paging versus keyset (cursor) paging on runs.
+
+Seeds rows inside a transaction that is rolled back at the end, so it can be
+pointed at any Postgres database without leaving data behind.
+
+Usage:
+    python -m benchmarks.pagination --rows 200000 --page-size 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import select, text
+
+from app.api.pagination import keyset_query
+from app.db.session import engine
+from app.models.models import Run
+
+DEPTHS = (0, 0.1, 0.5, 0.9, 0.99)
+
+
+async def timed(conn, query, repeat: int):
+    samples = []
+    rows = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await conn.execute(query)
+        rows = result.all()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, rows
+
+
+async def main(total: int, page_size: int, repeat: int):
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            await conn.execute(text(
+                "INSERT INTO runs (title, status, created_at, updated_at) "
+                "SELECT 'bench ' || g, 'PENDING', now() - make_interval(secs => g), now() "
+                "FROM generate_series(1, :total) AS g"
+            ), {"total": total})
+            await conn.execute(text("ANALYZE runs"))
+            print(f"{'depth':>8s} {'offset ms':>10s} {'keyset ms':>10s}")
+
+            for depth in DEPTHS:
+                skip = int(total * depth)
+                offset_ms, _ = await timed(
+                    conn,
+                    select(Run.id, Run.created_at).order_by(Run.created_at.desc()).offset(skip).limit(page_size),
+                    repeat,
+                )
+                # Cursor position of the row just before the page
+                position = None
+                if skip:
+                    result = await conn.execute(
+                        select(Run.created_at, Run.id)
+                        .order_by(Run.created_at.desc(), Run.id.desc())
+                        .offset(skip - 1).limit(1)
+                    )
+                    position = tuple(result.one())
+                keyset_ms, _ = await timed(
+                    conn,
+                    keyset_query(select(Run.id, Run.created_at), Run, position, page_size, descending=True),
+                    repeat,
+                )
+                print(f"{skip:8d} {offset_ms:10.2f} {keyset_ms:10.2f}")
+        finally:
+            await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.page_size, args.repeat))
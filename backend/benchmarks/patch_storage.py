@@ -0,0 +1,76 @@
+"""
+Storage needed for patch diffs: one text column per patch versus
+content-addressed, compressed blobs.
+
+The corpus is every per-file diff in a git repository's history (this
+repository by default). Each diff is submitted once plus a random number of
+resubmissions, like an agent retrying a step or re-applying the same change
+in another run. Sizes are payload bytes, without per-row overhead.
+
+Usage:
+    python -m benchmarks.patch_storage --repo .. --resubmit-rate 0.3
+"""
+import argparse
+import os
+import random
+import subprocess
+import time
+
+from app.db.blobs import blob_hash, compress, zstandard
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def file_diffs(repo: str, max_commits: int):
+    """Per-file unified diffs from the repository history"""
+    log = subprocess.run(
+        ["git", "log", "-p", "--no-color", "--no-renames", "--format=", f"-{max_commits}"],
+        cwd=repo, capture_output=True, check=True
+    ).stdout.decode(errors="replace")
+    for chunk in log.split("\ndiff --git ")[1:]:
+        diff = chunk.split("\n", 1)[1] if "\n" in chunk else ""
+        # Binary changes have no hunks
+        if "\n@@ " in "\n" + diff:
+            yield diff
+
+
+def submissions(diffs, resubmit_rate: float, rng: random.Random):
+    """Each diff once, then again while a coin with p=resubmit_rate comes up"""
+    for diff in diffs:
+        yield diff
+        while rng.random() < resubmit_rate:
+            yield diff
+
+
+def main(repo: str, max_commits: int, resubmit_rate: float, seed: int):
+    diffs = list(file_diffs(repo, max_commits))
+    corpus = [diff.encode() for diff in submissions(diffs, resubmit_rate, random.Random(seed))]
+    unique = {blob_hash(content): content for content in corpus}
+
+    raw = sum(len(content) for content in corpus)
+    deduplicated = sum(len(content) for content in unique.values())
+    print(f"{len(corpus)} patches, {len(unique)} distinct diffs from {repo}")
+    print(f"{'diff_content per patch':28s} {raw / 1024:10.1f} KiB")
+    print(f"{'deduplicated':28s} {deduplicated / 1024:10.1f} KiB  {raw / deduplicated:5.2f}x")
+
+    for encoding in ("gzip", "zstd"):
+        if encoding == "zstd" and zstandard is None:
+            print(f"{'deduplicated + zstd':28s} {'-':>10s}      (zstandard not installed)")
+            continue
+        start = time.perf_counter()
+        stored = sum(len(compress(content, encoding)[1]) for content in unique.values())
+        elapsed = time.perf_counter() - start
+        print(
+            f"{'deduplicated + ' + encoding:28s} {stored / 1024:10.1f} KiB  {raw / stored:5.2f}x  "
+            f"compress {deduplicated / 1024 / 1024 / elapsed:6.1f} MiB/s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", default=os.path.dirname(BACKEND_DIR))
+    parser.add_argument("--max-commits", type=int, default=1000)
+    parser.add_argument("--resubmit-rate", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    main(args.repo, args.max_commits, args.resubmit_rate, args.seed)
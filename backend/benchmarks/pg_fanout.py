@@ -0,0 +1,101 @@
+"""
+Cross-process delivery and latency check for the Postgres broadcaster backend.
+
+Starts several subscriber processes, each with its own broadcaster and a
+single LISTEN connection, publishes from the parent process and reports
+whether every process received every message, plus publish-to-receive
+latency percentiles. Needs DATABASE_URL pointing at a Postgres server.
+
+Usage:
+    python -m benchmarks.pg_fanout --processes 4 --messages 1000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import time
+
+from app.core.events import EventBroadcaster
+from app.core.pg_notify import PostgresNotifyBackend
+
+RUN_ID = 1
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def subscriber_process(messages: int, ready, results):
+    async def run():
+        broadcaster = EventBroadcaster(queue_maxsize=messages + 1, backend=PostgresNotifyBackend())
+        await broadcaster.start()
+        queue = broadcaster.subscribe(RUN_ID)
+        ready.set()
+        latencies = []
+        try:
+            while len(latencies) < messages:
+                frame = await asyncio.wait_for(queue.get(), timeout=10.0)
+                received = time.time()
+                sent = json.loads(frame[len(b"data: "):])["sent_at"]
+                latencies.append(received - sent)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await broadcaster.stop()
+        results.put(latencies)
+
+    asyncio.run(run())
+
+
+async def publish(messages: int, rate: float):
+    broadcaster = EventBroadcaster(backend=PostgresNotifyBackend())
+    await broadcaster.start()
+    interval = 1.0 / rate if rate else 0
+    for i in range(messages):
+        await broadcaster.publish(RUN_ID, {"type": "bench", "seq": i, "sent_at": time.time()})
+        if interval:
+            await asyncio.sleep(interval)
+    await broadcaster.stop()
+
+
+def main(processes: int, messages: int, rate: float):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = []
+    for _ in range(processes):
+        ready = ctx.Event()
+        worker = ctx.Process(target=subscriber_process, args=(messages, ready, results))
+        worker.start()
+        ready.wait(timeout=30)
+        workers.append(worker)
+
+    asyncio.run(publish(messages, rate))
+
+    all_latencies = []
+    for _ in workers:
+        latencies = results.get(timeout=60)
+        print(f"process received {len(latencies)}/{messages}")
+        all_latencies.extend(latencies)
+    for worker in workers:
+        worker.join()
+
+    if all_latencies:
+        ms = [latency * 1000 for latency in all_latencies]
+        print(
+            f"latency ms: mean={statistics.mean(ms):.2f} p50={percentile(ms, 50):.2f} "
+            f"p95={percentile(ms, 95):.2f} p99={percentile(ms, 99):.2f} max={max(ms):.2f}"
+        )
+    delivered = len(all_latencies) == processes * messages
+    print("delivery: OK" if delivered else "delivery: MISSING MESSAGES")
+    raise SystemExit(0 if delivered else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=500.0, help="publishes per second (0 = unthrottled)")
+    args = parser.parse_args()
+    main(args.processes, args.messages, args.rate)
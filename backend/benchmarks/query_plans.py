@@ -0,0 +1,129 @@
+"""
+Query-plan regression check for the run-scoped queries in app/api/routes.py.
+
+EXPLAINs each query shape against the configured Postgres database and fails
+if any of them would scan the table or sort instead of walking an index.
+Sequential scans and sorts are penalised for the check so the result does
+not depend on how much data the database happens to hold: a Seq Scan or
+Sort node still showing up means no index can serve the query. Passing
+shows the indexes are usable, not that the planner picks them under real
+statistics; check that with EXPLAIN ANALYZE on a populated database.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.query_plans
+"""
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import literal_column, select, text, type_coerce
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import joinedload
+
+from app.api.pagination import keyset_query
+from app.db.session import engine
+from app.models.models import Run, Task, Event
+
+RUN_ID = 1
+POSITION = (datetime(2026, 1, 1, tzinfo=timezone.utc), 1000)
+# Spelled as SQL since JSONB values cannot be rendered as literal binds
+METADATA_FILTER = type_coerce(Event.event_metadata, JSONB).contains(
+    literal_column("""'{"step": "deploy"}'::jsonb""")
+)
+
+QUERIES = {
+    "list_runs": select(Run).order_by(Run.created_at.desc()).offset(0).limit(100),
+    "list_tasks": select(Task).where(Task.run_id == RUN_ID).order_by(Task.created_at),
+    "get_run recent events": (
+        select(Event).where(Event.run_id == RUN_ID).order_by(Event.created_at.desc()).limit(50)
+    ),
+    "stream resume": (
+        select(Event).where(Event.run_id == RUN_ID, Event.id > 0).order_by(Event.id).limit(5000)
+    ),
+    "runs cursor page": keyset_query(select(Run), Run, POSITION, 101, descending=True),
+    "runs with stats": keyset_query(
+        select(Run).options(joinedload(Run.stats)), Run, POSITION, 101, descending=True
+    ),
+    "tasks cursor page": keyset_query(select(Task).where(Task.run_id == RUN_ID), Task, POSITION, 101),
+    "events cursor page": keyset_query(select(Event).where(Event.run_id == RUN_ID), Event, POSITION, 101),
+    "events metadata filter": keyset_query(
+        select(Event).where(Event.run_id == RUN_ID, METADATA_FILTER), Event, None, 101
+    ),
+}
+
+# Queries that must be answered by one specific index
+REQUIRED_INDEXES = {
+    "events metadata containment": (
+        select(Event.id).where(METADATA_FILTER),
+        "ix_events_event_metadata"
+    ),
+}
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def plan_indexes(plan: dict, parents: dict) -> set:
+    """Indexes a plan scans, with partition indexes reported as their parent index"""
+    return {
+        parents.get(node["Index Name"], node["Index Name"])
+        for node in plan_nodes(plan["Plan"]) if "Index Name" in node
+    }
+
+
+def check(plan: dict, required_index: str = None, parents: dict = None) -> list:
+    """Problems found in a JSON plan (empty if it only uses index scans)"""
+    nodes = list(plan_nodes(plan["Plan"]))
+    problems = []
+    if any(node["Node Type"] == "Seq Scan" for node in nodes):
+        problems.append("sequential scan")
+    if any(node["Node Type"] in ("Sort", "Incremental Sort") for node in nodes):
+        problems.append("explicit sort")
+    if not any("Index" in node["Node Type"] for node in nodes):
+        problems.append("no index scan")
+    if required_index and required_index not in plan_indexes(plan, parents or {}):
+        problems.append(f"{required_index} not used")
+    return problems
+
+
+async def explain(conn, query) -> dict:
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    raw = result.scalar()
+    return (raw if isinstance(raw, list) else json.loads(raw))[0]
+
+
+async def main() -> int:
+    failures = 0
+    checks = [(name, query, None) for name, query in QUERIES.items()]
+    checks += [(name, query, index) for name, (query, index) in REQUIRED_INDEXES.items()]
+    async with engine.connect() as conn:
+        await conn.execute(text("SET enable_seqscan = off"))
+        await conn.execute(text("SET enable_sort = off"))
+        # events is partitioned: plans scan per-partition copies of its indexes
+        result = await conn.execute(text("""
+            SELECT child.relname, parent.relname
+            FROM pg_inherits i
+            JOIN pg_class child ON child.oid = i.inhrelid
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            WHERE child.relkind = 'i'
+        """))
+        parents = dict(result.all())
+        for name, query, required_index in checks:
+            plan = await explain(conn, query)
+            problems = check(plan, required_index, parents)
+            indexes = sorted(plan_indexes(plan, parents))
+            status = "FAIL" if problems else "ok"
+            print(f"{status:4s} {name:28s} indexes={','.join(indexes) or '-'} {'; '.join(problems)}")
+            failures += bool(problems)
+    await engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,169 @@
+"""
+Response serialization cost per endpoint, before and after the fast path.
+
+Builds in-memory ORM rows shaped like real runs, tasks and events (no
+database involved) and times only the work between the endpoint returning
+and the response body existing:
+
+  before  FastAPI's response_model handling (validate the rows, dump the
+          models to Python data) followed by Starlette's JSONResponse
+  after   app.core.serialization.json_response with the endpoint's adapter
+
+Two rows cover paths without a response_model: dict responses rendered by
+the default response class (FastJSONResponse), and the SSE broadcast
+payload (encode_payload). Both bodies are decoded and compared before
+timing, so a row is only reported when the output is identical.
+
+Usage:
+    python -m benchmarks.serialization --items 100 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app.api import routes
+from app.core.events import encode_payload, event_message
+from app.core.serialization import FastJSONResponse, json_response, orjson
+from app.models.models import Event, EventType, Run, RunStats, RunStatus, Task, TaskStatus
+
+START = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def make_runs(count: int, stats: bool):
+    runs = []
+    for i in range(count):
+        run = Run(
+            id=i + 1, title=f"Agent run {i}", description="Refactor the payment module" if i % 2 else None,
+            status=list(RunStatus)[i % len(RunStatus)],
+            created_at=START + timedelta(seconds=i), updated_at=START + timedelta(seconds=i + 30)
+        )
+        if stats:
+            run.stats = RunStats(
+                run_id=run.id, tasks_pending=i % 3, tasks_running=1, tasks_completed=i, tasks_failed=0,
+                events_info=i * 4, events_success=i, events_warning=2, events_error=0, events_system=1
+            )
+        runs.append(run)
+    return runs
+
+
+def make_tasks(count: int):
+    return [
+        Task(
+            id=i + 1, run_id=1, title=f"Step {i}: update tests", description="Run the suite and fix failures",
+            status=list(TaskStatus)[i % len(TaskStatus)],
+            created_at=START + timedelta(seconds=i), updated_at=START + timedelta(seconds=i + 5)
+        )
+        for i in range(count)
+    ]
+
+
+def make_events(count: int):
+    return [
+        Event(
+            id=i + 1, run_id=1, event_type=list(EventType)[i % len(EventType)],
+            message=f"Tool call {i} finished: wrote 3 files, 120 lines changed",
+            event_metadata={"step": "deploy", "tool": "editor", "duration_ms": 12.5 * i, "files": ["a.py", "b.py"]},
+            created_at=START + timedelta(milliseconds=i)
+        )
+        for i in range(count)
+    ]
+
+
+def route(name: str):
+    return next(r for r in routes.router.routes if getattr(r, "name", None) == name)
+
+
+def before(name: str):
+    """What FastAPI does with a response_model endpoint's return value"""
+    field = route(name).secure_cloned_response_field
+    loop = asyncio.new_event_loop()
+
+    def serialize(value):
+        content = loop.run_until_complete(serialize_response(field=field, response_content=value))
+        return JSONResponse(content=content).body
+    return serialize
+
+
+def timed(function, value, min_time: float):
+    """Best per-call time over repeated batches"""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function(value)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5:
+            break
+        calls *= 2
+    best = elapsed
+    for _ in range(4):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function(value)
+        best = min(best, time.perf_counter() - start)
+    return best / calls
+
+
+def cases(count: int):
+    runs = make_runs(count, stats=False)
+    runs_stats = make_runs(count, stats=True)
+    tasks = make_tasks(count)
+    events = make_events(count)
+    return [
+        ("GET /runs", runs, before("list_runs"), lambda v: json_response(routes.RUN_LIST, v).body),
+        ("GET /runs?include=stats", runs_stats, before("list_runs"), lambda v: json_response(routes.RUN_LIST, v).body),
+        (
+            "GET /runs?cursor=", {"items": runs_stats, "next_cursor": "abc"}, before("list_runs"),
+            lambda v: json_response(routes.RUN_PAGE, v).body
+        ),
+        ("GET /runs/{id}/tasks", tasks, before("list_tasks"), lambda v: json_response(routes.TASK_LIST, v).body),
+        (
+            "GET /runs/{id}/tasks?cursor=", {"items": tasks, "next_cursor": None}, before("list_tasks"),
+            lambda v: json_response(routes.TASK_PAGE, v).body
+        ),
+        (
+            "GET /runs/{id}/events", {"items": events, "next_cursor": "abc"}, before("list_events"),
+            lambda v: json_response(routes.EVENT_PAGE, v).body
+        ),
+        (
+            "dict response", {"runs": [{"id": r.id, "title": r.title, "status": r.status.value} for r in runs]},
+            lambda v: JSONResponse(content=v).body, lambda v: FastJSONResponse(content=v).body
+        ),
+        (
+            "SSE payload (per event)", [event_message(e) for e in events],
+            lambda v: [json.dumps(m, separators=(",", ":")).encode() for m in v],
+            lambda v: [encode_payload(m) for m in v]
+        ),
+    ]
+
+
+def decoded(body):
+    return [json.loads(b) for b in body] if isinstance(body, list) else json.loads(body)
+
+
+def main(sizes, min_time: float):
+    print(f"orjson: {'installed' if orjson is not None else 'not installed (json module fallback)'}")
+    print(f"{'endpoint':30s} {'items':>6s} {'before':>10s} {'after':>10s} {'speedup':>8s}")
+    for count in sizes:
+        for name, value, old, new in cases(count):
+            if decoded(old(value)) != decoded(new(value)):
+                raise SystemExit(f"{name}: fast path output differs")
+            old_time = timed(old, value, min_time)
+            new_time = timed(new, value, min_time)
+            print(
+                f"{name:30s} {count:6d} {old_time * 1000:8.3f}ms {new_time * 1000:8.3f}ms "
+                f"{old_time / new_time:7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 1000], help="rows per response")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend timing each case")
+    args = parser.parse_args()
+    main(args.items, args.min_time)
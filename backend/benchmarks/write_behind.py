@@ -0,0 +1,88 @@
+"""
+Event ingestion throughput: a commit per event versus the write-behind buffer.
+
+Writes the same number of events from concurrent producers both ways, then
+stops the buffer and checks that every event it accepted reached the table.
+The benchmark run and its events are deleted at the end.
+
+Usage:
+    python -m benchmarks.write_behind --events 20000 --concurrency 200
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlalchemy import delete, func, select
+
+from app.db.event_buffer import EventWriteBuffer
+from app.db.session import SessionLocal, engine
+from app.models.models import Run, RunStats, Event, EventType
+
+
+async def produce(total: int, concurrency: int, write_one):
+    """Run write_one(i) for i in range(total) from `concurrency` workers"""
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            await write_one(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main(total: int, concurrency: int, batch: int, window_ms: float) -> int:
+    async with SessionLocal() as db:
+        run = Run(title="write-behind benchmark", stats=RunStats())
+        db.add(run)
+        await db.commit()
+        run_id = run.id
+
+    try:
+        async def commit_each(i):
+            async with SessionLocal() as db:
+                db.add(Event(run_id=run_id, event_type=EventType.INFO, message=f"sync {i}"))
+                await db.commit()
+
+        elapsed = await produce(total, concurrency, commit_each)
+        print(f"commit per event  {total / elapsed:10.0f} events/s")
+
+        buffer = EventWriteBuffer(max_batch=batch, window_ms=window_ms)
+        await buffer.start()
+
+        async def buffered(i):
+            await buffer.add(run_id, EventType.INFO, f"buffered {i}", None)
+
+        elapsed = await produce(total, concurrency, buffered)
+        print(f"write-behind      {total / elapsed:10.0f} events/s accepted ({buffer.pending} still queued)")
+        start = time.perf_counter()
+        await buffer.stop()
+        drain = time.perf_counter() - start
+        print(f"drain on stop     {drain * 1000:10.1f} ms, {buffer.batches} group commits")
+        print(f"write-behind      {total / (elapsed + drain):10.0f} events/s stored")
+
+        async with SessionLocal() as db:
+            stored = await db.scalar(
+                select(func.count()).select_from(Event)
+                .where(Event.run_id == run_id, Event.message.like("buffered %"))
+            )
+        print(f"stored            {stored:10d} of {total} buffered events")
+        return 0 if stored == total and not buffer.failed else 1
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(delete(Event).where(Event.run_id == run_id))
+            await db.execute(delete(Run).where(Run.id == run_id))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--window-ms", type=float, default=20)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.events, args.concurrency, args.batch, args.window_ms)))
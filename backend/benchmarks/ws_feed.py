@@ -0,0 +1,290 @@
+"""
+Bytes on the wire and server CPU per 1k delivered events: SSE, coalesced
+SSE and the multiplexed WebSocket feed.
+
+Boots the API with uvicorn in a subprocess. --clients dashboards each watch
+all --runs runs, either with one SSE stream per run or with one WebSocket
+subscribed to every run. --publishers clients POST events round robin over
+the runs, and the test waits until every client has received every event.
+The server runs with EVENTS_WRITE_BEHIND so the database writes, which are
+the same in every mode, stay small next to the cost of delivery.
+
+Subscribers connect through a local TCP proxy that counts the bytes the
+server sends them (headers, framing and heartbeats included), so compressed
+WebSocket traffic is measured as it crosses the network. Server CPU comes
+from /proc; the same POSTs with no subscribers ("none") are measured too
+and their CPU is subtracted, leaving the cost of delivery. Modes run in
+interleaved --rounds and the best round of each is reported, to even out
+noise from the publisher sharing the machine.
+
+Without --database-url a fresh SQLite file stands in for Postgres, but
+write-behind needs Postgres, so the per-request commits add noise there. A
+Postgres database must already be migrated.
+
+Modes:
+  sse              GET /api/runs/{id}/stream per run
+  sse-batched      the same with ?batch_ms= (bursts as JSON array frames)
+  ws-json          /api/ws, JSON text frames
+  ws-json-deflate  /api/ws, JSON with permessage-deflate
+  ws-msgpack       /api/ws?encoding=msgpack (needs msgpack here and on the server)
+  ws-msgpack-deflate
+
+Usage:
+    python -m benchmarks.ws_feed --database-url postgresql://localhost/starkui_bench --clients 100 --events 500
+    python -m benchmarks.ws_feed --modes sse sse-batched ws-json-deflate --batch-ms 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.load import ProcessSampler, create_sqlite_schema, free_port, start_server, wait_until_ready
+
+try:
+    import msgpack
+except ImportError:  # optional; the msgpack modes are skipped
+    msgpack = None
+
+try:
+    from websockets.asyncio.client import connect
+except ImportError:  # optional; only SSE is measured
+    connect = None
+
+MODES = ("sse", "sse-batched", "ws-json", "ws-json-deflate", "ws-msgpack", "ws-msgpack-deflate")
+# Seconds to wait for the last deliveries after the last POST
+DRAIN_TIMEOUT = 30.0
+
+
+class CountingProxy:
+    """TCP proxy to the server that counts bytes sent downstream"""
+
+    def __init__(self, upstream_port: int):
+        self.upstream_port = upstream_port
+        self.downstream_bytes = 0
+        self.server = None
+        self.port = 0
+        self.writers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        for writer in self.writers:
+            writer.close()
+
+    async def _pipe(self, reader, writer, count: bool):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                if count:
+                    self.downstream_bytes += len(data)
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", self.upstream_port)
+        self.writers.update((client_writer, upstream_writer))
+        await asyncio.gather(
+            self._pipe(client_reader, upstream_writer, count=False),
+            self._pipe(upstream_reader, client_writer, count=True),
+        )
+
+
+class Clients:
+    """--clients subscribers of every run in one mode, counting received events"""
+
+    def __init__(self, mode: str, port: int, run_ids: List[int], clients: int, batch_ms: float):
+        self.mode = mode
+        self.port = port
+        self.run_ids = run_ids
+        self.clients = clients
+        self.batch_ms = batch_ms
+        self.received = 0
+        self.connected = 0
+        self.ready = asyncio.Event()
+        self.tasks: List[asyncio.Task] = []
+
+    @property
+    def expected_connections(self) -> int:
+        return self.clients * (len(self.run_ids) if self.mode.startswith("sse") else 1)
+
+    def _connected(self):
+        self.connected += 1
+        if self.connected == self.expected_connections:
+            self.ready.set()
+
+    async def start(self):
+        if self.mode.startswith("sse"):
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+            self.http = httpx.AsyncClient(base_url=f"http://127.0.0.1:{self.port}", limits=limits, timeout=None)
+            for _ in range(self.clients):
+                self.tasks += [asyncio.create_task(self._sse(run_id)) for run_id in self.run_ids]
+        else:
+            self.tasks = [asyncio.create_task(self._ws()) for _ in range(self.clients)]
+        await asyncio.wait_for(self.ready.wait(), timeout=30.0)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.mode.startswith("sse"):
+            await self.http.aclose()
+
+    async def _sse(self, run_id: int):
+        params = {"batch_ms": self.batch_ms} if self.mode == "sse-batched" else None
+        async with self.http.stream("GET", f"/api/runs/{run_id}/stream", params=params) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                message = json.loads(line[len("data: "):])
+                if isinstance(message, list):
+                    self.received += sum(1 for m in message if m["type"] == "event")
+                elif message["type"] == "connected":
+                    self._connected()
+                elif message["type"] == "event":
+                    self.received += 1
+
+    async def _ws(self):
+        encoding = "msgpack" if "msgpack" in self.mode else "json"
+        url = f"ws://127.0.0.1:{self.port}/api/ws?encoding={encoding}&batch_ms={self.batch_ms}"
+        compression = "deflate" if self.mode.endswith("deflate") else None
+        async with connect(url, compression=compression, max_size=None) as websocket:
+            for run_id in self.run_ids:
+                await websocket.send(json.dumps({"type": "subscribe", "run_id": run_id}))
+            async for frame in websocket:
+                message = msgpack.unpackb(frame, strict_map_key=False) if isinstance(frame, bytes) else json.loads(frame)
+                if message["type"] == "subscribed":
+                    if message["run_id"] == self.run_ids[-1]:
+                        self._connected()
+                elif message["type"] == "events":
+                    self.received += sum(
+                        1 for messages in message["runs"].values() for m in messages if m["type"] == "event"
+                    )
+
+
+async def publish(client: httpx.AsyncClient, run_ids: List[int], events: int, publishers: int):
+    """POST events from concurrent publishers, round robin over the runs"""
+    sequence = iter(range(events))
+
+    async def publisher():
+        for seq in sequence:
+            response = await client.post(
+                f"/api/runs/{run_ids[seq % len(run_ids)]}/events", json={"event_type": "info", "message": f"feed {seq}"}
+            )
+            response.raise_for_status()
+
+    await asyncio.gather(*(publisher() for _ in range(publishers)))
+
+
+async def measure(mode: str, client: httpx.AsyncClient, proxy: CountingProxy, sampler: ProcessSampler,
+                  run_ids: List[int], args) -> Dict[str, float]:
+    clients = None
+    if mode != "none":
+        clients = Clients(mode, proxy.port, run_ids, args.clients, args.batch_ms)
+        await clients.start()
+    proxy.downstream_bytes = 0
+    sampler.start()
+    await publish(client, run_ids, args.events, args.publishers)
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    expected = args.events * args.clients if clients else 0
+    while clients and clients.received < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    sampler.stop()
+    downstream = proxy.downstream_bytes
+    if clients:
+        await clients.stop()
+    return {
+        "cpu": sampler.cpu_end - sampler.cpu_start,
+        "bytes": downstream,
+        "received": clients.received if clients else 0,
+        "expected": expected,
+    }
+
+
+async def main(args) -> int:
+    modes = [mode for mode in args.modes if not (mode.startswith("ws") and connect is None)
+             and not ("msgpack" in mode and msgpack is None)]
+    for mode in set(args.modes) - set(modes):
+        print(f"skipping {mode}: websockets/msgpack not installed")
+
+    database_url = args.database_url
+    scratch = None
+    if not database_url:
+        scratch = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+        scratch.close()
+        database_url = f"sqlite:///{scratch.name}"
+    if database_url.startswith("sqlite://"):
+        await create_sqlite_schema(database_url)
+    port = free_port()
+    server = start_server(database_url, port, {
+        "EVENTS_WRITE_BEHIND": "true",
+        "SSE_QUEUE_MAXSIZE": str(max(1000, args.events)),
+    })
+    proxy = CountingProxy(port)
+    await proxy.start()
+    failed = False
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30.0) as client:
+            await wait_until_ready(client, server)
+            run_ids = []
+            for i in range(args.runs):
+                response = await client.post("/api/runs", json={"title": f"feed benchmark {i}"})
+                response.raise_for_status()
+                run_ids.append(response.json()["id"])
+
+            sampler = ProcessSampler(server.pid)
+            results: Dict[str, Dict[str, float]] = {}
+            for _ in range(args.rounds):
+                for mode in ["none", *modes]:
+                    result = await measure(mode, client, proxy, sampler, run_ids, args)
+                    failed = failed or result["received"] != result["expected"]
+                    best = results.get(mode)
+                    if best is None or result["cpu"] < best["cpu"]:
+                        results[mode] = result
+    finally:
+        await proxy.close()
+        server.terminate()
+        server.wait(timeout=30)
+        if scratch:
+            os.remove(scratch.name)
+
+    deliveries = args.events * args.clients
+    per_k = 1000 / deliveries
+    baseline = results.pop("none")["cpu"]
+    print(f"{args.events} events over {args.runs} runs to {args.clients} clients ({deliveries} deliveries); "
+          f"POSTs alone: {baseline * 1000:.0f}ms server CPU")
+    print(f"{'mode':20s} {'bytes/1k':>10s} {'cpu ms/1k':>10s}")
+    for mode, result in results.items():
+        print(f"{mode:20s} {result['bytes'] * per_k:10.0f} {(result['cpu'] - baseline) * 1000 * per_k:10.2f}")
+    if failed:
+        print("some deliveries were missing")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=100, help="subscribers, each watching every run")
+    parser.add_argument("--events", type=int, default=500, help="events POSTed per mode and round")
+    parser.add_argument("--publishers", type=int, default=8, help="concurrent event POSTers")
+    parser.add_argument("--batch-ms", type=float, default=10, help="batch window for sse-batched and the WebSocket modes")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
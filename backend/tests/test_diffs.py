@@ -0,0 +1,94 @@
+import pytest
+
+from app.core.diffs import DiffParseError, PatchApplyError, apply_file_diff, normalize, parse_diff
+
+
+def apply(original, text):
+    (diff,) = parse_diff(text)
+    return apply_file_diff(original, text, diff)
+
+
+def test_crlf_diff_and_file():
+    text = "--- a/f.txt\r\n+++ b/f.txt\r\n@@ -1,2 +1,2 @@\r\n one\r\n-two\r\n+TWO\r\n"
+    (diff,) = parse_diff(text)
+    assert (diff.old_path, diff.new_path, diff.additions, diff.deletions) == ("f.txt", "f.txt", 1, 1)
+    assert normalize(text, [diff]) == "--- a/f.txt\n+++ b/f.txt\n@@ -1,2 +1,2 @@\n one\n-two\n+TWO\n"
+    # Added lines take the file's line ending
+    assert apply_file_diff("one\r\ntwo\r\n", text, diff) == "one\r\nTWO\r\n"
+    assert apply_file_diff("one\ntwo\n", text, diff) == "one\nTWO\n"
+
+
+def test_no_newline_at_end_of_file():
+    removed = "--- a/f\n+++ b/f\n@@ -1 +1 @@\n-old\n\\ No newline at end of file\n+new\n"
+    assert apply("old", removed) == "new\n"
+
+    added = "--- a/f\n+++ b/f\n@@ -1 +1 @@\n-old\n+new\n\\ No newline at end of file\n"
+    (diff,) = parse_diff(added)
+    assert (diff.additions, diff.deletions) == (1, 1)
+    assert apply_file_diff("old\n", added, diff) == "new"
+
+
+def test_format_patch_signature_is_ignored():
+    text = (
+        "From 1234 Mon Sep 17 00:00:00 2001\n"
+        "Subject: [PATCH] Change f\n"
+        "\n"
+        "---\n"
+        " f | 2 +-\n"
+        "\n"
+        "diff --git a/f b/f\n"
+        "index 1111111..2222222 100644\n"
+        "--- a/f\n"
+        "+++ b/f\n"
+        "@@ -1 +1 @@\n"
+        "-old\n"
+        "+new\n"
+        "-- \n"
+        "2.43.0\n"
+    )
+    (diff,) = parse_diff(text)
+    assert len(diff.hunks) == 1
+    assert apply_file_diff("old\n", text, diff) == "new\n"
+
+
+def test_moved_hunks_apply_at_their_new_offset():
+    original = "".join(f"line {i}\n" for i in range(1, 21))
+    # Both hunks claim positions three lines before where their context now is
+    text = (
+        "--- a/f\n+++ b/f\n"
+        "@@ -2,3 +2,3 @@\n line 5\n-line 6\n+LINE 6\n line 7\n"
+        "@@ -12,3 +12,3 @@\n line 15\n-line 16\n+LINE 16\n line 17\n"
+    )
+    result = apply(original, text).splitlines()
+    assert result[5] == "LINE 6" and result[15] == "LINE 16"
+    assert len(result) == 20
+
+
+def test_hunk_that_does_not_match():
+    with pytest.raises(PatchApplyError, match="hunk 1"):
+        apply("something else\n", "--- a/f\n+++ b/f\n@@ -1 +1 @@\n-old\n+new\n")
+
+
+def test_added_file():
+    text = "diff --git a/new.txt b/new.txt\nnew file mode 100644\n--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1,2 @@\n+a\n+b\n"
+    (diff,) = parse_diff(text)
+    assert diff.change == "added" and diff.path == "new.txt"
+    assert apply_file_diff(None, text, diff) == "a\nb\n"
+    with pytest.raises(PatchApplyError, match="already exists"):
+        apply_file_diff("x\n", text, diff)
+
+
+def test_deleted_file():
+    text = "diff --git a/old.txt b/old.txt\ndeleted file mode 100644\n--- a/old.txt\n+++ /dev/null\n@@ -1,2 +0,0 @@\n-a\n-b\n"
+    (diff,) = parse_diff(text)
+    assert diff.change == "deleted" and diff.path == "old.txt"
+    assert apply_file_diff("a\nb\n", text, diff) is None
+    with pytest.raises(PatchApplyError, match="does not remove"):
+        apply_file_diff("a\nb\nc\n", text, diff)
+    with pytest.raises(PatchApplyError, match="does not exist"):
+        apply_file_diff(None, text, diff)
+
+
+def test_truncated_hunk():
+    with pytest.raises(DiffParseError, match="inside a hunk"):
+        parse_diff("--- a/f\n+++ b/f\n@@ -1,2 +1,2 @@\n a\n")
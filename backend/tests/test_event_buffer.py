@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.db import event_buffer as event_buffer_module
+from app.db.event_buffer import BufferFull, EventWriteBuffer
+
+
+class FakeDatabase:
+    """Stands in for _insert: records written rows and raises queued errors"""
+
+    def __init__(self):
+        self.rows = []
+        # Errors raised by the next calls, in order; None lets a call succeed
+        self.errors = []
+        # Ids rejected with an IntegrityError on every insert that contains them
+        self.rejected = set()
+
+    async def insert(self, rows):
+        await asyncio.sleep(0)
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+        if self.rejected.intersection(row["id"] for row in rows):
+            raise IntegrityError("INSERT INTO events", {}, Exception("violates foreign key constraint"))
+        self.rows.extend(rows)
+
+    @property
+    def ids(self):
+        return [row["id"] for row in self.rows]
+
+
+def connection_lost():
+    return OperationalError("INSERT INTO events", {}, Exception("server closed the connection"))
+
+
+@pytest.fixture
+def make_buffer(monkeypatch):
+    # start() only needs the dialect name; no database is involved
+    monkeypatch.setattr(event_buffer_module, "engine", SimpleNamespace(dialect=SimpleNamespace(name="postgresql")))
+
+    def make(**options):
+        buffer = EventWriteBuffer(**{"max_batch": 10, "window_ms": 5, "max_pending": 100, **options})
+        database = FakeDatabase()
+        ids = itertools.count(1)
+
+        async def reserve_id():
+            return next(ids)
+
+        buffer._reserve_id = reserve_id
+        buffer._insert = database.insert
+        return buffer, database
+
+    return make
+
+
+async def add_events(buffer, count, run_id=1):
+    return [await buffer.add(run_id, "info", f"event {i}", None) for i in range(count)]
+
+
+def test_flushes_in_batches_and_runs_callbacks_after_the_write(make_buffer):
+    buffer, database = make_buffer(max_batch=4)
+    written_before_callback = []
+
+    async def main():
+        await buffer.start()
+        events = await add_events(buffer, 10)
+        assert [event.id for event in events] == list(range(1, 11))
+
+        async def callback():
+            written_before_callback.append(10 in database.ids)
+
+        assert buffer.after_write(10, callback)
+        await buffer.stop()
+        # Written ids no longer wait, so later callers act right away
+        assert not buffer.after_write(10, callback)
+
+    asyncio.run(main())
+    assert database.ids == list(range(1, 11))
+    assert buffer.batches >= 3
+    assert written_before_callback == [True]
+
+
+def test_stop_flushes_everything_and_refuses_new_events(make_buffer):
+    buffer, database = make_buffer(max_batch=3, window_ms=1000)
+
+    async def main():
+        await buffer.start()
+        await add_events(buffer, 20)
+        await buffer.stop()
+        assert buffer.pending == 0
+        with pytest.raises(BufferFull):
+            await buffer.add(1, "info", "too late", None)
+
+    asyncio.run(main())
+    assert database.ids == list(range(1, 21))
+
+
+def test_stop_drains_writers_waiting_on_a_full_queue(make_buffer):
+    buffer, database = make_buffer(max_batch=2, max_pending=2)
+
+    async def main():
+        await buffer.start()
+        # More writers than the queue holds, still waiting when stop() begins
+        writers = [asyncio.create_task(add_events(buffer, 1, run_id=i)) for i in range(10)]
+        await asyncio.sleep(0)
+        await buffer.stop()
+        results = await asyncio.gather(*writers, return_exceptions=True)
+        accepted = [result[0].id for result in results if not isinstance(result, BufferFull)]
+        return accepted
+
+    accepted = asyncio.run(main())
+    assert sorted(database.ids) == sorted(accepted)
+
+
+def test_retries_a_batch_while_the_database_is_unavailable(make_buffer):
+    buffer, database = make_buffer()
+    database.errors = [connection_lost(), connection_lost()]
+
+    async def main():
+        await buffer.start()
+        await add_events(buffer, 5)
+        await buffer.stop()
+
+    asyncio.run(main())
+    assert database.ids == [1, 2, 3, 4, 5]
+    assert buffer.failed == 0
+
+
+def test_row_by_row_fallback_drops_only_rejected_rows_and_survives_errors(make_buffer):
+    buffer, database = make_buffer()
+    database.rejected = {3}
+    # Batch rejected, then rows 1 and 2 written, then the connection drops
+    database.errors = [None, None, None, connection_lost()]
+    called = []
+
+    async def main():
+        await buffer.start()
+        await add_events(buffer, 5)
+
+        async def callback():
+            called.append(3)
+
+        buffer.after_write(3, callback)
+        await buffer.stop()
+
+    asyncio.run(main())
+    # Nothing written twice, and only the rejected row is missing
+    assert database.ids == [1, 2, 4, 5]
+    assert buffer.failed == 1
+    # Dropped rows still release their callbacks
+    assert called == [3]
+
+
+def test_flusher_keeps_running_after_an_unexpected_error(make_buffer):
+    buffer, database = make_buffer()
+    original_write = buffer._write
+    calls = []
+
+    async def write(batch, final=False):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("unexpected")
+        await original_write(batch, final)
+
+    buffer._write = write
+
+    async def main():
+        await buffer.start()
+        await add_events(buffer, 1)
+        while not calls:
+            await asyncio.sleep(0.01)
+        assert not buffer._flusher.done()
+        await add_events(buffer, 2)
+        await buffer.stop()
+
+    asyncio.run(main())
+    assert buffer.failed == 1
+    assert database.ids == [2, 3]
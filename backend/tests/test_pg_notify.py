@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import psycopg
+import pytest
+
+from app.core import pg_notify
+from app.core.cache import RunDetailCache
+from app.core.events import EventBroadcaster, MemoryBackend, encode_payload, frame_payload
+from app.core.pg_notify import PostgresNotifyBackend
+from app.models.models import Event, EventType
+
+RUN_ID = 7
+TIMESTAMP = "2026-01-01T00:00:00"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = RunDetailCache(ttl=60)
+    monkeypatch.setattr(pg_notify, "run_detail_cache", cache)
+    return cache
+
+
+def make_backend(max_inline_bytes=500):
+    backend = PostgresNotifyBackend(dsn="postgresql://localhost/unused", channel="test", max_inline_bytes=max_inline_bytes)
+    backend.broadcaster = EventBroadcaster(queue_maxsize=100, backend=MemoryBackend())
+    return backend
+
+
+def event(event_id, message_size=10):
+    return {
+        "type": "event", "id": event_id, "event_type": "info", "message": "x" * message_size,
+        "event_metadata": None, "created_at": TIMESTAMP,
+    }
+
+
+def batch(*events):
+    return {"timestamp": TIMESTAMP, "type": "event_batch", "events": list(events)}
+
+
+def parse(notification):
+    run_id, kind, event_id, body = notification.split(":", 3)
+    return int(run_id), kind, int(event_id) if event_id else None, body
+
+
+def received(queue):
+    frames = []
+    while not queue.empty():
+        frames.append(json.loads(frame_payload(queue.get_nowait())))
+    return frames
+
+
+# _split_batch
+
+def split(backend, message):
+    """Notifications for a batch, plus the event ids each one carries"""
+    parts = []
+    for notification in backend._split_batch(RUN_ID, message):
+        run_id, kind, event_id, body = parse(notification)
+        assert run_id == RUN_ID
+        if kind == pg_notify.INLINE:
+            payload = body.encode()
+            assert len(payload) <= backend.max_inline_bytes
+            ids = [e["id"] for e in json.loads(payload)["events"]]
+            # Carries the id of its last event, for Last-Event-ID
+            assert event_id == ids[-1]
+            parts.append((kind, ids))
+        else:
+            assert body == TIMESTAMP
+            parts.append((kind, [event_id]))
+    return parts
+
+
+def test_split_batch_fills_chunks_up_to_the_inline_limit():
+    events = [event(i) for i in range(1, 4)]
+    # Exactly the size of all three in one message
+    exact = len(encode_payload(batch(*events)))
+    assert split(make_backend(exact), batch(*events)) == [("i", [1, 2, 3])]
+    assert split(make_backend(exact - 1), batch(*events)) == [("i", [1, 2]), ("i", [3])]
+
+
+def test_split_batch_sends_oversized_events_by_reference_in_order():
+    backend = make_backend(400)
+    events = [event(1), event(2, message_size=1000), event(3), event(4)]
+    assert split(backend, batch(*events)) == [("i", [1]), ("r", [2]), ("i", [3, 4])]
+
+
+def test_split_batch_keeps_every_event_once():
+    backend = make_backend(600)
+    events = [event(i, message_size=i * 37 % 700) for i in range(1, 60)]
+    ids = [event_id for _, chunk in split(backend, batch(*events)) for event_id in chunk]
+    assert ids == list(range(1, 60))
+
+
+# _dispatch
+
+class FakeSession:
+    def __init__(self, rows=None, error=None):
+        self.rows = rows or {}
+        self.error = error
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, key):
+        if self.error:
+            raise self.error
+        return self.rows.get(key)
+
+
+def stored_event(event_id, message):
+    return Event(
+        id=event_id, run_id=RUN_ID, event_type=EventType.INFO, message=message,
+        event_metadata={"step": "deploy"}, created_at=datetime(2026, 1, 1)
+    )
+
+
+def test_dispatch_inline_delivers_and_invalidates_the_run_cache(cache):
+    backend = make_backend()
+    queue = backend.broadcaster.subscribe(RUN_ID)
+    cache.put(RUN_ID, b"{}", cache.begin(RUN_ID))
+
+    asyncio.run(backend._dispatch(f"{RUN_ID}:i:5:" + encode_payload(event(5)).decode()))
+
+    assert [frame["id"] for frame in received(queue)] == [5]
+    assert cache.get(RUN_ID) is None
+    assert backend.broadcaster.replay_since(RUN_ID, 5) == []
+
+
+def test_dispatch_by_reference_rereads_the_event(monkeypatch):
+    backend = make_backend()
+    queue = backend.broadcaster.subscribe(RUN_ID)
+    monkeypatch.setattr(pg_notify, "SessionLocal", lambda: FakeSession({9: stored_event(9, "large")}))
+
+    asyncio.run(backend._dispatch(f"{RUN_ID}:r:9:{TIMESTAMP}"))
+
+    (frame,) = received(queue)
+    assert frame == {
+        "timestamp": TIMESTAMP, "type": "event", "id": 9, "event_type": "info", "message": "large",
+        "event_metadata": {"step": "deploy"}, "created_at": "2026-01-01T00:00:00",
+    }
+
+
+def test_dispatch_by_reference_leaves_a_gap_for_the_database(monkeypatch):
+    backend = make_backend()
+    broadcaster = backend.broadcaster
+    asyncio.run(backend._dispatch(f"{RUN_ID}:i:1:" + encode_payload(event(1)).decode()))
+
+    # Nobody listening here: not fetched, and the buffer no longer replays across it
+    asyncio.run(backend._dispatch(f"{RUN_ID}:r:2:{TIMESTAMP}"))
+    assert broadcaster.replay_since(RUN_ID, 1) is None
+
+    # Row gone, or the re-read failing, forgets the buffer too
+    broadcaster.subscribe(RUN_ID)
+    for session in (FakeSession(), FakeSession(error=psycopg.OperationalError("down"))):
+        asyncio.run(backend._dispatch(f"{RUN_ID}:i:3:" + encode_payload(event(3)).decode()))
+        monkeypatch.setattr(pg_notify, "SessionLocal", lambda: session)
+        try:
+            asyncio.run(backend._dispatch(f"{RUN_ID}:r:4:{TIMESTAMP}"))
+        except psycopg.OperationalError:
+            pass
+        assert broadcaster.replay_since(RUN_ID, 3) is None
+
+
+# _listen
+
+class FakeConnection:
+    """LISTEN connection that yields notifications, then fails or idles"""
+
+    def __init__(self, payloads, fail):
+        self.payloads = payloads
+        self.fail = fail
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        pass
+
+    async def notifies(self):
+        for payload in self.payloads:
+            yield SimpleNamespace(payload=payload)
+        if self.fail:
+            raise psycopg.OperationalError("server closed the connection unexpectedly")
+        await asyncio.Event().wait()
+
+
+def test_listen_skips_bad_notifications_and_drops_stale_state_after_a_reconnect(monkeypatch, cache):
+    backend = make_backend()
+    broadcaster = backend.broadcaster
+    queue = broadcaster.subscribe(RUN_ID)
+    # A run nothing is broadcast for; only the reconnect can drop its entry
+    cache.put(RUN_ID + 1, b"{}", cache.begin(RUN_ID + 1))
+    inline = f"{RUN_ID}:i:%d:%s"
+    connections = [
+        FakeConnection([
+            inline % (1, encode_payload(event(1)).decode()),
+            "not a broadcast",
+            f"{RUN_ID}:i:oops:{{}}",
+            inline % (2, encode_payload(event(2)).decode()),
+        ], fail=True),
+        FakeConnection([inline % (3, encode_payload(event(3)).decode())], fail=False),
+    ]
+    opened = []
+
+    async def connect(dsn, autocommit):
+        opened.append(dsn)
+        return connections[len(opened) - 1]
+
+    monkeypatch.setattr(pg_notify.psycopg.AsyncConnection, "connect", connect)
+
+    async def main():
+        listener = asyncio.create_task(backend._listen())
+        while queue.qsize() < 3:
+            await asyncio.sleep(0.01)
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+    asyncio.run(main())
+    # The bad notifications did not cost the connection; only the failure did
+    assert len(opened) == 2
+    assert [frame["id"] for frame in received(queue)] == [1, 2, 3]
+    # Events 1-2 were in the buffer before the reconnect, so resuming from them goes to the database
+    assert broadcaster.replay_since(RUN_ID, 1) is None
+    assert broadcaster.replay_since(RUN_ID, 3) == []
+    assert cache.get(RUN_ID + 1) is None
+
+
+# Cross-process delivery through real servers; needs a migrated Postgres database
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+@pytest.mark.parametrize("write_behind", ["false", "true"])
+def test_events_reach_subscribers_of_another_process(write_behind):
+    import httpx
+    from benchmarks.load import free_port, start_server, wait_until_ready
+
+    async def main():
+        env = {"BROADCASTER_BACKEND": "postgres", "EVENTS_WRITE_BEHIND": write_behind}
+        ports = [free_port(), free_port()]
+        servers = [start_server(TEST_DATABASE_URL, port, env) for port in ports]
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{ports[0]}", timeout=30.0) as listener, \
+                    httpx.AsyncClient(base_url=f"http://127.0.0.1:{ports[1]}", timeout=30.0) as writer:
+                await wait_until_ready(listener, servers[0])
+                await wait_until_ready(writer, servers[1])
+                run_id = (await writer.post("/api/runs", json={"title": "cross-process"})).json()["id"]
+
+                ids = []
+                connected = asyncio.Event()
+
+                async def subscribe():
+                    async with listener.stream("GET", f"/api/runs/{run_id}/stream") as response:
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data: "):
+                                continue
+                            message = json.loads(line[len("data: "):])
+                            if message["type"] == "connected":
+                                connected.set()
+                            elif message["type"] == "event":
+                                ids.append(message["id"])
+                            elif message["type"] == "event_batch":
+                                ids.extend(e["id"] for e in message["events"])
+
+                subscriber = asyncio.create_task(subscribe())
+                await asyncio.wait_for(connected.wait(), 10)
+                sent = []
+                # Inline, then larger than a NOTIFY payload (sent by reference)
+                for message in ("small", "x" * 20000):
+                    response = await writer.post(f"/api/runs/{run_id}/events", json={"message": message})
+                    assert response.status_code in (201, 202)
+                    sent.append(response.json()["id"])
+                # A batch too large to send inline in one piece
+                response = await writer.post(
+                    f"/api/runs/{run_id}/events/batch", json=[{"message": "y" * 500} for _ in range(40)]
+                )
+                assert response.status_code == 201
+                sent += [e["id"] for e in response.json()]
+
+                deadline = asyncio.get_running_loop().time() + 10
+                while sorted(ids) != sorted(sent) and asyncio.get_running_loop().time() < deadline:
+                    await asyncio.sleep(0.05)
+                subscriber.cancel()
+                await asyncio.gather(subscriber, return_exceptions=True)
+                assert sorted(ids) == sorted(sent)
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait(timeout=30)
+
+    asyncio.run(main())
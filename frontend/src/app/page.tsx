@@ -21,7 +21,7 @@ export default function Dashboard() {
   const loadRuns = async () => {
     try {
       setLoading(true);
-      const data = await apiClient.get<Run[]>('/runs');
+      const data = await apiClient.get<Run[]>('/runs?include=stats');
       setRuns(data);
       setError(null);
     } catch (err: any) {
@@ -226,7 +226,9 @@ export default function RunDetailPage() {
                       <p className="text-sm text-gray-300">{event.message}</p>
                       {event.event_metadata && (
                         <pre className="text-xs text-gray-500 mt-1 overflow-x-auto">
-                          {event.event_metadata}
+                          {typeof event.event_metadata === 'string'
+                            ? event.event_metadata
+                            : JSON.stringify(event.event_metadata, null, 2)}
                         </pre>
                       )}
                     </div>
@@ -2,7 +2,7 @@
 
 import { useState, useEffect, useRef } from 'react';
 import { apiClient } from '@/lib/api';
-import { Event } from '@/lib/types';
+import { Event, RunDetail } from '@/lib/types';
 
 interface LiveFeedProps {
   runId: number | null;
@@ -13,6 +13,7 @@ export default function LiveFeed({ runId }: LiveFeedProps) {
   const [connected, setConnected] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const eventSourceRef = useRef<EventSource | null>(null);
+  const lastEventIdRef = useRef<string | null>(null);
 
   useEffect(() => {
     // Clean up previous connection
@@ -21,16 +22,32 @@ export default function LiveFeed({ runId }: LiveFeedProps) {
       eventSourceRef.current = null;
     }
 
+    lastEventIdRef.current = null;
+    let cancelled = false;
+
     if (!runId) {
       setEvents([]);
       setConnected(false);
       return;
     }
 
+    // Merge events newest first, dropping duplicates
+    const mergeEvents = (incoming: Event[], prev: Event[]) => {
+      const byId = new Map<number, Event>();
+      [...incoming, ...prev].forEach((e) => byId.set(e.id, e));
+      return Array.from(byId.values())
+        .sort((a, b) => b.id - a.id)
+        .slice(0, 100); // Keep last 100 events
+    };
+
     // Create new SSE connection
     const connectSSE = () => {
       try {
-        const eventSource = apiClient.createEventSource(`/runs/${runId}/stream`);
+        // Resume after the last event seen so missed events are replayed
+        const resume = lastEventIdRef.current
+          ? `?last_event_id=${encodeURIComponent(lastEventIdRef.current)}`
+          : '';
+        const eventSource = apiClient.createEventSource(`/runs/${runId}/stream${resume}`);
         eventSourceRef.current = eventSource;
 
         eventSource.onopen = () => {
@@ -41,9 +58,29 @@ export default function LiveFeed({ runId }: LiveFeedProps) {
         eventSource.onmessage = (event) => {
           try {
             const data = JSON.parse(event.data);
-            
-            if (data.type === 'event') {
-              setEvents((prev) => [data.event, ...prev].slice(0, 100)); // Keep last 100 events
+
+            if (data.type === 'resync') {
+              // The server closes the stream after this; resuming would get resync again
+              eventSource.close();
+              resync();
+              return;
+            }
+
+            if (event.lastEventId) {
+              lastEventIdRef.current = event.lastEventId;
+            }
+
+            const batch: Event[] =
+              data.type === 'event'
+                ? [data]
+                : data.type === 'event_batch'
+                  ? data.events
+                  : [];
+
+            if (batch.length > 0) {
+              setEvents((prev) =>
+                mergeEvents(batch.map((e) => ({ ...e, run_id: runId })), prev)
+              );
             }
           } catch (err) {
             console.error('Failed to parse SSE event:', err);
@@ -58,7 +95,9 @@ export default function LiveFeed({ runId }: LiveFeedProps) {
           
           // Attempt to reconnect after 3 seconds
           setTimeout(() => {
-            connectSSE();
+            if (!cancelled) {
+              connectSSE();
+            }
           }, 3000);
         };
       } catch (err) {
@@ -67,9 +106,25 @@ export default function LiveFeed({ runId }: LiveFeedProps) {
       }
     };
 
+    // The server could not replay what was missed: reload recent events and
+    // follow live events from now on instead of resuming
+    const resync = async () => {
+      lastEventIdRef.current = null;
+      connectSSE();
+      try {
+        const run = await apiClient.get<RunDetail>(`/runs/${runId}`);
+        if (!cancelled) {
+          setEvents((prev) => mergeEvents(run.recent_events, prev));
+        }
+      } catch (err) {
+        console.error('Failed to reload events after resync:', err);
+      }
+    };
+
     connectSSE();
 
     return () => {
+      cancelled = true;
       if (eventSourceRef.current) {
         eventSourceRef.current.close();
         eventSourceRef.current = null;
@@ -159,7 +214,9 @@ export default function LiveFeed({ runId }: LiveFeedProps) {
                   <p className="text-sm text-gray-300 break-words">{event.message}</p>
                   {event.event_metadata && (
                     <pre className="text-xs text-gray-500 mt-1 overflow-x-auto">
-                      {event.event_metadata}
+                      {typeof event.event_metadata === 'string'
+                        ? event.event_metadata
+                        : JSON.stringify(event.event_metadata, null, 2)}
                     </pre>
                   )}
                 </div>
@@ -10,6 +10,9 @@ interface RunsListProps {
   loading: boolean;
 }
 
+const sum = (counts: Record<string, number>) =>
+  Object.values(counts).reduce((total, count) => total + count, 0);
+
 export default function RunsList({ runs, selectedRunId, onSelectRun, loading }: RunsListProps) {
   const router = useRouter();
 
@@ -71,6 +74,17 @@ export default function RunsList({ runs, selectedRunId, onSelectRun, loading }:
             </p>
           )}
           
+          {run.stats && (
+            <div className="flex items-center space-x-3 text-xs text-gray-400 mb-2">
+              <span>{sum(run.stats.tasks)} tasks</span>
+              <span className="text-stark-success">{run.stats.tasks.completed ?? 0} done</span>
+              <span>{sum(run.stats.events)} events</span>
+              {(run.stats.events.error ?? 0) > 0 && (
+                <span className="text-stark-error">{run.stats.events.error} errors</span>
+              )}
+            </div>
+          )}
+          
           <div className="flex items-center justify-between text-xs text-gray-500">
             <span className={`px-2 py-0.5 rounded ${getStatusColor(run.status)} bg-opacity-20 text-gray-300`}>
               {run.status}
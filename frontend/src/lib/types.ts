@@ -10,6 +10,13 @@ export interface Run {
   status: RunStatus;
   created_at: string;
   updated_at: string;
+  stats?: RunStats | null;
+}
+
+// Counters keyed by TaskStatus / EventType value (GET /runs?include=stats)
+export interface RunStats {
+  tasks: Record<string, number>;
+  events: Record<string, number>;
 }
 
 export interface RunDetail extends Run {
@@ -32,7 +39,7 @@ export interface Event {
   run_id: number;
   event_type: EventType;
   message: string;
-  event_metadata?: string;
+  event_metadata?: Record<string, unknown> | string | null;
   created_at: string;
 }
 
@@ -40,10 +47,18 @@ export interface Patch {
   id: number;
   run_id: number;
   file_path: string;
-  diff_content: string;
+  diff_sha256: string;
+  diff_size: number;
+  diff_content?: string | null;
   status: PatchStatus;
   created_at: string;
   applied_at?: string;
+  error?: string | null;
+}
+
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
 }
 
 export interface SSEEvent {